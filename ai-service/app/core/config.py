@@ -25,6 +25,11 @@ INDEX_DIR = os.getenv("FAISS_INDEX_PATH", os.path.join(BASE_DIR, "faiss_index"))
 # KNOWLEDGE BASE CONFIG
 # ===============================
 KNOWLEDGE_BASE_PATH = os.path.join(BASE_DIR, "knowledge_base.json")
+# Queries embedded at startup to pre-fill the embedding cache
+POPULAR_QUERIES_PATH = os.path.join(BASE_DIR, "popular_queries.json")
+# Query embeddings persisted at shutdown and memory-mapped at the next start
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", os.path.join(BASE_DIR, "embedding_cache"))
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 50000))
 
 # NOTE: history.index only has 1 vector (placeholder). index.bin has 630 real vectors.
 INDEX_PATH = os.path.join(INDEX_DIR, "index.bin")
@@ -0,0 +1,115 @@
+"""
+embedding_store.py - Query embeddings persisted across restarts.
+
+get_cached_embedding's in-memory cache starts empty in every new process,
+so a restarted container re-encodes the same popular questions. This store
+is the second tier behind it: a snapshot of cached embeddings written at
+shutdown and memory-mapped at startup, so a cold process reads vectors from
+disk instead of running the ONNX model.
+
+On disk the store is a directory with two files:
+- vectors.npy: float16 [n, dimension], one row per query (loaded with mmap)
+- keys.json:   {"model": ..., "keys": [normalized query, ...]} in row order
+
+The model id is recorded so a new model never serves stale vectors.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from .config import EMBED_MODEL, EMBED_CACHE_DIR, EMBED_CACHE_MAX_ENTRIES
+
+_VECTORS_FILE = "vectors.npy"
+_KEYS_FILE = "keys.json"
+
+
+class EmbeddingStore:
+    """Read-only view of a persisted snapshot: normalized query → float16 row."""
+
+    def __init__(self, keys: list, vectors):
+        self.rows = {k: i for i, k in enumerate(keys)}
+        self.vectors = vectors
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, key: str):
+        """Copy of the stored vector for `key` (off the mmap), or None."""
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        return np.array(self.vectors[row])
+
+    def items(self):
+        """(key, vector) pairs for every stored query, in row order."""
+        return ((k, self.vectors[i]) for k, i in self.rows.items())
+
+
+def load_embedding_store(path: str = EMBED_CACHE_DIR):
+    """Memory-maps the snapshot in `path`; None if missing, invalid or from another model."""
+    keys_path = os.path.join(path, _KEYS_FILE)
+    vectors_path = os.path.join(path, _VECTORS_FILE)
+    if not (os.path.exists(keys_path) and os.path.exists(vectors_path)):
+        return None
+    try:
+        with open(keys_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != EMBED_MODEL:
+            return None
+        keys = meta["keys"]
+        vectors = np.load(vectors_path, mmap_mode="r")
+        if vectors.ndim != 2 or len(vectors) != len(keys):
+            return None
+    except Exception as e:
+        print(f"[WARN] Failed to read embedding store: {e}", flush=True)
+        return None
+    return EmbeddingStore(keys, vectors)
+
+
+def save_embedding_store(entries, path: str = EMBED_CACHE_DIR,
+                         max_entries: int = EMBED_CACHE_MAX_ENTRIES) -> int:
+    """
+    Writes (normalized query, vector) pairs as a new snapshot, keeping the
+    first `max_entries` distinct keys. Files are replaced atomically so a
+    crash mid-write leaves the previous snapshot intact. Returns the count.
+    """
+    unique = {}
+    for key, vec in entries:
+        if key not in unique:
+            unique[key] = vec
+            if len(unique) >= max_entries:
+                break
+    if not unique:
+        return 0
+
+    os.makedirs(path, exist_ok=True)
+    keys = list(unique)
+    vectors = np.stack([np.asarray(v, dtype=np.float16) for v in unique.values()])
+
+    vectors_tmp = os.path.join(path, _VECTORS_FILE + ".tmp")
+    keys_tmp = os.path.join(path, _KEYS_FILE + ".tmp")
+    with open(vectors_tmp, "wb") as f:
+        np.save(f, vectors)
+    with open(keys_tmp, "w", encoding="utf-8") as f:
+        json.dump({"model": EMBED_MODEL, "keys": keys}, f, ensure_ascii=False)
+    os.replace(vectors_tmp, os.path.join(path, _VECTORS_FILE))
+    os.replace(keys_tmp, os.path.join(path, _KEYS_FILE))
+    return len(keys)
+
+
+def persist_query_cache(path: str = EMBED_CACHE_DIR) -> int:
+    """
+    Snapshots get_cached_embedding's cache (most-used first) followed by the
+    entries already on disk, so queries evicted from memory are not lost.
+    """
+    from itertools import chain
+
+    import app.core.startup as startup
+    from app.services.search_service import get_cached_embedding
+
+    entries = get_cached_embedding.cache_items()
+    if startup.EMBED_STORE is not None:
+        entries = chain(entries, startup.EMBED_STORE.items())
+    return save_embedding_store(entries, path)
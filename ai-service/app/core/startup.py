@@ -1,7 +1,12 @@
 import os
+import sys
 import json
 import gc
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
+from itertools import chain
+
+from app.utils.normalize import to_ascii_key
 
 # ===============================
 # IMPORTS: MOVED HEAVY LIBS TO load_resources
@@ -29,8 +34,16 @@ tokenizer = None
 index = None
 DOCUMENTS = []
 DOCUMENTS_BY_YEAR = defaultdict(list)
+# Column view of DOCUMENTS_BY_YEAR for range scans: one row per document, ordered by year.
+# Built by rebuild_year_view() whenever the year index is (re)built.
+YEAR_COLUMN = []           # int year of each row (sorted; bisect target)
+YEAR_DOC_VIEW = []         # document of each row
 LOADING_ERROR = None
 
+# Persisted query embeddings (embedding_store.EmbeddingStore), second tier
+# behind get_cached_embedding's in-memory cache
+EMBED_STORE = None
+
 # Cross-Encoder Reranker (ONNX)
 cross_encoder_session = None
 cross_encoder_tokenizer = None
@@ -45,6 +58,20 @@ DYNASTY_INDEX = defaultdict(list)     # "trần" → [doc_idx, ...]
 KEYWORD_INDEX = defaultdict(list)     # "khởi_nghĩa" → [doc_idx, ...]
 PLACES_INDEX = defaultdict(list)      # "bạch đằng" → [doc_idx, ...]
 
+# Accent-stripped twins of the entity indexes.
+# Built by rebuild_ascii_indexes() whenever the entity indexes are (re)built.
+PERSONS_INDEX_ASCII = {}  # "tran hung dao" → [doc_idx, ...]
+DYNASTY_INDEX_ASCII = {}  # "tran" → [doc_idx, ...]
+PLACES_INDEX_ASCII = {}   # "bach dang" → [doc_idx, ...]
+
+# Index name → Aho-Corasick automaton over its keys (None without pyahocorasick).
+# Built by rebuild_key_matchers() whenever the entity indexes are (re)built.
+_key_matchers = {}
+
+# Canonical person → doc indices of every alias ("nguyễn huệ" → docs of "quang trung" too).
+# Built by rebuild_canonical_index() whenever PERSONS_INDEX or PERSON_ALIASES is (re)built.
+CANONICAL_TO_IDXS = {}
+
 # Knowledge base (loaded from knowledge_base.json)
 PERSON_ALIASES = {}    # "quang trung" → "nguyễn huệ"
 TOPIC_SYNONYMS = {}    # "mông cổ" → "nguyên mông"
@@ -64,7 +91,7 @@ def load_resources():
     Load all heavy resources (Embedding model, FAISS index, Metadata).
     This should be called during app startup (lifespan) in a background thread.
     """
-    global session, tokenizer, index, DOCUMENTS, DOCUMENTS_BY_YEAR, LOADING_ERROR
+    global session, tokenizer, index, DOCUMENTS, LOADING_ERROR, EMBED_STORE
     
     print("[STARTUP] Loading embedding model & FAISS...", flush=True)
 
@@ -162,16 +189,7 @@ def load_resources():
             print(f"[STARTUP] Documents loaded from meta.json ({len(DOCUMENTS)} docs)", flush=True)
 
         # ===============================
-        # PRE-CALCULATE YEAR INDEX
-        # ===============================
-        DOCUMENTS_BY_YEAR = defaultdict(list)
-        for doc in DOCUMENTS:
-            y = doc.get("year")
-            if y is not None:
-                DOCUMENTS_BY_YEAR[y].append(doc)
-
-        # ===============================
-        # BUILD INVERTED INDEXES (Data-Driven)
+        # BUILD YEAR + INVERTED INDEXES (Data-Driven, one pass)
         # ===============================
         _build_inverted_indexes()
         _load_knowledge_base()
@@ -208,48 +226,133 @@ def load_resources():
             flush=True
         )
 
+        # ===============================
+        # LOAD PERSISTED QUERY EMBEDDINGS
+        # ===============================
+        try:
+            from app.core.embedding_store import load_embedding_store
+            EMBED_STORE = load_embedding_store()
+            if EMBED_STORE is not None:
+                print(f"[STARTUP] Loaded {len(EMBED_STORE)} persisted query embeddings", flush=True)
+        except Exception as e:
+            print(f"[WARN] Failed to load persisted query embeddings: {e}", flush=True)
+
+        # ===============================
+        # WARM EMBEDDING CACHE (popular queries)
+        # ===============================
+        try:
+            from app.core.warmup import load_popular_queries, warm_embedding_cache
+            warmed = warm_embedding_cache(load_popular_queries())
+            print(f"[STARTUP] Embedding cache warmed with {warmed} popular queries", flush=True)
+        except Exception as e:
+            print(f"[WARN] Embedding cache warmup failed: {e}", flush=True)
+
     except Exception as e:
         print(f"❌ [STARTUP] Critical failure in load_resources: {e}", flush=True)
         LOADING_ERROR = str(e)
         # We catch everything so the thread doesn't crash silently without setting the flag.
 
 
+def rebuild_year_view() -> None:
+    """
+    Rebuild (YEAR_COLUMN, YEAR_DOC_VIEW) from DOCUMENTS_BY_YEAR. Rows are
+    grouped by year in sorted-year order, keeping each year's documents in
+    their DOCUMENTS_BY_YEAR order. Only int years are kept — corrupt year
+    values never match a range query.
+
+    _build_inverted_indexes calls this when it builds the year index. Code
+    that fills or edits DOCUMENTS_BY_YEAR by hand (tests) must call it before
+    range queries; the view is never refreshed implicitly.
+    """
+    global YEAR_COLUMN, YEAR_DOC_VIEW
+
+    column, view = [], []
+    for year in sorted(y for y in DOCUMENTS_BY_YEAR if isinstance(y, int)):
+        docs = DOCUMENTS_BY_YEAR[year]
+        column.extend([year] * len(docs))
+        view.extend(docs)
+    YEAR_COLUMN, YEAR_DOC_VIEW = column, view
+
+
+def docs_in_year_range(lo: int, hi: int) -> list:
+    """
+    Return documents with lo <= year <= hi (inclusive), ordered by year.
+    Two bisect calls over the year column, then one slice of the row view,
+    instead of probing every year in the span.
+    """
+    if not DOCUMENTS_BY_YEAR:
+        return []
+    column, view = YEAR_COLUMN, YEAR_DOC_VIEW
+    return view[bisect_left(column, lo):bisect_right(column, hi)]
+
+
+def _intern_key(text: str) -> str:
+    """
+    Normalized index/alias key, interned so the same name shared by several
+    indexes and alias tables is one str object (identity-fast dict probes).
+    """
+    return sys.intern(text.strip().lower())
+
+
+def _freeze_index(index: dict) -> dict:
+    """Read-only copy of a built index: key → tuple of doc indices."""
+    return {key: tuple(idxs) for key, idxs in index.items()}
+
+
 def _build_inverted_indexes():
     """
-    Auto-build inverted indexes from DOCUMENTS metadata.
+    Auto-build the year index and inverted indexes from DOCUMENTS metadata,
+    in a single pass over the documents.
     No hardcoded patterns — scales automatically with data.
     """
-    global PERSONS_INDEX, DYNASTY_INDEX, KEYWORD_INDEX, PLACES_INDEX
+    global PERSONS_INDEX, DYNASTY_INDEX, KEYWORD_INDEX, PLACES_INDEX, DOCUMENTS_BY_YEAR
 
-    PERSONS_INDEX = defaultdict(list)
-    DYNASTY_INDEX = defaultdict(list)
-    KEYWORD_INDEX = defaultdict(list)
-    PLACES_INDEX = defaultdict(list)
+    persons, dynasties, keywords, places = {}, {}, {}, {}
+    by_year = defaultdict(list)
 
     for idx, doc in enumerate(DOCUMENTS):
-        # Index persons (merge both fields, deduplicate via set)
-        all_persons = set(doc.get("persons", []) + doc.get("persons_all", []))
-        for person in all_persons:
-            key = person.strip().lower()
-            if key and len(key) > 1:
-                PERSONS_INDEX[key].append(idx)
+        # Index year
+        y = doc.get("year")
+        if y is not None:
+            by_year[y].append(doc)
+
+        # Index persons (stream both fields, each normalized name once)
+        seen_persons = set()
+        for person in chain(doc.get("persons") or (), doc.get("persons_all") or ()):
+            key = _intern_key(person)
+            if len(key) > 1 and key not in seen_persons:
+                seen_persons.add(key)
+                persons.setdefault(key, []).append(idx)
 
         # Index dynasty
-        dynasty = doc.get("dynasty", "").strip().lower()
+        dynasty = _intern_key(doc.get("dynasty", ""))
         if dynasty:
-            DYNASTY_INDEX[dynasty].append(idx)
+            dynasties.setdefault(dynasty, []).append(idx)
 
         # Index keywords
         for kw in doc.get("keywords", []):
-            key = kw.strip().lower().replace("_", " ")
+            key = sys.intern(kw.strip().lower().replace("_", " "))
             if key:
-                KEYWORD_INDEX[key].append(idx)
+                keywords.setdefault(key, []).append(idx)
 
         # Index places
         for place in doc.get("places", []):
-            key = place.strip().lower()
+            key = _intern_key(place)
             if key and len(key) > 1:
-                PLACES_INDEX[key].append(idx)
+                places.setdefault(key, []).append(idx)
+
+    # Plain dicts: lookups go through .get(), so a missing key must not
+    # insert an empty entry the way defaultdict would. Read-only from here
+    # on, so the posting lists are frozen into (smaller) tuples.
+    PERSONS_INDEX, DYNASTY_INDEX, KEYWORD_INDEX, PLACES_INDEX = (
+        _freeze_index(index) for index in (persons, dynasties, keywords, places)
+    )
+    DOCUMENTS_BY_YEAR = by_year
+    rebuild_year_view()
+    rebuild_canonical_index()
+
+    rebuild_ascii_indexes()
+    rebuild_key_matchers()
 
     print(
         f"[STARTUP] Inverted indexes built:"
@@ -259,6 +362,110 @@ def _build_inverted_indexes():
     )
 
 
+def rebuild_ascii_indexes() -> None:
+    """
+    Rebuild the accent-stripped twins (PERSONS_INDEX_ASCII, ...) of the
+    person, dynasty and place indexes.
+
+    _build_inverted_indexes calls this when it builds the indexes. Code that
+    fills or edits them by hand (tests) must call it before lookup_entity;
+    the twins are never refreshed implicitly.
+    """
+    for name in ("PERSONS_INDEX", "DYNASTY_INDEX", "PLACES_INDEX"):
+        twin = {}
+        for key, idxs in globals()[name].items():
+            twin.setdefault(to_ascii_key(key), set()).update(idxs)
+        globals()[name + "_ASCII"] = {key: tuple(sorted(idxs)) for key, idxs in twin.items()}
+
+
+def lookup_entity(name: str, key: str) -> tuple:
+    """
+    Doc indices for `key` in the named entity index ("PERSONS_INDEX",
+    "DYNASTY_INDEX" or "PLACES_INDEX"). Unaccented input like
+    "tran hung dao" falls back to the accent-stripped twin; accented input
+    that misses does not, so "nguyên" never reaches "nguyễn" docs.
+    """
+    hits = globals()[name].get(key)
+    if hits:
+        return hits
+    ascii_key = to_ascii_key(key)
+    if key != ascii_key:
+        return ()
+    return globals()[name + "_ASCII"].get(ascii_key, ())
+
+
+def _build_key_automaton(source: dict):
+    """Aho-Corasick automaton over the keys of `source`; None if unavailable."""
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+    automaton = ahocorasick.Automaton()
+    for rank, key in enumerate(source):
+        if key:
+            automaton.add_word(key, (rank, key))
+    if len(automaton) == 0:
+        return None
+    automaton.make_automaton()
+    return automaton
+
+
+def rebuild_key_matchers() -> None:
+    """
+    Rebuild the key automata find_index_keys uses for the person, dynasty
+    and place indexes.
+
+    _build_inverted_indexes calls this when it builds the indexes. Code that
+    fills or edits them by hand (tests) must call it before find_index_keys;
+    the automata are never refreshed implicitly.
+    """
+    for name in ("PERSONS_INDEX", "DYNASTY_INDEX", "PLACES_INDEX"):
+        _key_matchers[name] = _build_key_automaton(globals()[name])
+
+
+def find_index_keys(name: str, text: str) -> list:
+    """
+    Keys of the named index that occur as substrings of `text`, in index
+    order — same result as `[k for k in index if k in text]`, but one pass
+    over `text` instead of one substring scan per key.
+    Falls back to that scan when pyahocorasick is not installed.
+    """
+    automaton = _key_matchers.get(name)
+    if automaton is None:
+        return [key for key in globals()[name] if key in text]
+    return [key for _rank, key in sorted({hit for _end, hit in automaton.iter(text)})]
+
+
+def rebuild_canonical_index() -> None:
+    """
+    Rebuild CANONICAL_TO_IDXS from PERSON_ALIASES and PERSONS_INDEX.
+
+    _build_inverted_indexes and _load_knowledge_base call this after
+    building their tables. Code that fills or edits either table by hand
+    (tests) must call it before canonical_person_docs; the map is never
+    refreshed implicitly.
+    """
+    global CANONICAL_TO_IDXS
+
+    names_by_canonical = {}
+    for alias, canon in PERSON_ALIASES.items():
+        names_by_canonical.setdefault(canon, {canon}).add(alias)
+    canonical_to_idxs = {}
+    for canon, names in names_by_canonical.items():
+        idxs = {i for name in names for i in PERSONS_INDEX.get(name, ())}
+        if idxs:
+            canonical_to_idxs[canon] = tuple(sorted(idxs))
+    CANONICAL_TO_IDXS = canonical_to_idxs
+
+
+def canonical_person_docs(canonical: str) -> tuple:
+    """
+    Doc indices indexed under `canonical` or any of its PERSON_ALIASES, so
+    "nguyễn huệ" also reaches events filed under "quang trung".
+    """
+    return CANONICAL_TO_IDXS.get(canonical, ())
+
+
 def _load_knowledge_base():
     """
     Load aliases & synonyms from knowledge_base.json.
@@ -281,6 +488,8 @@ def _load_knowledge_base():
 
     if not os.path.exists(KNOWLEDGE_BASE_PATH):
         print(f"[WARN] Knowledge base not found at {KNOWLEDGE_BASE_PATH}", flush=True)
+        rebuild_canonical_index()
+        _clear_rewrite_cache()
         return
 
     try:
@@ -292,28 +501,28 @@ def _load_knowledge_base():
 
         # Build person alias lookup: alias → canonical name
         for canonical, aliases in kb.get("person_aliases", {}).items():
-            canonical_lower = canonical.strip().lower()
+            canonical_lower = _intern_key(canonical)
             PERSON_ALIASES[canonical_lower] = canonical_lower
             for alias in aliases:
-                alias_lower = alias.strip().lower()
+                alias_lower = _intern_key(alias)
                 if alias_lower:
                     PERSON_ALIASES[alias_lower] = canonical_lower
 
         # Build topic synonym lookup: synonym → canonical topic
         for canonical, synonyms in kb.get("topic_synonyms", {}).items():
-            canonical_lower = canonical.strip().lower()
+            canonical_lower = _intern_key(canonical)
             TOPIC_SYNONYMS[canonical_lower] = canonical_lower
             for syn in synonyms:
-                syn_lower = syn.strip().lower()
+                syn_lower = _intern_key(syn)
                 if syn_lower:
                     TOPIC_SYNONYMS[syn_lower] = canonical_lower
 
         # Build dynasty alias lookup: alias → canonical dynasty name
         for canonical, aliases in kb.get("dynasty_aliases", {}).items():
-            canonical_lower = canonical.strip().lower()
+            canonical_lower = _intern_key(canonical)
             DYNASTY_ALIASES[canonical_lower] = canonical_lower
             for alias in aliases:
-                alias_lower = alias.strip().lower()
+                alias_lower = _intern_key(alias)
                 if alias_lower:
                     DYNASTY_ALIASES[alias_lower] = canonical_lower
 
@@ -351,6 +560,15 @@ def _load_knowledge_base():
     except Exception as e:
         print(f"[ERROR] Failed to load knowledge base: {e}", flush=True)
 
+    rebuild_canonical_index()
+    _clear_rewrite_cache()
+
+
+def _clear_rewrite_cache():
+    """Rewrites and patterns compiled from the old ABBREVIATIONS / TYPO_FIXES are stale."""
+    from app.services.query_understanding import clear_rewrite_cache
+    clear_rewrite_cache()
+
 
 def _build_historical_phrases():
     """
@@ -0,0 +1,43 @@
+"""
+warmup.py - Pre-fill the query embedding cache at startup.
+
+Query traffic is dominated by a small set of popular questions. Embedding
+them once right after the model loads means the first users asking them
+hit get_cached_embedding's cache instead of paying for an ONNX run.
+"""
+
+import json
+import os
+
+from .config import POPULAR_QUERIES_PATH
+
+WARMUP_BATCH_SIZE = 32
+
+
+def load_popular_queries(path: str = POPULAR_QUERIES_PATH) -> list:
+    """Queries listed in popular_queries.json, or [] if the file is missing or invalid."""
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, encoding="utf-8") as f:
+            queries = json.load(f).get("queries", [])
+    except Exception as e:
+        print(f"[WARN] Failed to read popular queries: {e}", flush=True)
+        return []
+    return [q for q in queries if isinstance(q, str) and q.strip()]
+
+
+def warm_embedding_cache(queries: list) -> int:
+    """
+    Embed `queries` the way semantic_search sees them (rewritten), in
+    batches. Returns the number of distinct cache keys.
+    """
+    from app.services.query_understanding import rewrite_query
+    from app.services.search_service import get_cached_embeddings
+    from app.utils.normalize import normalize_query
+
+    # Deduplicate on the cache key get_cached_embeddings will use
+    keys = tuple(dict.fromkeys(normalize_query(rewrite_query(q)) for q in queries))
+    for i in range(0, len(keys), WARMUP_BATCH_SIZE):
+        get_cached_embeddings(keys[i:i + WARMUP_BATCH_SIZE])
+    return len(keys)
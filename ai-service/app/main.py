@@ -18,7 +18,13 @@ async def lifespan(app: FastAPI):
     thread = threading.Thread(target=startup.load_resources)
     thread.start()
     yield
-    # Clean up (if needed)
+    # Persist query embeddings so the next process starts with a warm cache
+    try:
+        from app.core.embedding_store import persist_query_cache
+        saved = persist_query_cache()
+        print(f"[LIFESPAN] Persisted {saved} query embeddings", flush=True)
+    except Exception as e:
+        print(f"[WARN] Failed to persist query embeddings: {e}", flush=True)
 
 app = FastAPI(
     title="Vietnam History AI",
@@ -59,6 +59,8 @@ class SemanticRetriever(BaseRetriever):
             query_vec = np.array(query_vec)
         if len(query_vec.shape) == 1:
             query_vec = np.expand_dims(query_vec, axis=0)
+        # FAISS takes float32 (cached query vectors are stored as float16)
+        query_vec = query_vec.astype(np.float32, copy=False)
 
         # 2. Search FAISS index
         vector_index = self.vector_index if self.vector_index is not None else startup.index
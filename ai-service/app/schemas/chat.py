@@ -19,6 +19,7 @@ class ChatResponse(BaseModel):
     query: str
     intent: str
     answer: Optional[str]
+    stories: List[str] = []
     events: List[EventOut]
     no_data: bool
 
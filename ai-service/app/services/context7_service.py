@@ -7,6 +7,12 @@ bằng cách lọc và xếp hạng các sự kiện dựa trên ngữ cảnh c
 import re
 from typing import List, Dict, Any
 
+from rapidfuzz import fuzz, process
+
+# "Nguyên" (Nguyên Mông) và "Nguyễn" (họ người Việt) gần nhau về ký tự
+# nhưng không bao giờ được fuzzy match với nhau
+_NGUYEN_CONFUSABLE = {"nguyên": "nguyễn", "nguyễn": "nguyên"}
+
 
 def extract_query_focus(query: str) -> Dict[str, Any]:
     """
@@ -190,30 +196,25 @@ def calculate_relevance_score(event: Dict[str, Any], query_focus: Dict[str, Any]
         text_words = text.split()
         keyword_words = keyword.split()
         
+        cutoff = threshold * 100  # rapidfuzz dùng thang 0–100
         # Nếu keyword là 1 từ, check fuzzy với mỗi từ trong text
         if len(keyword_words) == 1:
-            from difflib import SequenceMatcher
-            for word in text_words:
-                if len(word) >= 3 and len(keyword) >= 3:
-                    # SPECIAL CASE: Không fuzzy match "nguyên" với "nguyễn"
-                    if (keyword.lower() == "nguyên" and word.lower() == "nguyễn") or \
-                       (keyword.lower() == "nguyễn" and word.lower() == "nguyên"):
-                        continue
-                    
-                    ratio = SequenceMatcher(None, word, keyword).ratio()
-                    if ratio >= threshold:
-                        return True
+            if len(keyword) < 3:
+                return False
+            # SPECIAL CASE: Không fuzzy match "nguyên" với "nguyễn"
+            excluded = _NGUYEN_CONFUSABLE.get(keyword.lower())
+            candidates = [w for w in text_words if len(w) >= 3 and w.lower() != excluded]
+            return process.extractOne(
+                keyword, candidates, scorer=fuzz.ratio, score_cutoff=cutoff
+            ) is not None
         # Nếu keyword là nhiều từ, check substring với threshold thấp hơn
-        else:
-            from difflib import SequenceMatcher
-            keyword_str = " ".join(keyword_words)
-            # Tạo các n-gram từ text
-            for i in range(len(text_words) - len(keyword_words) + 1):
-                text_ngram = " ".join(text_words[i:i+len(keyword_words)])
-                ratio = SequenceMatcher(None, text_ngram, keyword_str).ratio()
-                if ratio >= threshold:
-                    return True
-        return False
+        keyword_str = " ".join(keyword_words)
+        # Tạo các n-gram từ text
+        n = len(keyword_words)
+        ngrams = [" ".join(text_words[i:i + n]) for i in range(len(text_words) - n + 1)]
+        return process.extractOne(
+            keyword_str, ngrams, scorer=fuzz.ratio, score_cutoff=cutoff
+        ) is not None
     
     # 0a. KIỂM TRA NHÂN VẬT - nếu câu hỏi chỉ định nhân vật cụ thể
     # thì sự kiện PHẢI liên quan đến nhân vật đó
@@ -378,6 +379,21 @@ def calculate_relevance_score(event: Dict[str, Any], query_focus: Dict[str, Any]
     return score
 
 
+# Dưới ngưỡng này sorted() thuần Python nhanh hơn chi phí chuyển sang NumPy
+_NUMPY_RANK_MIN = 16
+
+
+def _rank_by_score(scores: List[float]) -> List[int]:
+    """
+    Chỉ số các phần tử theo điểm giảm dần; điểm bằng nhau giữ nguyên thứ tự
+    ban đầu (stable), giống list.sort(reverse=True).
+    """
+    if len(scores) < _NUMPY_RANK_MIN:
+        return sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+    import numpy as np
+    return np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable").tolist()
+
+
 def filter_and_rank_events(events: List[Dict[str, Any]], query: str, max_results: int = 10) -> List[Dict[str, Any]]:
     """
     Lọc và xếp hạng các sự kiện dựa trên độ liên quan với câu hỏi.
@@ -411,43 +427,28 @@ def filter_and_rank_events(events: List[Dict[str, Any]], query: str, max_results
         re.search(r'\d{1,4}\s*[-–—]\s*\d{1,4}', query_lower)  # "40-2025"
     )
     
+    # Tính điểm mỗi sự kiện đúng một lần, rồi xếp hạng theo điểm giảm dần
+    scores = [calculate_relevance_score(event, query_focus, query) for event in events]
+    order = _rank_by_score(scores)
+
     # Nếu là query đơn giản hoặc year range, không áp dụng lọc chặt
     if is_simple_year_query or is_simple_dynasty_query or is_year_range_query:
-        # Chỉ sắp xếp theo điểm, không lọc
-        scored_events = []
-        for event in events:
-            score = calculate_relevance_score(event, query_focus, query)
-            scored_events.append((score, event))
-        
-        # Sắp xếp theo điểm giảm dần
-        scored_events.sort(key=lambda x: x[0], reverse=True)
-        
         # Trả về tất cả events (không lọc theo threshold)
-        return [event for score, event in scored_events[:max_results]]
+        return [events[i] for i in order[:max_results]]
     
     # Query phức tạp: áp dụng lọc chặt như bình thường
-    # Tính điểm cho mỗi sự kiện
-    scored_events = []
-    for event in events:
-        score = calculate_relevance_score(event, query_focus, query)
-        scored_events.append((score, event))
-    
-    # Sắp xếp theo điểm giảm dần
-    scored_events.sort(key=lambda x: x[0], reverse=True)
-    
     # Lọc các sự kiện có điểm quá thấp
     # Giảm threshold để không loại bỏ quá nhiều events liên quan
     min_score_threshold = 5.0  # Giảm từ 10.0 xuống 5.0 để bao gồm nhiều events hơn
-    filtered_events = [(score, event) for score, event in scored_events if score >= min_score_threshold]
+    filtered = [i for i in order if scores[i] >= min_score_threshold]
     
     # Nếu không có sự kiện nào đạt ngưỡng, lấy top 3 sự kiện có điểm cao nhất
     # NHƯNG chỉ nếu điểm của chúng > 0
-    if not filtered_events and scored_events:
-        top_events = [(score, event) for score, event in scored_events[:3] if score > 0]
-        filtered_events = top_events
+    if not filtered:
+        filtered = [i for i in order[:3] if scores[i] > 0]
     
     # Trả về tối đa max_results sự kiện
-    return [event for score, event in filtered_events[:max_results]]
+    return [events[i] for i in filtered[:max_results]]
 
 
 def validate_answer_relevance(answer: str, query: str) -> Dict[str, Any]:
@@ -1,5 +1,5 @@
 from app.services.search_service import (
-    semantic_search, scan_by_year, scan_by_year_range,
+    semantic_search, prefetch_embeddings, scan_by_year, scan_by_year_range,
     detect_dynasty_from_query, detect_place_from_query,
     resolve_query_entities, scan_by_entities,
     scan_by_dynasty_timeline, scan_national_resistance,
@@ -9,10 +9,8 @@ from app.services.search_service import (
 from app.services.event_aggregator import aggregate_events, normalize_for_dedup
 from app.services.answer_postprocessor import deduplicate_answer, canonicalize_year_format, _dedup_intra_line, _is_fuzzy_dup
 from app.services.formatters.timeline_formatter import extract_year, format_timeline_entry, enforce_timeline_format
-from app.services.query_understanding import (
-    rewrite_query, extract_question_intent,
-    generate_search_variations,
-)
+from app.services.query_understanding import generate_search_variations
+from app.services.query_preprocess import preprocess_query
 from app.services.cross_encoder_service import (
     filter_and_rank_events,
     validate_answer_relevance,
@@ -47,6 +45,7 @@ from app.core.utils.date_utils import safe_year
 from app.services.entity_normalizer import normalize_entity_names
 import app.core.startup as startup
 import re
+from functools import lru_cache
 
 # ===================================================================
 # HELPER FUNCTIONS FOR ENTITY DETECTION
@@ -291,6 +290,31 @@ CREATOR_RESPONSE = (
 )
 
 
+SOCIAL_RESPONSES = {
+    "greeting": GREETING_RESPONSE,
+    "thank": THANK_RESPONSE,
+    "goodbye": GOODBYE_RESPONSE,
+}
+
+
+@lru_cache(maxsize=128)
+def _classify_social_intent(q: str) -> str | None:
+    """
+    Return "greeting", "thank" or "goodbye" for small-talk queries, else None.
+
+    Depends only on the normalized query text, so repeated greetings skip the
+    pattern scan. Checked in that order — a greeting wins over a goodbye.
+    Uses regex for exact matching to avoid false positives.
+    """
+    if any(re.search(pattern, q) for pattern in GREETING_PATTERNS):
+        return "greeting"
+    if any(re.search(pattern, q) for pattern in THANK_PATTERNS):
+        return "thank"
+    if any(re.search(pattern, q) for pattern in GOODBYE_PATTERNS):
+        return "goodbye"
+    return None
+
+
 def clean_story_text(text: str, year: int | None = None) -> str:
     """
     Clean up story text by removing redundant prefixes and making it a complete sentence.
@@ -727,6 +751,20 @@ def _is_similar_event(text1_lower: str, text2_lower: str, kw1: set | None = None
     return False
 
 
+def _unique_docs(*groups) -> list:
+    """
+    Concatenate document lists, keeping the first occurrence of each document.
+    Documents are shared dicts from startup.DOCUMENTS, so identity is the key:
+    one dict.fromkeys-style pass instead of an O(n) `not in` probe per doc.
+    """
+    return list({id(doc): doc for group in groups for doc in group}.values())
+
+
+def _event_stories(events: list) -> list:
+    """Distinct non-empty stories of `events`, in order (the source texts behind the prose answer)."""
+    return list(dict.fromkeys(s for e in events if (s := e.get("story"))))
+
+
 def deduplicate_and_enrich(raw_events: list, max_events: int = MAX_TOTAL_EVENTS) -> list:
     """
     Deduplicate events and enrich with complete information.
@@ -1250,42 +1288,20 @@ def _build_conflict_explanation(query_info, resolved: dict) -> str:
 
 def engine_answer(query: str):
     # --- STEP 0: Query Understanding (NLU) ---
-    # Rewrite query: fix typos, expand abbreviations, restore accents
-    rewritten = rewrite_query(query)
+    # Rewrite query (typos, abbreviations, accents) and detect question intent
+    pre = preprocess_query(query)
     # Use rewritten for all downstream processing
-    q = rewritten.lower()
-    q_display = query  # Keep original for display
-
-    # Detect high-level question intent for context
-    question_intent = extract_question_intent(rewritten)
+    rewritten, q, question_intent = pre.text, pre.lowered, pre.intent
+    q_display = pre.raw  # Keep original for display
 
-    # Handle greeting queries — "hello", "hi", "xin chào"
-    # Use regex for exact matching to avoid false positives
-    if any(re.search(pattern, q) for pattern in GREETING_PATTERNS):
-        return {
-            "query": q_display,
-            "intent": "greeting",
-            "answer": GREETING_RESPONSE,
-            "events": [],
-            "no_data": False
-        }
-
-    # Handle thank you queries
-    if any(re.search(pattern, q) for pattern in THANK_PATTERNS):
-        return {
-            "query": q_display,
-            "intent": "thank",
-            "answer": THANK_RESPONSE,
-            "events": [],
-            "no_data": False
-        }
-
-    # Handle goodbye queries
-    if any(re.search(pattern, q) for pattern in GOODBYE_PATTERNS):
+    # Handle greeting / thank-you / goodbye queries — "hello", "cảm ơn", "bye"
+    social_intent = _classify_social_intent(q.strip().rstrip("!?.,"))
+    if social_intent:
         return {
             "query": q_display,
-            "intent": "goodbye",
-            "answer": GOODBYE_RESPONSE,
+            "intent": social_intent,
+            "answer": SOCIAL_RESPONSES[social_intent],
+            "stories": [],
             "events": [],
             "no_data": False
         }
@@ -1297,6 +1313,7 @@ def engine_answer(query: str):
             "query": q_display,
             "intent": "creator",
             "answer": CREATOR_RESPONSE,
+            "stories": [],
             "events": [],
             "no_data": False
         }
@@ -1307,6 +1324,7 @@ def engine_answer(query: str):
             "query": q_display,
             "intent": "identity",
             "answer": IDENTITY_RESPONSE,
+            "stories": [],
             "events": [],
             "no_data": False
         }
@@ -1369,6 +1387,7 @@ def engine_answer(query: str):
             "query": q_display,
             "intent": intent,
             "answer": conflict_explanation,
+            "stories": [],
             "events": [],
             "no_data": False,  # This IS an answer — explaining the conflict
             "conflict": True,
@@ -1382,6 +1401,7 @@ def engine_answer(query: str):
             "query": q_display,
             "intent": "data_scope",
             "answer": answer,
+            "stories": [],
             "events": [],
             "no_data": False
         }
@@ -1405,6 +1425,7 @@ def engine_answer(query: str):
                 "query": q_display,
                 "intent": "fact_check",
                 "answer": answer,
+                "stories": _event_stories(fc_events[:3]),
                 "events": fc_events[:3],
                 "no_data": False
             }
@@ -1414,6 +1435,7 @@ def engine_answer(query: str):
             "query": q_display,
             "intent": "fact_check",
             "answer": suggestion,
+            "stories": [],
             "events": [],
             "no_data": True
         }
@@ -1429,17 +1451,13 @@ def engine_answer(query: str):
         # NATIONAL RESISTANCE — "chiến tranh Việt Nam", "kháng chiến chống ngoại xâm"
         intent = "resistance_national"
         is_range_query = True  # Use higher event limit
-        raw_events = scan_national_resistance()
-        # Also supplement with year-range scan for 1945-1975 (anti-French + anti-American)
-        range_events = scan_by_year_range(1945, 1975)
-        for e in range_events:
-            if e not in raw_events:
-                raw_events.append(e)
-        # Also supplement with semantic search for broader coverage
-        sem_results = semantic_search(rewritten)
-        for e in sem_results:
-            if e not in raw_events:
-                raw_events.append(e)
+        # Supplement with year-range scan for 1945-1975 (anti-French + anti-American)
+        # and semantic search for broader coverage
+        raw_events = _unique_docs(
+            scan_national_resistance(),
+            scan_by_year_range(1945, 1975),
+            semantic_search(rewritten),
+        )
         war_intro = (
             'Có phải bạn đang muốn tìm hiểu về: "Kháng chiến chống giặc ngoại xâm'
             ' – bản hùng ca giữ nước vang vọng suốt chiều dài'
@@ -1449,15 +1467,11 @@ def engine_answer(query: str):
         # TERRITORIAL — "chiến tranh ở Việt Nam"
         intent = "territorial_event"
         is_range_query = True
-        raw_events = scan_territorial_conflicts()
-        range_events = scan_by_year_range(1945, 1975)
-        for e in range_events:
-            if e not in raw_events:
-                raw_events.append(e)
-        sem_results = semantic_search(rewritten)
-        for e in sem_results:
-            if e not in raw_events:
-                raw_events.append(e)
+        raw_events = _unique_docs(
+            scan_territorial_conflicts(),
+            scan_by_year_range(1945, 1975),
+            semantic_search(rewritten),
+        )
         war_intro = (
             'Có phải bạn đang muốn tìm hiểu về: "Kháng chiến chống giặc ngoại xâm'
             ' – bản hùng ca giữ nước vang vọng suốt chiều dài'
@@ -1703,7 +1717,9 @@ def engine_answer(query: str):
             year = query_analysis.year  # None if duration_guard is True
             if year:
                 intent = "year"
-                raw_events = scan_by_year(year)
+                # Copy: later stages extend raw_events, and scan_by_year
+                # returns the year index's own list
+                raw_events = list(scan_by_year(year))
                 # If exact year scan found nothing, try semantic search BUT
                 # filter to only docs whose year field matches
                 if not raw_events:
@@ -1727,27 +1743,29 @@ def engine_answer(query: str):
                     intent = "implicit_context"
 
                 # Strategy 1: Search using expanded resistance/event terms
+                prefetch_embeddings(implicit_ctx["extra_search_queries"])
                 for extra_query in implicit_ctx["extra_search_queries"]:
                     extra_results = semantic_search(extra_query)
                     raw_events.extend(extra_results)
 
                 # Strategy 2: For very broad queries, scan all documents by dynasty
+                n_docs = len(startup.DOCUMENTS)
+                extra_idxs = []
                 if implicit_ctx["is_broad"] and len(raw_events) < 5:
                     for dynasty_key in list(startup.DYNASTY_INDEX.keys()):
-                        for idx in startup.DYNASTY_INDEX[dynasty_key][:3]:
-                            if idx < len(startup.DOCUMENTS):
-                                doc = startup.DOCUMENTS[idx]
-                                if doc not in raw_events:
-                                    raw_events.append(doc)
+                        extra_idxs.extend(startup.DYNASTY_INDEX[dynasty_key][:3])
 
                 # Strategy 3: Scan by expanded terms in inverted keyword index
                 for term in implicit_ctx["expanded_terms"]:
                     term_normalized = term.replace(" ", "_")
-                    for idx in startup.KEYWORD_INDEX.get(term, []) + startup.KEYWORD_INDEX.get(term_normalized, []):
-                        if idx < len(startup.DOCUMENTS):
-                            doc = startup.DOCUMENTS[idx]
-                            if doc not in raw_events:
-                                raw_events.append(doc)
+                    extra_idxs.extend(startup.KEYWORD_INDEX.get(term, ()))
+                    extra_idxs.extend(startup.KEYWORD_INDEX.get(term_normalized, ()))
+
+                if extra_idxs:
+                    raw_events = _unique_docs(
+                        raw_events,
+                        (startup.DOCUMENTS[idx] for idx in dict.fromkeys(extra_idxs) if idx < n_docs),
+                    )
 
     # --- FALLBACK CHAIN ---
     # When primary search finds nothing, try harder
@@ -1762,6 +1780,7 @@ def engine_answer(query: str):
         # Fallback 2: Try search variations (entity-focused queries)
         if not raw_events and has_entities:
             variations = generate_search_variations(rewritten, resolved)
+            prefetch_embeddings(variations)
             for var_query in variations:
                 var_results = semantic_search(var_query)
                 if var_results:
@@ -1914,6 +1933,7 @@ def engine_answer(query: str):
                 "query": q_display,
                 "intent": intent,
                 "answer": safe_resp["answer"],
+                "stories": [],
                 "events": unique_events[:3],  # Still return top events for debug
                 "no_data": True
             }
@@ -2059,6 +2079,7 @@ def engine_answer(query: str):
         "query": q_display,
         "intent": intent,
         "answer": answer,
+        "stories": _event_stories(unique_events),  # Raw stories; the answer is formatted prose
         "events": unique_events,  # Return deduplicated, enriched events
         "no_data": no_data,
         "confidence": round(best_confidence, 4),
@@ -79,6 +79,10 @@ _TRUNCATION_PATTERNS = [
     re.compile(r'\b\w{1,3}\s*$'),               # ends with 1-3 char fragment
 ]
 
+# Auto-fix rewrites for truncated endings
+_DANGLING_TAIL_RE = re.compile(r'[,;]\s*\w{0,3}\s*$')
+_TRAILING_ELLIPSIS_RE = re.compile(r'\.\.\.\s*$')
+
 # Valid sentence endings
 _VALID_ENDINGS = re.compile(r'[.!?…"»]\s*$')
 
@@ -90,6 +94,26 @@ _TRUNCATED_NAME_RE = re.compile(
     r'\b([A-ZĐÀ-Ỹ][a-zà-ỹ]+)\s+([A-ZĐÀ-Ỹ])\.(?!\w)'
 )
 
+# Timeline year marker: "Năm 1288", "**Năm 1288:**"
+_YEAR_PREFIX_RE = re.compile(r'(?:\*\*)?[Nn]ăm\s+\*?\*?\d{3,4}\*?\*?[,:.]?\*?\*?')
+
+# Up to this many event years the ±5 window check stays a plain set
+# difference; larger sets go through a sorted-array nearest-year search.
+_SMALL_EVENT_YEARS = 8
+
+
+def _years_outside_tolerance(years: set, event_years: set, tolerance: int) -> list:
+    """Sorted years farther than `tolerance` from every event year."""
+    import numpy as np
+
+    events = np.unique(np.fromiter(event_years, dtype=np.int64, count=len(event_years)))
+    found = np.unique(np.fromiter(years, dtype=np.int64, count=len(years)))
+    # Nearest event year is either the insertion point or its left neighbour
+    right = np.searchsorted(events, found).clip(0, len(events) - 1)
+    left = (right - 1).clip(0, len(events) - 1)
+    distance = np.minimum(np.abs(events[right] - found), np.abs(events[left] - found))
+    return found[distance > tolerance].tolist()
+
 
 class OutputVerifier:
     """
@@ -181,8 +205,8 @@ class OutputVerifier:
         for pattern in _TRUNCATION_PATTERNS:
             if pattern.search(stripped):
                 # Auto-fix: trim the dangling fragment
-                fixed = re.sub(r'[,;]\s*\w{0,3}\s*$', '.', stripped)
-                fixed = re.sub(r'\.\.\.\s*$', '.', fixed)
+                fixed = _DANGLING_TAIL_RE.sub('.', stripped)
+                fixed = _TRAILING_ELLIPSIS_RE.sub('.', fixed)
                 return (
                     CheckResult(
                         name="truncation",
@@ -331,11 +355,15 @@ class OutputVerifier:
         if not years_in_answer:
             return CheckResult(name="temporal_mixing", severity=Severity.PASS)
 
-        # Allow years within ±5 of any event year (for approximate references)
-        ungrounded = []
-        for y in years_in_answer:
-            if not any(abs(y - ey) <= 5 for ey in event_years):
-                ungrounded.append(y)
+        # Allow years within ±5 of any event year (for approximate references).
+        if len(event_years) <= _SMALL_EVENT_YEARS:
+            # One set difference instead of comparing every pair of years.
+            allowed = set()
+            for ey in event_years:
+                allowed.update(range(ey - 5, ey + 6))
+            ungrounded = sorted(years_in_answer - allowed)
+        else:
+            ungrounded = _years_outside_tolerance(years_in_answer, event_years, 5)
 
         if ungrounded:
             return CheckResult(
@@ -378,11 +406,7 @@ class OutputVerifier:
             )):
                 continue
             # Check for year marker presence
-            has_year = bool(re.search(
-                r'(?:\*\*)?[Nn]ăm\s+\*?\*?\d{3,4}\*?\*?[,:.]?\*?\*?',
-                stripped
-            ))
-            if not has_year:
+            if not _YEAR_PREFIX_RE.search(stripped):
                 missing_lines.append(i)
 
         if missing_lines:
@@ -7,17 +7,23 @@ and question-type detection.
 Replaces semantic_intent.py with more granular classification.
 """
 import re
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
 from typing import Optional
 
 
+def _fuse_patterns(patterns: list) -> re.Pattern:
+    """Fold a list of case-insensitive patterns into one alternation regex."""
+    return re.compile("|".join(f"(?:{p.pattern})" for p in patterns), re.I)
+
+
 # ===================================================================
 # QUERY ANALYSIS RESULT
 # ===================================================================
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class QueryAnalysis:
-    """Result of intent classification."""
+    """Result of intent classification (immutable; derive variants with dataclasses.replace)."""
     intent: str                          # One of 10+ intents
     focus: str = "event"                 # "year" | "event" | "person" | "scope" | "composite"
     entities: dict = field(default_factory=dict)  # Resolved entities
@@ -53,8 +59,13 @@ _DURATION_PATTERNS = [
     # "X năm kể từ", "X năm sau"
     re.compile(r"\b(\d+)\s*n[ăa]m\s+(?:kể\s*từ|sau|trước|ke\s*tu|sau|truoc)\b", re.I),
 ]
+_DURATION_RE = _fuse_patterns(_DURATION_PATTERNS)
+# Every duration pattern needs a number followed by "năm"; queries without
+# one (most of them) skip the full alternation.
+_DURATION_GATE_RE = re.compile(r"\d\s*n[ăa]m", re.I)
 
 
+@lru_cache(maxsize=4096)
 def detect_duration_guard(query: str) -> bool:
     """
     Check if query contains patterns where a number + "năm" means
@@ -66,11 +77,9 @@ def detect_duration_guard(query: str) -> bool:
         "năm 1000" → False (explicit year marker)
         "năm 1945 có gì" → False (standard year query)
     """
-    q = query.strip()
-    for pattern in _DURATION_PATTERNS:
-        if pattern.search(q):
-            return True
-    return False
+    if not _DURATION_GATE_RE.search(query):
+        return False
+    return bool(_DURATION_RE.search(query.strip()))
 
 
 # ===================================================================
@@ -116,6 +125,7 @@ _CONFIRMATION_SUFFIX = re.compile(
 )
 
 
+@lru_cache(maxsize=4096)
 def detect_fact_check(query: str) -> tuple[bool, Optional[int]]:
     """
     Detect if user is asking the chatbot to confirm/deny a factual claim.
@@ -198,37 +208,33 @@ _SCOPE_PATTERNS = [
     re.compile(r"\bcó\s+lịch\s+sử\s+(?:đến|từ)\b", re.I),
 ]
 
+# One regex, one match call. Each type is a lookahead from the start of the
+# query, tried in priority order — scope first (most specific) — so a later
+# "là ai" cannot win over an earlier-listed type the way a plain leftmost
+# alternation would. The matching named group is the question type.
+_QUESTION_TYPE_RE = re.compile(
+    "|".join(
+        f"(?=.*?(?P<{qtype}>{_fuse_patterns(patterns).pattern}))"
+        for qtype, patterns in (
+            ("scope", _SCOPE_PATTERNS),
+            ("when", _WHEN_PATTERNS),
+            ("who", _WHO_PATTERNS),
+            ("list", _LIST_PATTERNS),
+        )
+    ),
+    re.I | re.S,
+)
+
 
+@lru_cache(maxsize=4096)
 def detect_question_type(query: str) -> str:
     """
     Classify question type to control answer verbosity.
 
     Returns: "when" | "who" | "what" | "list" | "scope"
     """
-    q = query.strip()
-
-    # Check scope FIRST (most specific)
-    for p in _SCOPE_PATTERNS:
-        if p.search(q):
-            return "scope"
-
-    # Check when
-    for p in _WHEN_PATTERNS:
-        if p.search(q):
-            return "when"
-
-    # Check who
-    for p in _WHO_PATTERNS:
-        if p.search(q):
-            return "who"
-
-    # Check list
-    for p in _LIST_PATTERNS:
-        if p.search(q):
-            return "list"
-
-    # Default
-    return "what"
+    m = _QUESTION_TYPE_RE.match(query.strip())
+    return m.lastgroup if m else "what"
 
 
 # ===================================================================
@@ -253,6 +259,7 @@ _DETAILED_PATTERNS = [
 ]
 
 
+@lru_cache(maxsize=4096)
 def detect_detail_level(query: str) -> str:
     """
     Detect desired detail level from query phrasing.
@@ -292,6 +299,7 @@ _DATA_SCOPE_PATTERNS = [
 ]
 
 
+@lru_cache(maxsize=4096)
 def is_data_scope_query(query: str) -> bool:
     """Check if user is asking about the AI's data coverage."""
     q = query.strip()
@@ -349,6 +357,55 @@ def classify_intent(
     Returns:
         QueryAnalysis with intent, focus, question_type, guards
     """
+    try:
+        key = (
+            query,
+            _freeze_entities(resolved_entities),
+            year,
+            year_range,
+            tuple(multi_years) if multi_years else None,
+            original_query,
+        )
+        hash(key)
+    except TypeError:  # unhashable entity values — classify directly
+        return _classify_intent_uncached(
+            query, resolved_entities, year, year_range, multi_years, original_query,
+        )
+    # Hand out a fresh copy carrying the caller's entities dict, never the cached object
+    return replace(_classify_intent_cached(*key), entities=resolved_entities or {})
+
+
+def _freeze_entities(resolved: dict | None) -> tuple | None:
+    """Hashable, order-preserving form of resolved entities (lists → tuples)."""
+    if not resolved:
+        return None
+    return tuple(
+        (field_name, True, tuple(values)) if isinstance(values, list) else (field_name, False, values)
+        for field_name, values in resolved.items()
+    )
+
+
+@lru_cache(maxsize=2048)
+def _classify_intent_cached(query, entities_key, year, year_range, multi_years, original_query):
+    """Classification for a frozen key; callers get a copy via classify_intent()."""
+    resolved = {
+        field_name: list(values) if was_list else values
+        for field_name, was_list, values in (entities_key or ())
+    }
+    return _classify_intent_uncached(
+        query, resolved, year, year_range,
+        list(multi_years) if multi_years else None, original_query,
+    )
+
+
+def _classify_intent_uncached(
+    query: str,
+    resolved_entities: dict | None,
+    year: int | None,
+    year_range: tuple | None,
+    multi_years: list | None,
+    original_query: str | None,
+) -> QueryAnalysis:
     resolved = resolved_entities or {}
     q = query.lower().strip()
 
@@ -359,6 +416,7 @@ def classify_intent(
     has_entities = has_persons or has_topics or has_dynasties or has_places
 
     # --- Guard layers ---
+    # Text-only detectors are lru_cached too (shared with other callers)
     duration = detect_duration_guard(query)
     qtype = detect_question_type(query)
     dlevel = detect_detail_level(query)
@@ -387,72 +445,87 @@ def classify_intent(
 
     # 0. Fact-check query (highest priority — user wants confirmation)
     if is_fc and has_entities:
-        analysis.intent = "fact_check"
-        analysis.focus = "event"
-        analysis.confidence = 0.95
-        analysis.explanation = f"Fact-check: user claims year={fc_year}, verifying"
-        return analysis
+        return replace(
+            analysis,
+            intent="fact_check",
+            focus="event",
+            confidence=0.95,
+            explanation=f"Fact-check: user claims year={fc_year}, verifying",
+        )
 
     # 1. Data scope query (Principle 5)
     if is_data_scope_query(query):
-        analysis.intent = "data_scope"
-        analysis.focus = "scope"
-        analysis.question_type = "scope"
-        analysis.confidence = 0.95
-        analysis.explanation = "User asking about data coverage"
-        return analysis
+        return replace(
+            analysis,
+            intent="data_scope",
+            focus="scope",
+            question_type="scope",
+            confidence=0.95,
+            explanation="User asking about data coverage",
+        )
 
     # 2. Year range
     if year_range:
-        analysis.intent = "year_range"
-        analysis.focus = "composite"
-        analysis.question_type = "list"
-        analysis.confidence = 0.9
-        analysis.explanation = f"Year range: {year_range[0]}–{year_range[1]}"
-        return analysis
+        return replace(
+            analysis,
+            intent="year_range",
+            focus="composite",
+            question_type="list",
+            confidence=0.9,
+            explanation=f"Year range: {year_range[0]}–{year_range[1]}",
+        )
 
     # 3. Multiple years
     if multi_years:
-        analysis.intent = "year_range"
-        analysis.focus = "composite"
-        analysis.question_type = "list"
-        analysis.year_range = (min(multi_years), max(multi_years))
-        analysis.confidence = 0.85
-        analysis.explanation = f"Multiple years: {multi_years}"
-        return analysis
+        return replace(
+            analysis,
+            intent="year_range",
+            focus="composite",
+            question_type="list",
+            year_range=(min(multi_years), max(multi_years)),
+            confidence=0.85,
+            explanation=f"Multiple years: {multi_years}",
+        )
 
     # 4. Relationship query (must check BEFORE definition)
     is_relationship = any(p.search(q) for p in _RELATIONSHIP_PATTERNS_RE)
     is_definition = any(p.search(q) for p in _DEFINITION_PATTERNS_RE)
 
     if is_relationship and (has_persons or has_topics):
-        analysis.intent = "relationship"
-        analysis.focus = "person"
-        analysis.confidence = 0.9
-        analysis.explanation = "Relationship/same-entity query"
-        return analysis
+        return replace(
+            analysis,
+            intent="relationship",
+            focus="person",
+            confidence=0.9,
+            explanation="Relationship/same-entity query",
+        )
 
     # 5. Definition query ("X là ai?", "X là gì?")
     if is_definition and has_persons:
-        analysis.intent = "definition"
-        analysis.focus = "person"
-        analysis.question_type = "who"
-        analysis.confidence = 0.85
-        analysis.explanation = "Who/what definition query"
-        return analysis
+        return replace(
+            analysis,
+            intent="definition",
+            focus="person",
+            question_type="who",
+            confidence=0.85,
+            explanation="Who/what definition query",
+        )
 
     # 6. Person-focused query (when question asks about a specific person)
     #    When user asks "when" about a person, person takes priority over topics
     if has_persons and not has_dynasties and (not has_topics or qtype == "when"):
-        analysis.intent = "person_query"
-        analysis.focus = "person"
-        analysis.confidence = 0.85
         # Detect if asking "when" about a person
         if qtype == "when":
-            analysis.explanation = "Person + when → year-focused person query"
+            explanation = "Person + when → year-focused person query"
         else:
-            analysis.explanation = f"Person query: {resolved.get('persons', [])}"
-        return analysis
+            explanation = f"Person query: {resolved.get('persons', [])}"
+        return replace(
+            analysis,
+            intent="person_query",
+            focus="person",
+            confidence=0.85,
+            explanation=explanation,
+        )
 
     # 7. Dynasty query
     if has_dynasties and not has_persons:
@@ -466,26 +539,32 @@ def classify_intent(
         is_timeline = any(p.search(q) for p in _dynasty_timeline_patterns)
 
         if is_timeline:
-            analysis.intent = "dynasty_timeline"
-            analysis.focus = "composite"
-            analysis.question_type = "list"
-            analysis.confidence = 0.9
-            analysis.explanation = "Dynasty timeline request"
-        else:
-            analysis.intent = "dynasty_query"
-            analysis.focus = "event"
-            analysis.question_type = qtype
-            analysis.confidence = 0.85
-            analysis.explanation = f"Dynasty query: {resolved.get('dynasties', [])}"
-        return analysis
+            return replace(
+                analysis,
+                intent="dynasty_timeline",
+                focus="composite",
+                question_type="list",
+                confidence=0.9,
+                explanation="Dynasty timeline request",
+            )
+        return replace(
+            analysis,
+            intent="dynasty_query",
+            focus="event",
+            question_type=qtype,
+            confidence=0.85,
+            explanation=f"Dynasty query: {resolved.get('dynasties', [])}",
+        )
 
     # 8. Event/topic query
     if has_topics:
-        analysis.intent = "event_query"
-        analysis.focus = "event"
-        analysis.confidence = 0.8
-        analysis.explanation = f"Event/topic query: {resolved.get('topics', [])}"
-        return analysis
+        return replace(
+            analysis,
+            intent="event_query",
+            focus="event",
+            confidence=0.8,
+            explanation=f"Event/topic query: {resolved.get('topics', [])}",
+        )
 
     # 9. Broad history / resistance patterns
     _broad_patterns = [
@@ -504,32 +583,40 @@ def classify_intent(
     is_resistance = any(p.search(q) for p in _resistance_patterns)
 
     if is_broad:
-        analysis.intent = "broad_history"
-        analysis.focus = "composite"
-        analysis.question_type = "list"
-        analysis.confidence = 0.85
-        analysis.explanation = "Broad Vietnamese history query"
-        return analysis
+        return replace(
+            analysis,
+            intent="broad_history",
+            focus="composite",
+            question_type="list",
+            confidence=0.85,
+            explanation="Broad Vietnamese history query",
+        )
 
     if is_resistance:
-        analysis.intent = "event_query"
-        analysis.focus = "event"
-        analysis.question_type = "list"
-        analysis.confidence = 0.8
-        analysis.explanation = "Resistance/war query"
-        return analysis
+        return replace(
+            analysis,
+            intent="event_query",
+            focus="event",
+            question_type="list",
+            confidence=0.8,
+            explanation="Resistance/war query",
+        )
 
     # 10. Single year query (with duration guard)
     if year and not duration:
-        analysis.intent = "year_specific"
-        analysis.focus = "year"
-        analysis.confidence = 0.85
-        analysis.explanation = f"Year query: {year}"
-        return analysis
+        return replace(
+            analysis,
+            intent="year_specific",
+            focus="year",
+            confidence=0.85,
+            explanation=f"Year query: {year}",
+        )
 
     # 11. Fallback: semantic search
-    analysis.intent = "semantic"
-    analysis.focus = "event"
-    analysis.confidence = 0.5
-    analysis.explanation = "Fallback to semantic search"
-    return analysis
+    return replace(
+        analysis,
+        intent="semantic",
+        focus="event",
+        confidence=0.5,
+        explanation="Fallback to semantic search",
+    )
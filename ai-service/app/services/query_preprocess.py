@@ -0,0 +1,34 @@
+"""
+query_preprocess.py - One-call NLU front end for engine_answer.
+
+Every query runs the same front end before retrieval: rewrite (typos,
+abbreviations, accent restoration, fillers), lowercase for matching, and
+question-intent detection. preprocess_query() does that once and hands
+back a PreprocessedQuery bundle, so the engine threads one value instead
+of re-deriving each piece from the raw string.
+
+Search variations and phonetic variants are NOT computed here: they need
+the resolved entities and only run when retrieval comes up short, so
+computing them eagerly would add work to every query.
+"""
+
+from collections import namedtuple
+
+from app.services.query_understanding import rewrite_query, extract_question_intent
+
+# raw:    query as typed (kept for display)
+# text:   rewritten query (input to entity resolution, year extraction, intent)
+# lowered: `text` lowercased for substring pattern checks
+# intent: extract_question_intent() hint, or None
+PreprocessedQuery = namedtuple("PreprocessedQuery", "raw text lowered intent")
+
+
+def preprocess_query(raw: str) -> PreprocessedQuery:
+    """Rewrite `raw` once and derive the matching text and question intent from it."""
+    text = rewrite_query(raw)
+    return PreprocessedQuery(
+        raw=raw,
+        text=text,
+        lowered=text.lower(),
+        intent=extract_question_intent(text),
+    )
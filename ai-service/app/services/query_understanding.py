@@ -10,9 +10,10 @@ Four main capabilities:
 """
 
 import re
+from functools import lru_cache
 from unicodedata import normalize as unicode_normalize
-from difflib import SequenceMatcher
 import logging
+from rapidfuzz import fuzz, process
 import app.core.startup as startup
 
 logger = logging.getLogger(__name__)
@@ -113,10 +114,35 @@ UNACCENTED_MAP = dict(_STATIC_UNACCENTED_MAP)
 _UNACCENTED_SORTED = sorted(UNACCENTED_MAP.keys(), key=len, reverse=True)
 
 
+def _build_accent_automaton():
+    """
+    Aho-Corasick automaton over UNACCENTED_MAP keys; None if unavailable.
+    Each key carries its rank in _UNACCENTED_SORTED, so overlapping matches
+    resolve in the same longest-key-first order as the replace loop.
+    """
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+    automaton = ahocorasick.Automaton()
+    for rank, unaccented in enumerate(_UNACCENTED_SORTED):
+        if unaccented:
+            automaton.add_word(unaccented, (rank, len(unaccented), UNACCENTED_MAP[unaccented]))
+    if len(automaton) == 0:
+        return None
+    automaton.make_automaton()
+    return automaton
+
+
+_ACCENT_AC = _build_accent_automaton()
+
+
 def _rebuild_unaccented_sorted():
-    """Rebuild sorted key list after UNACCENTED_MAP is modified."""
-    global _UNACCENTED_SORTED
+    """Rebuild sorted key list and automaton after UNACCENTED_MAP is modified."""
+    global _UNACCENTED_SORTED, _ACCENT_AC
     _UNACCENTED_SORTED = sorted(UNACCENTED_MAP.keys(), key=len, reverse=True)
+    _ACCENT_AC = _build_accent_automaton()
+    clear_rewrite_cache()  # cached rewrites used the old map
 
 
 def build_unaccented_map_from_knowledge_base():
@@ -162,7 +188,7 @@ def build_unaccented_map_from_knowledge_base():
     for person_name in startup.PERSONS_INDEX.keys():
         _add_entry(person_name)
 
-    # Rebuild sorted list for _restore_accents
+    # Rebuild sorted list for _restore_accents (also rebuilds the alias buckets)
     _rebuild_unaccented_sorted()
 
     logger.info(f"[NLU] Auto-generated {added} new unaccented mappings (total: {len(UNACCENTED_MAP)})")
@@ -183,6 +209,11 @@ FILLER_PATTERNS = [
     r'\bvới\b(?=\s*$)',  # trailing "với"
 ]
 
+# Compiled once; applied in list order since removing one filler can expose
+# another (e.g. a trailing "đi" once "nhỉ" is gone)
+_FILLER_RES = tuple(re.compile(p, re.IGNORECASE) for p in FILLER_PATTERNS)
+_WS_RE = re.compile(r"\s+")
+
 # ===================================================================
 # 4. TYPO / SPELLING CORRECTIONS
 # ===================================================================
@@ -227,36 +258,42 @@ PHONETIC_VOWEL_PAIRS = [
 ]
 
 
+# Directed prefix swaps: each consonant pair in both directions
+_PHONETIC_SWAPS = tuple(
+    swap
+    for original, replacement in PHONETIC_CONSONANT_PAIRS
+    for swap in ((original, replacement), (replacement, original))
+)
+
+
 def generate_phonetic_variants(text: str) -> list:
     """
     Generate phonetically similar Vietnamese words/phrases.
     Used as last resort when exact + fuzzy match both fail.
     
     Only applies consonant-initial swaps to avoid excessive false positives.
-    Returns list of unique variant strings (excluding original).
+    Returns list of unique variant strings (excluding original), in word
+    order then swap-table order, so callers taking the first few are stable.
     """
     if not text or len(text) < 2:
         return []
     
-    variants = set()
     words = text.lower().split()
+    seen = {text.lower()}
+    seen_add = seen.add
+    variants = []
     
     for word_idx, word in enumerate(words):
-        for original, replacement in PHONETIC_CONSONANT_PAIRS:
-            # Forward swap: original → replacement
-            if word.startswith(original):
-                new_word = replacement + word[len(original):]
-                new_words = words[:word_idx] + [new_word] + words[word_idx + 1:]
-                variants.add(" ".join(new_words))
-            # Reverse swap: replacement → original
-            if word.startswith(replacement):
-                new_word = original + word[len(replacement):]
-                new_words = words[:word_idx] + [new_word] + words[word_idx + 1:]
-                variants.add(" ".join(new_words))
-    
-    # Remove original text from variants
-    variants.discard(text.lower())
-    return list(variants)
+        head = " ".join(words[:word_idx] + [""])
+        tail = " ".join([""] + words[word_idx + 1:])
+        for src, dst in _PHONETIC_SWAPS:
+            if word.startswith(src):
+                variant = head + dst + word[len(src):] + tail
+                if variant not in seen:
+                    seen_add(variant)
+                    variants.append(variant)
+    
+    return variants
 
 
 def _strip_accents(text: str) -> str:
@@ -269,15 +306,71 @@ def _strip_accents(text: str) -> str:
 def _normalize_text(text: str) -> str:
     """Basic normalization: lowercase, NFC, collapse spaces."""
     text = unicode_normalize("NFC", text.lower().strip())
-    text = re.sub(r"\s+", " ", text)
-    return text
+    return _WS_RE.sub(" ", text)
 
 
 # ===================================================================
 # 5. CORE FUNCTIONS
 # ===================================================================
 
+# Compiled from the active rewrite tables on first use; dropped by clear_rewrite_cache()
+_abbrev_compiled = None        # ((pattern, expansion), ...)
+_rewrite_gate_compiled = None  # gate pattern over typos, abbreviations and fillers
+
+
+def clear_rewrite_cache():
+    """
+    Drop memoized rewrites and the patterns compiled from the rewrite tables,
+    and rebuild the fuzzy-match alias buckets.
+    Call whenever startup.TYPO_FIXES, startup.ABBREVIATIONS, the alias tables
+    or UNACCENTED_MAP change (startup does after loading knowledge_base.json);
+    nothing here checks the tables for changes on its own.
+    """
+    global _abbrev_compiled, _rewrite_gate_compiled
+    _abbrev_compiled = None
+    _rewrite_gate_compiled = None
+    rewrite_query.cache_clear()
+    rebuild_alias_buckets()
+
+
+def _abbreviation_patterns(abbreviations: dict) -> tuple:
+    """Whole-word patterns for `abbreviations`, compiled once per clear_rewrite_cache()."""
+    global _abbrev_compiled
+    if _abbrev_compiled is None:
+        _abbrev_compiled = tuple(
+            # Match as whole word to avoid partial replacements
+            (re.compile(r'\b' + re.escape(abbr) + r'\b'), expansion)
+            for abbr, expansion in abbreviations.items()
+        )
+    return _abbrev_compiled
+
+
+def _rewrite_gate(typo_fixes: dict, abbreviations: dict) -> re.Pattern:
+    """
+    One regex matching anything rewrite steps 2, 3 and 5 would touch: a typo
+    substring, a whole-word abbreviation or a filler. No match means those
+    steps are no-ops. Compiled once per clear_rewrite_cache().
+    """
+    global _rewrite_gate_compiled
+    if _rewrite_gate_compiled is None:
+        branches = [re.escape(typo) for typo in typo_fixes]
+        branches += [r'\b' + re.escape(abbr) + r'\b' for abbr in abbreviations]
+        branches += [f"(?i:{p})" for p in FILLER_PATTERNS]
+        _rewrite_gate_compiled = re.compile("|".join(branches))
+    return _rewrite_gate_compiled
+
+
+@lru_cache(maxsize=4096)
 def rewrite_query(query: str) -> str:
+    """
+    Memoized rewrite_query_uncached(). Rewrites are deterministic for a given
+    query and rewrite tables; clear_rewrite_cache() drops the memo when the
+    tables change.
+    """
+    return rewrite_query_uncached(query)
+
+
+def rewrite_query_uncached(query: str) -> str:
     """
     Rewrite query for better understanding:
     1. Normalize unicode
@@ -292,25 +385,33 @@ def rewrite_query(query: str) -> str:
         return query
     
     result = _normalize_text(query)
+    typo_fixes = startup.TYPO_FIXES if startup.TYPO_FIXES else _FALLBACK_TYPO_FIXES
+    abbreviations = startup.ABBREVIATIONS if startup.ABBREVIATIONS else _FALLBACK_ABBREVIATIONS
+    
+    # Fast path: already-canonical text (accented, nothing to fix, expand or drop)
+    needs_edit = _rewrite_gate(typo_fixes, abbreviations).search(result) is not None
+    unaccented = _looks_unaccented(result)
+    mixed = not unaccented and _has_mixed_accents(result)
+    if not (needs_edit or unaccented or mixed):
+        return result
     
     # Step 1: Fix known typos (dynamic from knowledge_base.json)
-    typo_fixes = startup.TYPO_FIXES if startup.TYPO_FIXES else _FALLBACK_TYPO_FIXES
     for typo, fix in typo_fixes.items():
         if typo in result:
             result = result.replace(typo, fix)
     
     # Step 2: Expand abbreviations (dynamic from knowledge_base.json)
-    abbreviations = startup.ABBREVIATIONS if startup.ABBREVIATIONS else _FALLBACK_ABBREVIATIONS
-    for abbr, expansion in abbreviations.items():
-        # Match as whole word to avoid partial replacements
-        pattern = r'\b' + re.escape(abbr) + r'\b'
-        result = re.sub(pattern, expansion, result)
+    for pattern, expansion in _abbreviation_patterns(abbreviations):
+        result = pattern.sub(expansion, result)
     
     # Step 3: Restore accents for unaccented Vietnamese input
     # Check if query looks unaccented (no Vietnamese-specific chars)
-    if _looks_unaccented(result):
+    if needs_edit:  # steps 1-2 may have changed the text
+        unaccented = _looks_unaccented(result)
+        mixed = not unaccented and _has_mixed_accents(result)
+    if unaccented:
         result = _restore_accents(result)
-    elif _has_mixed_accents(result):
+    elif mixed:
         # PARTIAL ACCENT RESTORATION: For mixed-accent queries like "Trận bạch den"
         # Strip all accents, restore, and use if it produces a better result
         stripped = _strip_accents(result)
@@ -319,27 +420,37 @@ def rewrite_query(query: str) -> str:
             result = restored
     
     # Step 4: Remove filler words
-    for pattern in FILLER_PATTERNS:
-        result = re.sub(pattern, '', result, flags=re.IGNORECASE)
+    for pattern in _FILLER_RES:
+        result = pattern.sub('', result)
     
     # Clean up whitespace
-    result = re.sub(r'\s+', ' ', result).strip()
+    result = _WS_RE.sub(' ', result).strip()
     
     return result
 
 
+
+
+# Vietnamese-specific chars (beyond basic ASCII + common accents)
+_VN_ACCENTED_CHARS = "àáảãạăắằẳẵặâấầẩẫậèéẻẽẹêếềểễệìíỉĩịòóỏõọôốồổỗộơớờởỡợùúủũụưứừửữựỳýỷỹỵđ"
+_VN_ACCENTED_RE = re.compile(f"[{_VN_ACCENTED_CHARS}]")
+
+
+def _accent_counts(text: str) -> tuple:
+    """(Vietnamese accented letters, alphabetic chars) in lowercased text, counted in C."""
+    text_lower = text.lower()
+    vn_count = len(_VN_ACCENTED_RE.findall(text_lower))
+    alpha_count = sum(map(str.isalpha, text_lower))
+    return vn_count, alpha_count
+
+
 def _looks_unaccented(text: str) -> bool:
     """
     Heuristic: check if text is mostly unaccented Vietnamese.
     If text has very few Vietnamese diacritics relative to its length,
     it's likely typed without accents.
     """
-    # Vietnamese-specific chars (beyond basic ASCII + common accents)
-    vietnamese_chars = set("àáảãạăắằẳẵặâấầẩẫậèéẻẽẹêếềểễệìíỉĩịòóỏõọôốồổỗộơớờởỡợùúủũụưứừửữựỳýỷỹỵđ")
-    
-    text_lower = text.lower()
-    vn_count = sum(1 for c in text_lower if c in vietnamese_chars)
-    alpha_count = sum(1 for c in text_lower if c.isalpha())
+    vn_count, alpha_count = _accent_counts(text)
     
     if alpha_count == 0:
         return False
@@ -359,10 +470,7 @@ def _has_mixed_accents(text: str) -> bool:
       "tran bach dan"  → 0%   → False (pure unaccented, handled by _looks_unaccented)
       "Các cuộc kháng chiến của Việt Nam" → ~55% → False (fully accented)
     """
-    vietnamese_chars = set("àáảãạăắằẳẵặâấầẩẫậèéẻẽẹêếềểễệìíỉĩịòóỏõọôốồổỗộơớờởỡợùúủũụưứừửữựỳýỷỹỵđ")
-    text_lower = text.lower()
-    vn_count = sum(1 for c in text_lower if c in vietnamese_chars)
-    alpha_count = sum(1 for c in text_lower if c.isalpha())
+    vn_count, alpha_count = _accent_counts(text)
     
     if alpha_count == 0:
         return False
@@ -389,18 +497,43 @@ def _restore_accents(text: str) -> str:
         result = _fuzzy_restore_accents(result)
 
     # Step 2: Exact longest-match-first replacement on remaining unaccented parts
-    for unaccented in _UNACCENTED_SORTED:
-        if unaccented in result:
-            result = result.replace(unaccented, UNACCENTED_MAP[unaccented])
-
-    return result
+    if _ACCENT_AC is None:
+        for unaccented in _UNACCENTED_SORTED:
+            if unaccented in result:
+                result = result.replace(unaccented, UNACCENTED_MAP[unaccented])
+        return result
+
+    # One automaton pass, then claim spans longest key first (left to right
+    # within a key), as the replace loop does; a match overlapping a claimed
+    # span is dropped, so each input span is replaced at most once.
+    spans = sorted(
+        (rank, end - length + 1, end + 1, accented)
+        for end, (rank, length, accented) in _ACCENT_AC.iter(result)
+    )
+    taken = bytearray(len(result))
+    kept = []
+    for _rank, start, stop, accented in spans:
+        if any(taken[start:stop]):
+            continue
+        taken[start:stop] = b"\x01" * (stop - start)
+        kept.append((start, stop, accented))
+    kept.sort()
+
+    parts = []
+    pos = 0
+    for start, stop, accented in kept:
+        parts.append(result[pos:start])
+        parts.append(accented)
+        pos = stop
+    parts.append(result[pos:])
+    return "".join(parts)
 
 
 def _fuzzy_restore_accents(text: str) -> str:
     """
     Fuzzy accent restoration for misspelled unaccented Vietnamese.
     Slides n-gram windows (2→1 words) over the text and matches against
-    UNACCENTED_MAP keys using SequenceMatcher. Dynamic — auto-scales
+    UNACCENTED_MAP keys using rapidfuzz's ratio. Dynamic — auto-scales
     with any entries added to knowledge_base.json at startup.
     """
     words = text.split()
@@ -414,21 +547,23 @@ def _fuzzy_restore_accents(text: str) -> str:
 
     # Try multi-word n-grams first (longer matches are more precise)
     for n in range(min(5, len(words)), 0, -1):
+        # Only compare against keys of same word count
+        keys = [k for k in UNACCENTED_MAP if len(k.split()) == n]
+        if not keys:
+            continue
         for i in range(len(words) - n + 1):
             candidate = " ".join(words[i:i + n])
             # Skip if candidate is already accented
             if not _looks_unaccented(candidate):
                 continue
 
-            for map_key, map_val in UNACCENTED_MAP.items():
-                # Only compare against keys of same word count
-                if len(map_key.split()) != n:
-                    continue
-                sim = SequenceMatcher(None, candidate, map_key).ratio()
-                if sim >= FUZZY_THRESHOLD and sim > best_score:
-                    best_score = sim
-                    best_replacement = map_val
-                    best_span = (i, i + n)
+            match = process.extractOne(
+                candidate, keys, scorer=fuzz.ratio, score_cutoff=FUZZY_THRESHOLD * 100
+            )
+            if match is not None and match[1] / 100 > best_score:
+                best_score = match[1] / 100
+                best_replacement = UNACCENTED_MAP[match[0]]
+                best_span = (i, i + n)
 
         # If we found a good multi-word match at this n-gram size, apply it
         if best_replacement:
@@ -440,6 +575,51 @@ def _fuzzy_restore_accents(text: str) -> str:
     return text
 
 
+# id(alias table) → (alias table, {word_count: (keys, accent-stripped keys, dict positions)})
+# for startup's alias tables; built by rebuild_alias_buckets()
+_alias_buckets = {}
+
+
+def _bucket_keys(entity_dict: dict) -> dict:
+    """
+    Keys of `entity_dict` bucketed by word count (n-grams are only compared
+    against keys with the same number of words), in dictionary order, with
+    their accent-stripped forms.
+
+    A plain scan of each bucket with rapidfuzz is deliberate: an alias trie
+    walked with a bounded edit distance was tried and dropped, because the
+    pure-Python walk cost more than rapidfuzz scoring the whole bucket in C,
+    and prefix bucketing misses typos in the first characters.
+    """
+    buckets = {}
+    for order, key in enumerate(entity_dict):
+        keys, stripped, orders = buckets.setdefault(len(key.split()), ([], [], []))
+        keys.append(key)
+        stripped.append(_strip_accents(key))
+        orders.append(order)
+    return buckets
+
+
+def rebuild_alias_buckets():
+    """
+    Rebuild the key buckets of startup.PERSON_ALIASES, DYNASTY_ALIASES and
+    TOPIC_SYNONYMS. clear_rewrite_cache() calls this; code that edits those
+    tables in place must call one of them before fuzzy_match_entity.
+    """
+    import app.core.startup as startup
+    _alias_buckets.clear()
+    for aliases in (startup.PERSON_ALIASES, startup.DYNASTY_ALIASES, startup.TOPIC_SYNONYMS):
+        _alias_buckets[id(aliases)] = (aliases, _bucket_keys(aliases))
+
+
+def _alias_buckets_for(entity_dict: dict) -> dict:
+    """Prebuilt buckets for startup's alias tables; any other dict is bucketed on the spot."""
+    cached = _alias_buckets.get(id(entity_dict))
+    if cached is not None and cached[0] is entity_dict:
+        return cached[1]
+    return _bucket_keys(entity_dict)
+
+
 def fuzzy_match_entity(query: str, entity_dict: dict, threshold: float = 0.75) -> list:
     """
     Find entities that fuzzy-match the query when exact match fails.
@@ -456,43 +636,37 @@ def fuzzy_match_entity(query: str, entity_dict: dict, threshold: float = 0.75) -
         return []
     
     q_words = query.lower().split()
-    matches = []
+    buckets = _alias_buckets_for(entity_dict)
+    best = {}  # key → (dict position, best_sim)
+    cutoff = threshold * 100  # rapidfuzz scores on a 0–100 scale
     
-    for key in entity_dict:
-        key_words = key.split()
-        key_len = len(key_words)
-        
-        # Try matching each n-gram of the query against the key
+    for key_len, (keys, keys_stripped, orders) in buckets.items():
+        # Try matching each n-gram of the query against keys of that length
         for i in range(len(q_words) - key_len + 1):
             candidate = " ".join(q_words[i:i + key_len])
-            
-            # Exact match — skip (already handled by normal resolution)
-            if candidate == key:
-                continue
-            
-            # Compare with and without accents
-            sim = SequenceMatcher(None, candidate, key).ratio()
-            
-            # Also try unaccented comparison
             candidate_stripped = _strip_accents(candidate)
-            key_stripped = _strip_accents(key)
-            sim_stripped = SequenceMatcher(None, candidate_stripped, key_stripped).ratio()
             
-            best_sim = max(sim, sim_stripped)
+            # Compare with and without accents; keep the better score per key
+            scores = {}
+            for choices, text in ((keys, candidate), (keys_stripped, candidate_stripped)):
+                for _, score, idx in process.extract(
+                    text, choices, scorer=fuzz.ratio, score_cutoff=cutoff, limit=None
+                ):
+                    if score > scores.get(idx, -1.0):
+                        scores[idx] = score
             
-            if best_sim >= threshold:
-                matches.append((key, best_sim))
-    
-    # Sort by similarity descending, deduplicate
-    matches.sort(key=lambda x: x[1], reverse=True)
-    seen = set()
-    unique_matches = []
-    for m in matches:
-        if m[0] not in seen:
-            seen.add(m[0])
-            unique_matches.append(m)
+            for idx, score in scores.items():
+                key = keys[idx]
+                # Exact match — skip (already handled by normal resolution)
+                if candidate == key:
+                    continue
+                sim = score / 100
+                if sim > best.get(key, (0, -1.0))[1]:
+                    best[key] = (orders[idx], sim)
     
-    return unique_matches
+    # Sort by similarity descending (ties keep dictionary order)
+    ranked = sorted(best.items(), key=lambda kv: (-kv[1][1], kv[1][0]))
+    return [(key, sim) for key, (_, sim) in ranked]
 
 
 def generate_search_variations(query: str, resolved_entities: dict) -> list:
@@ -573,72 +747,67 @@ def generate_search_variations(query: str, resolved_entities: dict) -> list:
     return variations
 
 
-def extract_question_intent(query: str) -> str | None:
-    """
-    Detect high-level question patterns for better intent routing.
-    Returns intent hint or None if no pattern matched.
-    
-    Patterns:
-    - "ai đã..." / "vị tướng nào..." → person_search
-    - "chuyện gì xảy ra..." / "có sự kiện gì..." → event_search
-    - "khi nào..." / "năm nào..." → time_search
-    - "ở đâu..." / "tại đâu..." → place_search  
-    - "tại sao..." / "vì sao..." → reason_search
-    - "so sánh..." / "khác nhau..." → comparison
-    """
-    q = query.lower().strip()
-    
-    # Person search patterns
-    person_patterns = [
+# Question-pattern groups in priority order (first matching group wins)
+_QUESTION_INTENT_PATTERNS = (
+    ("person_search", (
         r'\bai\s+(?:đã|là|đã\s+từng)\b',
         r'\bvị\s+(?:tướng|vua|anh\s+hùng|lãnh\s+đạo)\s+nào\b',
         r'\bnhân\s+vật\s+nào\b',
         r'\bngười\s+(?:nào|nào\s+đã)\b',
-    ]
-    for p in person_patterns:
-        if re.search(p, q):
-            return "person_search"
-    
-    # Event search patterns
-    event_patterns = [
+    )),
+    ("event_search", (
         r'\bchuyện\s+gì\s+(?:xảy\s+ra|đã\s+xảy\s+ra|diễn\s+ra)\b',
         r'\bcó\s+(?:sự\s+kiện|chuyện)\s+gì\b',
         r'\bđiều\s+gì\s+(?:đã\s+)?xảy\s+ra\b',
         r'\bchuyện\s+gì\s+(?:đã\s+)?(?:xảy|diễn)\b',
-    ]
-    for p in event_patterns:
-        if re.search(p, q):
-            return "event_search"
-    
-    # Time search patterns
-    time_patterns = [
+    )),
+    ("time_search", (
         r'\b(?:khi|lúc|bao\s+giờ)\s+nào\b',
         r'\bnăm\s+nào\b',
         r'\bthời\s+(?:gian|điểm|kỳ)\s+nào\b',
-    ]
-    for p in time_patterns:
-        if re.search(p, q):
-            return "time_search"
-    
-    # Place search patterns
-    place_patterns = [
+    )),
+    ("place_search", (
         r'\b(?:ở|tại)\s+đâu\b',
         r'\bnơi\s+nào\b',
         r'\bđịa\s+(?:điểm|danh)\s+nào\b',
-    ]
-    for p in place_patterns:
-        if re.search(p, q):
-            return "place_search"
-    
-    # Comparison patterns
-    comparison_patterns = [
+    )),
+    ("comparison", (
         r'\bso\s+sánh\b',
         r'\bkhác\s+(?:nhau|biệt|gì)\b',
         r'\bgiống\s+(?:nhau|gì)\b',
-    ]
-    for p in comparison_patterns:
-        if re.search(p, q):
-            return "comparison"
+    )),
+)
+
+# One anchored regex of lookaheads, tried in priority order: a later group's
+# phrase appearing earlier in the query cannot beat an earlier group, as it
+# would with a plain leftmost alternation. The matching group is the intent.
+_QUESTION_INTENT_RE = re.compile(
+    "|".join(
+        f"(?=.*?(?P<{intent}>{'|'.join(patterns)}))"
+        for intent, patterns in _QUESTION_INTENT_PATTERNS
+    ),
+    re.S,
+)
+
+
+def extract_question_intent(query: str) -> str | None:
+    """
+    Detect high-level question patterns for better intent routing.
+    Returns intent hint or None if no pattern matched.
+    
+    Patterns:
+    - "ai đã..." / "vị tướng nào..." → person_search
+    - "chuyện gì xảy ra..." / "có sự kiện gì..." → event_search
+    - "khi nào..." / "năm nào..." → time_search
+    - "ở đâu..." / "tại đâu..." → place_search  
+    - "tại sao..." / "vì sao..." → reason_search
+    - "so sánh..." / "khác nhau..." → comparison
+    """
+    q = query.lower().strip()
+    
+    m = _QUESTION_INTENT_RE.match(q)
+    if m:
+        return m.lastgroup
     
     # --- Fallback: check plain-text patterns from knowledge_base.json ---
     if startup.QUESTION_PATTERNS:
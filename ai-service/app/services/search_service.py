@@ -1,7 +1,7 @@
 import app.core.startup as startup
 from app.core.utils.date_utils import safe_year
 from app.core.config import TOP_K, SIM_THRESHOLD, FUZZY_MATCH_THRESHOLD, HIGH_CONFIDENCE_SCORE
-from functools import lru_cache
+from app.utils.lfu_cache import lfu_cache
 from app.utils.normalize import normalize_query
 from app.services.query_understanding import (
     fuzzy_match_entity,
@@ -78,8 +78,8 @@ def resolve_query_entities(query: str) -> dict:
             result["persons"].append(canonical)
 
     # --- 2. Direct person match from inverted index ---
-    for person_key in startup.PERSONS_INDEX:
-        if person_key in q_low and person_key not in seen_persons:
+    for person_key in startup.find_index_keys("PERSONS_INDEX", q_low):
+        if person_key not in seen_persons:
             seen_persons.add(person_key)
             result["persons"].append(person_key)
 
@@ -97,8 +97,8 @@ def resolve_query_entities(query: str) -> dict:
             result["dynasties"].append(canonical)
 
     # --- 4. Direct dynasty match from inverted index ---
-    for dynasty_key in startup.DYNASTY_INDEX:
-        if dynasty_key in q_low and dynasty_key not in seen_dynasties:
+    for dynasty_key in startup.find_index_keys("DYNASTY_INDEX", q_low):
+        if dynasty_key not in seen_dynasties:
             # GUARD: Prevent false match when short dynasty name is part of
             # a person name. e.g., "nguyễn" in "nguyễn huệ" ≠ dynasty "nguyễn"
             is_part_of_person = any(
@@ -121,8 +121,8 @@ def resolve_query_entities(query: str) -> dict:
             result["topics"].append(canonical)
 
     # --- 6. Direct place match from inverted index ---
-    for place_key in startup.PLACES_INDEX:
-        if place_key in q_low and place_key not in seen_places:
+    for place_key in startup.find_index_keys("PLACES_INDEX", q_low):
+        if place_key not in seen_places:
             seen_places.add(place_key)
             result["places"].append(place_key)
 
@@ -197,8 +197,8 @@ def resolve_query_entities(query: str) -> dict:
                 if synonym in variant and canonical not in seen_topics:
                     seen_topics.add(canonical)
                     variant_result["topics"].append(canonical)
-            for place_key in startup.PLACES_INDEX:
-                if place_key in variant and place_key not in seen_places:
+            for place_key in startup.find_index_keys("PLACES_INDEX", variant):
+                if place_key not in seen_places:
                     seen_places.add(place_key)
                     variant_result["places"].append(place_key)
 
@@ -226,20 +226,23 @@ def scan_by_entities(resolved: dict, max_results: int = 50) -> list:
     unmatched_topics = []   # Topics not found in inverted index
 
     for person in resolved.get("persons", []):
-        idx_hits = startup.PERSONS_INDEX.get(person, [])
+        idx_hits = (
+            startup.canonical_person_docs(person)
+            or startup.lookup_entity("PERSONS_INDEX", person)
+        )
         if idx_hits:
             doc_indices.update(idx_hits)
         else:
             unmatched_persons.append(person)
 
     for dynasty in resolved.get("dynasties", []):
-        doc_indices.update(startup.DYNASTY_INDEX.get(dynasty, []))
+        doc_indices.update(startup.lookup_entity("DYNASTY_INDEX", dynasty))
 
     for topic in resolved.get("topics", []):
         # Topic synonyms map to canonical topics; search both keyword and text index
-        hits = startup.KEYWORD_INDEX.get(topic, [])
+        hits = startup.KEYWORD_INDEX.get(topic, ())
         topic_underscored = topic.replace(" ", "_")
-        hits_us = startup.KEYWORD_INDEX.get(topic_underscored, [])
+        hits_us = startup.KEYWORD_INDEX.get(topic_underscored, ())
         if hits or hits_us:
             doc_indices.update(hits)
             doc_indices.update(hits_us)
@@ -247,7 +250,7 @@ def scan_by_entities(resolved: dict, max_results: int = 50) -> list:
             unmatched_topics.append(topic)
 
     for place in resolved.get("places", []):
-        doc_indices.update(startup.PLACES_INDEX.get(place, []))
+        doc_indices.update(startup.lookup_entity("PLACES_INDEX", place))
 
     # --- TEXT-BASED FALLBACK ---
     # When inverted index has no entries, scan DOCUMENTS text fields directly.
@@ -446,18 +449,17 @@ def check_query_relevance(query: str, doc: dict, dynasty_filter: str = None) ->
 # EMBEDDING + SEARCH
 # ===================================================================
 
-@lru_cache(maxsize=1024)
-def get_cached_embedding(query: str):
+def _encode_queries(queries: list):
     """
-    Encodes and normalizes a query, caching the result to speed up repeated searches.
-    Uses ONNX Runtime + Transformers Tokenizer.
+    Encodes and normalizes a batch of queries in one ONNX run.
+    Uses ONNX Runtime + Transformers Tokenizer; returns [len(queries), dimension].
     """
     if startup.session is None or startup.tokenizer is None:
         raise RuntimeError("ONNX model is not loaded")
 
-    # 1. Tokenize (return numpy arrays)
+    # 1. Tokenize (return numpy arrays, padded to the longest query)
     inputs = startup.tokenizer(
-        query, 
+        queries, 
         return_tensors="np", 
         padding=True, 
         truncation=True, 
@@ -491,8 +493,111 @@ def get_cached_embedding(query: str):
     norm = np.linalg.norm(embedding, axis=1, keepdims=True)
     embedding = embedding / norm
     
+    return embedding.astype("float32")
+
+
+# Cached query vectors are stored half-precision: plenty to keep cosine
+# ordering, at half the memory per entry. Upcast before handing to FAISS.
+_EMBED_CACHE_DTYPE = np.float16
+
+
+def _stored_embedding(norm_query: str):
+    """Embedding persisted by a previous process (startup.EMBED_STORE), or None."""
+    if startup.EMBED_STORE is None:
+        return None
+    return startup.EMBED_STORE.get(norm_query)
+
+
+@lfu_cache(maxsize=2048)
+def _embed_normalized(norm_query: str):
+    """Embedding of an already-normalized query (the cache key)."""
+    stored = _stored_embedding(norm_query)
+    if stored is not None:
+        return stored
     # Flatten to [dimension]
-    return embedding[0].astype("float32")
+    return _encode_queries([norm_query])[0].astype(_EMBED_CACHE_DTYPE)
+
+
+def get_cached_embedding(query: str):
+    """
+    Encodes and normalizes a query, caching the result to speed up repeated searches.
+    The cache is keyed on normalize_query(query), so spellings that differ only
+    in case or whitespace share one entry whether or not the caller normalized.
+    LFU eviction keeps popular queries cached through bursts of one-off ones.
+    Misses are looked up in the persisted store before running the model.
+    Returns a float16 vector; use .astype(np.float32, copy=False) for FAISS.
+    """
+    return _embed_normalized(normalize_query(query))
+
+
+get_cached_embedding.cache_clear = _embed_normalized.cache_clear
+get_cached_embedding.cache_info = _embed_normalized.cache_info
+get_cached_embedding.cache_items = _embed_normalized.cache_items
+
+
+def get_cached_embeddings(queries: tuple):
+    """
+    Embeddings for several queries as one float16 [len(queries), dimension] array.
+    Cached queries come from get_cached_embedding's cache (or the persisted
+    store); the rest are encoded together in a single batch and written back.
+    """
+    keys = [normalize_query(q) for q in queries]
+    rows = [_embed_normalized.cache_get(k) for k in keys]
+    for i, (k, row) in enumerate(zip(keys, rows)):
+        if row is None:
+            stored = _stored_embedding(k)
+            if stored is not None:
+                rows[i] = _embed_normalized.cache_set(k, stored)
+    to_encode = list(dict.fromkeys(k for k, row in zip(keys, rows) if row is None))
+    if to_encode:
+        encoded = dict(zip(to_encode, _encode_queries(to_encode).astype(_EMBED_CACHE_DTYPE)))
+        rows = [
+            _embed_normalized.cache_set(k, encoded[k]) if row is None else row
+            for k, row in zip(keys, rows)
+        ]
+    return np.stack(rows)
+
+
+def prefetch_embeddings(queries) -> None:
+    """
+    Warms get_cached_embedding's cache for queries that are about to be
+    searched one at a time, so their misses share one encode batch.
+    No-op before the model is loaded; failures fall back to per-query encoding.
+    """
+    queries = tuple(queries)
+    if len(queries) < 2 or startup.session is None or startup.tokenizer is None:
+        return
+    try:
+        get_cached_embeddings(queries)
+    except Exception as e:
+        print(f"[WARN] Batched query embedding failed: {e}")
+
+
+def _search_variations(var_queries: tuple) -> list:
+    """
+    FAISS hits for each query variation as (scores, ids) rows, in input order.
+    One encode + one FAISS call for the whole set; if that batch fails, each
+    variation is retried on its own and only the ones that fail are skipped.
+    """
+    if not var_queries:
+        return []
+    try:
+        scores, ids = startup.index.search(
+            get_cached_embeddings(var_queries).astype(np.float32, copy=False), TOP_K
+        )
+        return list(zip(scores, ids))
+    except Exception as e:
+        print(f"[WARN] Batched variation search failed, retrying one by one: {e}")
+
+    rows = []
+    for var_query in var_queries:
+        try:
+            var_emb = get_cached_embedding(var_query).astype(np.float32, copy=False)
+            var_scores, var_ids = startup.index.search(np.expand_dims(var_emb, axis=0), TOP_K)
+            rows.append((var_scores[0], var_ids[0]))
+        except Exception as e:
+            print(f"[WARN] Search variation {var_query!r} failed: {e}")
+    return rows
 
 
 def semantic_search(query: str):
@@ -513,13 +618,12 @@ def semantic_search(query: str):
     dynasty_filter = detect_dynasty_from_query(query)
     place_filter = detect_place_from_query(query)
 
-    # Normalize query before searching/caching to increase hit rate
+    # get_cached_embedding normalizes before caching to increase hit rate
     try:
-        norm_q = normalize_query(query)
-        emb = get_cached_embedding(norm_q)
+        emb = get_cached_embedding(query)
 
         # FAISS requires 2D input: (n_queries, dim)
-        emb_2d = np.expand_dims(emb, axis=0)
+        emb_2d = np.expand_dims(emb, axis=0).astype(np.float32, copy=False)
 
         # Search wider for dynasty/place queries
         search_k = min(TOP_K * 3, 50) if (dynasty_filter or place_filter) else min(TOP_K * 2, 30)
@@ -582,23 +686,17 @@ def semantic_search(query: str):
         if len(results) < 3:
             resolved = resolve_query_entities(query)
             variations = generate_search_variations(query, resolved)
-            for var_query in variations[:4]:  # Max 4 variations
-                try:
-                    var_norm = normalize_query(var_query)
-                    var_emb = get_cached_embedding(var_norm)
-                    var_emb_2d = np.expand_dims(var_emb, axis=0)
-                    var_scores, var_ids = startup.index.search(var_emb_2d, TOP_K)
-                    for v_score, v_idx in zip(var_scores[0], var_ids[0]):
-                        if v_idx < 0 or v_score < threshold:
-                            continue
-                        if v_idx < len(startup.DOCUMENTS):
-                            doc = startup.DOCUMENTS[v_idx]
-                            if doc not in results:
-                                results.append(doc)
-                    if len(results) >= TOP_K:
-                        break
-                except Exception:
-                    continue  # Skip failed variations silently
+            var_queries = tuple(variations[:4])  # Max 4 variations
+            for v_scores, v_ids in _search_variations(var_queries):
+                for v_score, v_idx in zip(v_scores, v_ids):
+                    if v_idx < 0 or v_score < threshold:
+                        continue
+                    if v_idx < len(startup.DOCUMENTS):
+                        doc = startup.DOCUMENTS[v_idx]
+                        if doc not in results:
+                            results.append(doc)
+                if len(results) >= TOP_K:
+                    break
 
         return results
     except Exception as e:
@@ -609,6 +707,9 @@ def semantic_search(query: str):
 def scan_by_year(year: int):
     """
     Returns events for a specific year using an O(1) indexed lookup.
+    The list is the index's own (not a copy): callers must not mutate it.
+    For spans of years use scan_by_year_range, which bisects the year
+    column once instead of probing each year.
     """
     if startup.DOCUMENTS_BY_YEAR is None:
         return []
@@ -617,16 +718,12 @@ def scan_by_year(year: int):
 
 def scan_by_year_range(start_year: int, end_year: int):
     """
-    Returns events for a year range using indexed lookup.
-    Scans all years from start_year to end_year (inclusive).
+    Returns events for a year range (inclusive) using indexed lookup.
+    Bisects the sorted year list instead of scanning every year in the span.
     """
     if startup.DOCUMENTS_BY_YEAR is None:
         return []
-    results = []
-    for year in range(start_year, end_year + 1):
-        events = startup.DOCUMENTS_BY_YEAR.get(year, [])
-        results.extend(events)
-    return results
+    return startup.docs_in_year_range(start_year, end_year)
 
 
 # ===================================================================
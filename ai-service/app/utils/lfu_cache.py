@@ -0,0 +1,122 @@
+"""
+lfu_cache.py - Least-frequently-used memoization for single-argument functions.
+
+functools.lru_cache evicts the entry touched longest ago. Query traffic for
+the chatbot is heavily skewed towards a few hundred popular questions, so a
+one-off burst of new queries can push those out of an LRU. LFU eviction
+keeps them: the victim is the entry with the fewest hits, oldest first
+among ties.
+
+Frequencies live in buckets (count → insertion-ordered keys), so lookup,
+insert and eviction are all O(1). The wrapped function keeps the
+lru_cache-style API (cache_clear / cache_info) callers already use, plus
+cache_get / cache_set for callers that compute several misses in one batch
+and cache_items for callers that persist the contents.
+"""
+
+from collections import OrderedDict, namedtuple
+from functools import update_wrapper
+from threading import RLock
+
+# Same fields as functools.lru_cache().cache_info()
+CacheInfo = namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+
+def lfu_cache(maxsize: int = 128):
+    """Decorator: memoize a one-argument function, evicting least-frequently-used first."""
+    if maxsize <= 0:
+        raise ValueError("maxsize must be positive")
+
+    def decorator(func):
+        values = {}      # key -> cached result
+        freq_of = {}     # key -> hit count
+        buckets = {}     # hit count -> OrderedDict of keys (oldest first)
+        min_freq = 0
+        hits = misses = 0
+        lock = RLock()
+
+        def _touch(key):
+            nonlocal min_freq
+            freq = freq_of[key]
+            bucket = buckets[freq]
+            del bucket[key]
+            if not bucket:
+                del buckets[freq]
+                if min_freq == freq:
+                    min_freq = freq + 1
+            freq_of[key] = freq + 1
+            buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+        def _store(key, value):
+            """Insert under the lock; returns the value now cached for `key`."""
+            nonlocal min_freq
+            if key in values:  # another thread filled it meanwhile
+                return values[key]
+            if len(values) >= maxsize:
+                bucket = buckets[min_freq]
+                victim, _ = bucket.popitem(last=False)
+                if not bucket:
+                    del buckets[min_freq]
+                del values[victim]
+                del freq_of[victim]
+            values[key] = value
+            freq_of[key] = 1
+            buckets.setdefault(1, OrderedDict())[key] = None
+            min_freq = 1
+            return value
+
+        def cache_get(key, default=None):
+            """Cached value for `key` (counted as a hit), or `default` (a miss)."""
+            nonlocal hits, misses
+            with lock:
+                if key in values:
+                    hits += 1
+                    _touch(key)
+                    return values[key]
+                misses += 1
+                return default
+
+        def cache_set(key, value):
+            """Store a value computed outside the wrapper (e.g. in a batch)."""
+            with lock:
+                return _store(key, value)
+
+        _missing = object()
+
+        def wrapper(key):
+            value = cache_get(key, _missing)
+            if value is not _missing:
+                return value
+            # Compute outside the lock: the wrapped call can be slow
+            return cache_set(key, func(key))
+
+        def cache_clear():
+            nonlocal min_freq, hits, misses
+            with lock:
+                values.clear()
+                freq_of.clear()
+                buckets.clear()
+                min_freq = 0
+                hits = misses = 0
+
+        def cache_items():
+            """(key, value) pairs, most frequently hit first; does not count as hits."""
+            with lock:
+                return [
+                    (key, values[key])
+                    for freq in sorted(buckets, reverse=True)
+                    for key in reversed(buckets[freq])
+                ]
+
+        def cache_info():
+            with lock:
+                return CacheInfo(hits, misses, maxsize, len(values))
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_info = cache_info
+        wrapper.cache_get = cache_get
+        wrapper.cache_set = cache_set
+        wrapper.cache_items = cache_items
+        return update_wrapper(wrapper, func)
+
+    return decorator
@@ -1,26 +1,50 @@
-import re
 import unicodedata
 
 def remove_accents(input_str: str) -> str:
     s = unicodedata.normalize("NFD", input_str)
     return "".join(c for c in s if unicodedata.category(c) != "Mn")
 
+
+# Precomposed lowercase Vietnamese letters → base letter, in one str.translate call
+_VN_MARKED = "àáảãạâầấẩẫậăằắẳẵặèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵ"
+_VN_BASE = "aaaaaaaaaaaaaaaaaeeeeeeeeeeeiiiiiooooooooooooooooouuuuuuuuuuuyyyyy"
+# đ is a letter of its own, not a marked d: remove_accents keeps it
+_VN_STRIP = str.maketrans(_VN_MARKED, _VN_BASE)
+_VN_ASCII = str.maketrans(_VN_MARKED + "đ", _VN_BASE + "d")
+
+def to_ascii_key(text: str) -> str:
+    """
+    Lowercase, accent-free lookup key: "Trần Hưng Đạo" → "tran hung dao".
+    Vietnamese letters go through the translate table; anything it leaves
+    non-ASCII (decomposed input, other scripts' accents) falls back to NFD.
+    """
+    key = unicodedata.normalize("NFC", text.strip().lower()).translate(_VN_ASCII)
+    if key.isascii():
+        return key
+    return remove_accents(key).replace("đ", "d")
+
+# Zero-width space and BOM show up in pasted queries; str.split() keeps them
+_QUERY_WS = str.maketrans({"\u200b": " ", "\ufeff": " "})
+
 def normalize_query(query: str) -> str:
     """
     Normalizes query for semantic search.
     - Lowercases.
-    - Trims whitespace.
+    - Trims whitespace and collapses runs (zero-width spaces included).
     - Normalizes unicode (NFC preferred for consistency in Python strings).
     """
-    q = query.lower()
-    q = unicodedata.normalize("NFC", q)
-    q = re.sub(r"\s+", " ", q).strip()
-    return q
+    q = unicodedata.normalize("NFC", query.lower()).translate(_QUERY_WS)
+    return " ".join(q.split())
 
 def normalize(text: str) -> str:
     """
     Legacy normalization (removes accents).
     Used for entity matching where aliases are unaccented.
+    Same result as remove_accents(text.lower()); Vietnamese text takes the
+    translate-table path and only other scripts' accents fall back to NFD.
     """
     text = text.lower()
+    stripped = unicodedata.normalize("NFC", text).translate(_VN_STRIP)
+    if stripped.isascii() or stripped.replace("đ", "").isascii():
+        return stripped
     return remove_accents(text)
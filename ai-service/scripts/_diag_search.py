@@ -90,7 +90,7 @@ for query in queries:
     norm_q = normalize_query(query)
     print(f"    Normalized query: {norm_q[:80]}")
     emb = get_cached_embedding(norm_q)
-    emb_2d = np.expand_dims(emb, axis=0)
+    emb_2d = np.expand_dims(emb, axis=0).astype(np.float32, copy=False)
     
     search_k = min(TOP_K * 3, 50) if (dynasty or place) else min(TOP_K * 2, 30)
     scores, ids = startup.index.search(emb_2d, search_k)
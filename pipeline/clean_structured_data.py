@@ -7,7 +7,7 @@ from pipeline.storyteller import (
     extract_all_persons,
     extract_all_places,
     infer_subject,
-    extract_year,
+    extract_year_int,
     classify_nature
 )
 
@@ -114,11 +114,9 @@ def main():
                     year = int(raw_year)
                 except ValueError:
                     # Try extracting from text if year is invalid in field
-                    y_str = extract_year(raw_text)
-                    year = int(y_str) if y_str else 0
+                    year = extract_year_int(raw_text) or 0
             else:
-                y_str = extract_year(raw_text)
-                year = int(y_str) if y_str else 0
+                year = extract_year_int(raw_text) or 0
 
             if year == 0:
                 # Skip records without valid year? Or keep with 0?
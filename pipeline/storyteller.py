@@ -9,6 +9,8 @@ import random
 from multiprocessing import Pool, cpu_count
 from functools import lru_cache
 from collections import defaultdict
+from types import MappingProxyType
+from enum import IntFlag
 
 # Get project root (parent of pipeline folder)
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -58,6 +60,11 @@ PERSON_ALIASES = {
     "gia long": "Nguyễn Ánh",
 }
 
+# Chiều ngược: tên chuẩn (chữ thường) → các alias ("nguyễn huệ" → quang trung, ...)
+ALIASES_BY_CANONICAL: dict[str, tuple[str, ...]] = {}
+for _alias, _canon in PERSON_ALIASES.items():
+    ALIASES_BY_CANONICAL[_canon.lower()] = ALIASES_BY_CANONICAL.get(_canon.lower(), ()) + (_alias,)
+
 # Các tiền tố/từ khóa chỉ tập thể, địa danh hoặc tổ chức
 COLLECTIVE_PREFIXES = {
     "nhà", "triều", "quân", "nghĩa quân", "đế quốc", 
@@ -134,6 +141,11 @@ JUNK_PATTERNS = [
     r"Vào\s*,?",
     r"\*\*",
 ]
+JUNK_RES = [re.compile(p, re.I) for p in JUNK_PATTERNS]
+
+def keyword_pattern(words) -> re.Pattern:
+    """Một regex alternation thay cho any(w in text for w in words)."""
+    return re.compile("|".join(map(re.escape, words)))
 
 BAD_PERSON_KEYWORDS = {
     "Việt Nam", "Đại Việt", "Đại La", "Thăng Long", "Hoa Lư",
@@ -155,6 +167,7 @@ ACTION_GROUPS = [
     ("lên ngôi", "xưng vương"),
     ("thống nhất", "dẹp loạn"),
 ]
+ACTION_GROUP_PATTERNS = [keyword_pattern(g) for g in ACTION_GROUPS]
 
 
 INFORMATIVE_VERBS = [
@@ -172,6 +185,9 @@ STATE_VERBS = [
     "phát triển", "rơi vào", "bước vào"
 ]
 
+INFORMATIVE_OR_STATE = keyword_pattern(INFORMATIVE_VERBS + STATE_VERBS)
+INFORMATIVE_VERB_PREFIXES = tuple(INFORMATIVE_VERBS)
+
 STOPWORDS = {
     "diễn", "ra", "xảy", "xảy ra", "năm",
     "được", "bị", "là", "và", "ở",
@@ -287,17 +303,31 @@ ENTITY_REGISTRY = {
     }
 }
 
-ENTITY_LOOKUP: dict[str, str] = {}
+# Registry chỉ đọc: classify_entity, canonical_person... được lru_cache nên
+# sửa registry lúc chạy sẽ không có tác dụng (kết quả cũ vẫn nằm trong cache)
+ENTITY_REGISTRY = MappingProxyType({k: frozenset(v) for k, v in ENTITY_REGISTRY.items()})
+
+# Tên → loại, dựng một lần; tên thuộc nhiều nhóm lấy nhóm sau
+# ("Nhà Trần", "Quân Thanh": other → collective)
+# Khóa được intern để tên chuẩn (cũng intern) khớp bằng so sánh địa chỉ
+_lookup: dict[str, str] = {}
+for _kind, _names in ENTITY_REGISTRY.items():
+    for _n in _names:
+        _lookup[sys.intern(_n)] = _kind
+ENTITY_LOOKUP = MappingProxyType(_lookup)
 
-for kind, names in ENTITY_REGISTRY.items():
-    for n in names:
-        ENTITY_LOOKUP[n] = kind
+# Các loại trong registry chắc chắn không phải người
+NON_PERSON_KINDS = frozenset({"place", "collective"})
 
 
+@lru_cache(maxsize=8192)
 def classify_entity(name: str) -> str:
-    if name in ENTITY_REGISTRY["place"]:
-        return "place"
-    if name in ENTITY_REGISTRY["collective"]:
+    kind = ENTITY_LOOKUP.get(name)
+    if kind in NON_PERSON_KINDS:
+        return kind
+    # Ngoài registry: "Nghĩa quân Lam Sơn", "Tây Sơn quân" là tập thể
+    name_low = name.strip().lower()
+    if name_low.startswith(COLLECTIVE_NAME_PREFIXES) or name_low.endswith(COLLECTIVE_NAME_SUFFIXES):
         return "collective"
     if is_valid_person(name):
         return "person"
@@ -364,6 +394,10 @@ GLOBAL_PERSON_DENY = (
     }
 )
 
+COLLECTIVE_NAME_PREFIXES = ("nhà ", "triều ", "quân ", "nghĩa quân ", "đội ", "đảng ", "mặt trận ", "công ty ", "tập đoàn ")
+COLLECTIVE_NAME_SUFFIXES = (" triều", " quân", " tộc")
+ARTIFACT_KEYWORDS = keyword_pattern(["tuyên ngôn", "hiệp định", "chiến dịch", "trận", "đại phá", "khởi nghĩa", "bản đồ", "tác phẩm"])
+
 @lru_cache(maxsize=4096)
 def is_valid_person(name: str) -> bool:
     if not name: return False
@@ -373,7 +407,7 @@ def is_valid_person(name: str) -> bool:
     name_low = name_stripped.lower()
     
     # 1. Kiểm tra Registry để tránh nhầm Place/Collective thành Person
-    if name_stripped in ENTITY_REGISTRY["place"] or name_stripped in ENTITY_REGISTRY["collective"]:
+    if ENTITY_LOOKUP.get(name_stripped) in NON_PERSON_KINDS:
         return False
 
     # 2. Chặn theo danh sách GLOBAL_PERSON_DENY (Exact match check)
@@ -381,15 +415,11 @@ def is_valid_person(name: str) -> bool:
         return False
 
     # 3. Chặn theo tiền tố và hậu tố (Suffix check quan trọng cho "Mạc triều", "Tây Sơn quân")
-    collective_prefixes = ("nhà ", "triều ", "quân ", "nghĩa quân ", "đội ", "đảng ", "mặt trận ", "công ty ", "tập đoàn ")
-    collective_suffixes = (" triều", " quân", " tộc")
-    
-    if name_low.startswith(collective_prefixes) or name_low.endswith(collective_suffixes):
+    if name_low.startswith(COLLECTIVE_NAME_PREFIXES) or name_low.endswith(COLLECTIVE_NAME_SUFFIXES):
         return False
 
     # 4. Chặn từ khóa sự vật/sự kiện
-    artifact_keywords = {"tuyên ngôn", "hiệp định", "chiến dịch", "trận", "đại phá", "khởi nghĩa", "bản đồ", "tác phẩm"}
-    if any(k in name_low for k in artifact_keywords):
+    if ARTIFACT_KEYWORDS.search(name_low):
         return False
     
     # 5. Kiểm tra số từ (Tên người Việt: 2-5 từ)
@@ -416,37 +446,43 @@ def normalize_persons(persons: list[str]) -> list[str]:
     return sorted(result)
 
 
+EVALUATION_CLAUSE = re.compile(r",?\s*(mở ra|khẳng định|đánh dấu|thể hiện)[^,.]*", re.I)
+MULTISPACE = re.compile(r"\s+")
+
 def strip_evaluation(text: str) -> str:
-    return re.sub(
-        r",?\s*(mở ra|khẳng định|đánh dấu|thể hiện)[^,.]*",
-        "",
-        text,
-        flags=re.I
-    ).strip(" ,.")
+    return EVALUATION_CLAUSE.sub("", text).strip(" ,.")
+
+# Alias tra theo chữ thường; giữ alias khai báo trước khi trùng khóa
+_alias_lower: dict[str, str] = {}
+for _k, _v in PERSON_ALIAS.items():
+    _alias_lower.setdefault(sys.intern(_k.lower()), sys.intern(_v))
+PERSON_ALIAS_LOWER = MappingProxyType(_alias_lower)
+
+# Danh sách tước hiệu cần bóc tách (Sắp xếp từ dài đến ngắn)
+# Lưu ý: Không bóc "Thái Tổ", "Thánh Tông" vì chúng là một phần của tên (Miếu hiệu)
+PERSON_TITLES = tuple(
+    (t, t.lower()) for t in (
+        "Hưng Đạo Đại Vương", "Hưng Đạo Vương", "Bắc Bình Vương",
+        "Thái thượng hoàng", "Hoàng đế", "Trung tướng", "Đại tướng", "Thái sư",
+        "Vua", "Chúa"
+    )
+)
 
+@lru_cache(maxsize=2048)
 def canonical_person(name: str) -> str:
     if not name: return ""
     
     # 1. Chuẩn hóa khoảng trắng và hạ thấp chữ để lookup
-    name_norm = re.sub(r"\s+", " ", name.strip())
+    name_norm = MULTISPACE.sub(" ", name.strip())
+    name_low = name_norm.lower()
     
     # Thử tìm trực tiếp (case-insensitive)
-    for k, v in PERSON_ALIAS.items():
-        if k.lower() == name_norm.lower():
-            return v
-    
-    # 2. Danh sách tước hiệu cần bóc tách (Sắp xếp từ dài đến ngắn)
-    # Lưu ý: Không bóc "Thái Tổ", "Thánh Tông" vì chúng là một phần của tên (Miếu hiệu)
-    titles = [
-        "Hưng Đạo Đại Vương", "Hưng Đạo Vương", "Bắc Bình Vương", 
-        "Thái thượng hoàng", "Hoàng đế", "Trung tướng", "Đại tướng", "Thái sư",
-        "Vua", "Chúa"
-    ]
+    if name_low in PERSON_ALIAS_LOWER:
+        return PERSON_ALIAS_LOWER[name_low]
     
+    # 2. Bóc tước hiệu
     clean_name = name_norm
-    name_low = name_norm.lower()
-    for t in titles:
-        t_low = t.lower()
+    for t, t_low in PERSON_TITLES:
         # Kiểm tra tiền tố
         if name_low.startswith(t_low) and len(name_low) > len(t_low):
             clean_name = name_norm[len(t):].strip()
@@ -457,11 +493,10 @@ def canonical_person(name: str) -> str:
             break
             
     # Sau khi bóc tước hiệu, thử lookup lại
-    for k, v in PERSON_ALIAS.items():
-        if k.lower() == clean_name.lower():
-            return v
+    # Intern: cùng một tên xuất hiện ở hàng nghìn sự kiện dùng chung một chuỗi
+    return PERSON_ALIAS_LOWER.get(clean_name.lower()) or sys.intern(clean_name)
 
-    return clean_name
+PARENTHETICAL = re.compile(r"\(([^()]{2,50})\)")
 
 def extract_parenthetical_persons(text: str):
     persons = []
@@ -473,64 +508,59 @@ def extract_parenthetical_persons(text: str):
             return content  # ⬅️ GIỮ LẠI
         return ""
 
-    clean_text = re.sub(r"\(([^()]{2,50})\)", repl, text)
+    clean_text = PARENTHETICAL.sub(repl, text)
     return clean_text.strip(), persons
 
+ACTOR_ACTIONS = (
+    "đánh", "đánh bại", "đánh tan", "tiến công",
+    "chủ động", "dùng", "nhử",
+    "lên ngôi", "xưng vương",
+    "dựng", "lập", "ban",
+    "soạn", "viết",
+    "ra đi", "khởi xướng",
+    "lãnh đạo", "chỉ huy",
+    "đại phá", "tiêu diệt", "giải phóng"
+)
+
+POLITICAL_ACTIONS = (
+    "lên ngôi",
+    "nhường ngôi",
+    "ban chiếu",
+    "xưng vương",
+    "trị vì",
+    "đổi quốc hiệu",
+    "lập nhà",
+    "dựng chính quyền",
+    "ra đi",
+)
+
+def near_pattern(names, actions) -> re.Pattern:
+    """Một regex: tên bất kỳ đứng trước hoặc sau hành động bất kỳ (±40 ký tự)."""
+    n = "|".join(map(re.escape, names))
+    a = "|".join(map(re.escape, actions))
+    return re.compile(rf"(?:{n}).{{0,40}}(?:{a})|(?:{a}).{{0,40}}(?:{n})")
+
+@lru_cache(maxsize=4096)
+def actor_pattern(p: str) -> re.Pattern:
+    # tập alias: Quang Trung ↔ Nguyễn Huệ
+    return near_pattern((p, *ALIASES_BY_CANONICAL.get(p, ())), ACTOR_ACTIONS)
+
+@lru_cache(maxsize=4096)
+def political_actor_pattern(p: str) -> re.Pattern:
+    return near_pattern((p,), POLITICAL_ACTIONS)
+
 def is_person_actor(text: str, person: str) -> bool:
     """
     PERSON là actor nếu:
     - PERSON đứng gần động từ hành động (trước hoặc sau)
     - hoặc PERSON là alias của nhân vật thực hiện hành động
     """
-    t = text.lower()
-    p = person.lower()
-
-    # tập alias: Quang Trung ↔ Nguyễn Huệ
-    aliases = {p}
-    for k, v in PERSON_ALIASES.items():
-        if v.lower() == p:
-            aliases.add(k)
-
-    ACTIONS = [
-        "đánh", "đánh bại", "đánh tan", "tiến công",
-        "chủ động", "dùng", "nhử",
-        "lên ngôi", "xưng vương",
-        "dựng", "lập", "ban",
-        "soạn", "viết",
-        "ra đi", "khởi xướng",
-        "lãnh đạo", "chỉ huy",
-        "đại phá", "tiêu diệt", "giải phóng"
-    ]
-
-    for name in aliases:
-        for act in ACTIONS:
-            # PERSON trước hoặc sau verb (±40 ký tự)
-            if re.search(rf"{name}.{{0,40}}{act}", t):
-                return True
-            if re.search(rf"{act}.{{0,40}}{name}", t):
-                return True
-
-    return False
+    return bool(actor_pattern(person.lower()).search(text.lower()))
 
 def is_political_actor(text: str, person: str) -> bool:
-    t = text.lower()
-    p = person.lower()
+    return bool(political_actor_pattern(person.lower()).search(text.lower()))
 
-    for k in [
-        "lên ngôi",
-        "nhường ngôi",
-        "ban chiếu",
-        "xưng vương",
-        "trị vì",
-        "đổi quốc hiệu",
-        "lập nhà",
-        "dựng chính quyền",
-        "ra đi",
-    ]:
-        if re.search(rf"{p}.{{0,40}}{k}|{k}.{{0,40}}{p}", t):
-            return True
-
-    return False
+KING_TEMPLE_NAME = re.compile(r"(thái\s+(tổ|tông)|thánh\s+tông|nhân\s+tông)$")
 
 def extract_persons_from_body(text: str) -> set[str]:
     all_persons = set(cached_extract_all_persons(text))
@@ -539,7 +569,7 @@ def extract_persons_from_body(text: str) -> set[str]:
     # 👑 vua → luôn là subject
     kings = {
         p for p in all_persons
-        if re.search(r"(thái\s+(tổ|tông)|thánh\s+tông|nhân\s+tông)$", p.lower())
+        if KING_TEMPLE_NAME.search(p.lower())
     }
     if kings:
         return {canonical_person(k) for k in kings}
@@ -550,33 +580,38 @@ def extract_persons_from_body(text: str) -> set[str]:
 
     return subjects
 
+NATIONAL_DAY = re.compile(r"2/9/?\s*1945")
+CLAUSE_PUNCT = re.compile(r"[;:]")
+LEADING_YEAR = re.compile(r"^(Vào\s+)?năm\s+[0-9]{3,4}[,:]?\s*", re.I)
+
+# Mở rộng danh sách hành động cốt lõi để giữ lại các sự kiện như 'giải phóng'
+CLEAN_CORE_ACTIONS = keyword_pattern([
+    "lên ngôi", "xưng vương", "dời đô", "thành lập", "đánh bại",
+    "ký", "ban hành", "giải phóng", "khởi nghĩa", "đại phá",
+    "chiến thắng", "thắng lợi", "tuyên ngôn"
+])
+
 def clean_text(text):
     """Làm sạch và chuẩn hóa văn bản lịch sử."""
     if not text: return None
     
     # Loại bỏ junk patterns
-    for p in JUNK_PATTERNS:
-        text = re.sub(p, "", text, flags=re.I)
+    for p in JUNK_RES:
+        text = p.sub("", text)
 
     # Chuẩn hóa ngày tháng đặc biệt
-    text = re.sub(r"2/9/?\s*1945", "ngày 2 tháng 9 năm 1945", text)
+    text = NATIONAL_DAY.sub("ngày 2 tháng 9 năm 1945", text)
     
     # Xử lý dấu câu
-    text = re.sub(r"[;:]", ".", text)
-    text = re.sub(r"\s+", " ", text)
+    text = CLAUSE_PUNCT.sub(".", text)
+    text = MULTISPACE.sub(" ", text)
     
     # Loại bỏ mốc thời gian thừa ở đầu câu
-    text = re.sub(r"^(Vào\s+)?năm\s+[0-9]{3,4}[,:]?\s*", "", text, flags=re.I)
+    text = LEADING_YEAR.sub("", text)
     
     final = text.strip(" ,.-")
     
-    # Mở rộng danh sách hành động cốt lõi để giữ lại các sự kiện như 'giải phóng'
-    core_actions = {
-        "lên ngôi", "xưng vương", "dời đô", "thành lập", "đánh bại", 
-        "ký", "ban hành", "giải phóng", "khởi nghĩa", "đại phá",
-        "chiến thắng", "thắng lợi", "tuyên ngôn"
-    }
-    is_important = any(act in final.lower() for act in core_actions)
+    is_important = bool(CLEAN_CORE_ACTIONS.search(final.lower()))
     
     # Nếu câu quá ngắn và không chứa hành động quan trọng -> Loại
     if len(final) < 15 and not is_important:
@@ -592,13 +627,18 @@ CORE_ACTIONS = [
     "thành lập", "đổi quốc hiệu",
     "giải phóng", "thống nhất"
 ]
+CORE_ACTION_PATTERN = keyword_pattern(CORE_ACTIONS)
+
+# Mệnh đề nêu hệ quả lịch sử, luôn được giữ khi gộp/rút gọn sự kiện
+CONSEQUENCE_KEYWORDS = keyword_pattern(["mở ra", "chấm dứt", "khẳng định"])
 
 def choose_representative_event(events: list[str]) -> str:
     def score(e: str):
         s = 0
-        if any(k in e.lower() for k in ["mở ra", "chấm dứt", "khẳng định"]):
+        e_low = e.lower()
+        if CONSEQUENCE_KEYWORDS.search(e_low):
             s += 2
-        if any(k in e.lower() for k in CORE_ACTIONS):
+        if CORE_ACTION_PATTERN.search(e_low):
             s += 2
         s += len(e) / 100
         return s
@@ -611,15 +651,45 @@ GEO_PATTERN = re.compile(
     re.I
 )
 
+def build_registry_automaton():
+    """Automaton Aho-Corasick: tên địa danh/tập thể → loại; None nếu thiếu pyahocorasick."""
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+    automaton = ahocorasick.Automaton()
+    for name, kind in ENTITY_LOOKUP.items():
+        if kind in NON_PERSON_KINDS:
+            automaton.add_word(name, (kind, name))
+    automaton.make_automaton()
+    return automaton
+
+REGISTRY_AC = build_registry_automaton()
+# Dự phòng khi không có pyahocorasick: mỗi loại một alternation. Lookahead để
+# các tên chồng lấn nhau vẫn được bắt đủ (không tên nào là tiền tố của tên khác)
+REGISTRY_PATTERNS = {
+    kind: re.compile("(?=(" + "|".join(map(re.escape, sorted(
+        (n for n, k in ENTITY_LOOKUP.items() if k == kind), key=len, reverse=True
+    ))) + "))")
+    for kind in NON_PERSON_KINDS
+}
+
+def registry_mentions(text: str, kind: str) -> set[str]:
+    """
+    Các tên thuộc loại `kind` ("place"/"collective") của registry xuất hiện
+    trong text (một lượt quét). Tên trả về là bản intern của registry.
+    """
+    if REGISTRY_AC is None:
+        return set(map(sys.intern, REGISTRY_PATTERNS[kind].findall(text)))
+    return {name for _end, (k, name) in REGISTRY_AC.iter(text) if k == kind}
+
 def extract_all_places(text: str) -> set[str]:
     places = set()
     if not text:
         return places
 
     # 1. Kiểm tra Registry
-    for p in ENTITY_REGISTRY["place"]:
-        if p in text:
-            places.add(p)
+    places.update(registry_mentions(text, "place"))
 
     # 2. Regex cho các thực thể địa lý phổ biến
     for m in GEO_PATTERN.finditer(text):
@@ -628,38 +698,50 @@ def extract_all_places(text: str) -> set[str]:
         words = p.split()
         if words and all(w[0].isupper() for w in words):
             if len(p) > 2 and p.lower() not in STOPWORDS:
-                places.add(p)
+                places.add(sys.intern(p))
 
     return places
 
+# Các từ khóa tiền tố chỉ tổ chức/địa danh để loại trừ name match ngay sau nó
+PERSON_EXCLUDE_CONTEXT = keyword_pattern(["công ty", "tập đoàn", "hãng", "tỉnh", "thành phố", "huyện", "xã"])
+
+@lru_cache(maxsize=8192)
+def person_from_candidate(raw: str):
+    """Tên chuẩn của một match PERSON_PATTERN, hoặc None nếu không phải người."""
+    p = canonical_person(raw.strip())
+
+    # validate hình thức người
+    if not is_valid_person(p):
+        return None
+
+    # loại nếu entity registry nói KHÔNG phải người
+    kind = classify_entity(p)
+    if kind and kind != "person":
+        return None
+
+    return p
+
 def extract_all_persons(text: str) -> set[str]:
     persons: set[str] = set()
 
     if not text:
         return persons
 
-    # Danh sách các từ khóa tiền tố chỉ tổ chức/địa danh để loại trừ name match ngay sau nó
-    exclude_prefixes = ["công ty", "tập đoàn", "hãng", "tỉnh", "thành phố", "huyện", "xã"]
+    # Hạ chữ thường một lần cho cả câu; chỉ cắt lại từng đoạn nếu lower() làm đổi độ dài
+    low = text.lower()
+    if len(low) != len(text):
+        low = None
 
     for m in PERSON_PATTERN.finditer(text):
         # Kiểm tra ngữ cảnh phía trước để tránh bắt nhầm tên công ty/địa danh là người
-        prefix_context = text[max(0, m.start()-20):m.start()].lower()
-        if any(ex in prefix_context for ex in exclude_prefixes):
+        start = m.start()
+        before = low[max(0, start-20):start] if low is not None else text[max(0, start-20):start].lower()
+        if PERSON_EXCLUDE_CONTEXT.search(before):
             continue
 
-        raw = m.group(1).strip()
-        p = canonical_person(raw)
-
-        # validate hình thức người
-        if not is_valid_person(p):
-            continue
-
-        # loại nếu entity registry nói KHÔNG phải người
-        kind = classify_entity(p)
-        if kind and kind != "person":
-            continue
-
-        persons.add(p)
+        p = person_from_candidate(m.group(1))
+        if p:
+            persons.add(p)
 
     return persons
 
@@ -702,35 +784,56 @@ def pick_tone(tones):
     return tones
 
 
+def build_person_index(timeline) -> dict[str, list[tuple]]:
+    """Tên người (chữ thường) → [(năm, event)] theo đúng thứ tự của timeline."""
+    index = defaultdict(list)
+    for year, block in timeline.items():
+        for e in block.get("events", []):
+            for p in e.get("persons_all") or []:
+                if isinstance(p, str):
+                    index[p.lower()].append((year, e))
+    return dict(index)
+
+# Chỉ mục của timeline gần nhất: (timeline, index). Timeline coi như chỉ đọc
+# sau khi nạp; sửa timeline tại chỗ thì đặt lại PERSON_INDEX = (None, {})
+PERSON_INDEX = (None, {})
+
+def person_index(timeline) -> dict[str, list[tuple]]:
+    global PERSON_INDEX
+    cached_timeline, index = PERSON_INDEX
+    if cached_timeline is not timeline:
+        index = build_person_index(timeline)
+        PERSON_INDEX = (timeline, index)
+    return index
+
 def ask_by_person(timeline, name: str):
     if not name:
         return None
 
-    name = canonical_person(name)
+    name_low = canonical_person(name).lower()
     results = []
 
-    for year, block in timeline.items():
-        for e in block.get("events", []):
-            persons_all = e.get("persons_all") or []
-
-            for p in persons_all:
-                if isinstance(p, str) and p.lower() == name.lower():
-                    subject = infer_subject(
-                        e["event"],
-                        set(e.get("persons", [])),
-                        e.get("nature", [])
-                    )
-                    results.append(
-                        storyteller(
-                            int(year),
-                            pick_tone(e.get("tone", [])),
-                            e["event"],
-                            subject
-                        )
-                    )
+    for year, e in person_index(timeline).get(name_low, ()):
+        subject = infer_subject(
+            e["event"],
+            set(e.get("persons", [])),
+            e.get("nature", [])
+        )
+        results.append(
+            storyteller(
+                int(year),
+                pick_tone(e.get("tone", [])),
+                e["event"],
+                subject
+            )
+        )
 
     return results or None
 
+INFORMATIVE_NOUNS = re.compile(
+    r"(quân|đô|kinh|sông|thành|hiệp định|quốc hiệu|bài|tác phẩm|cải cách)"
+)
+
 def remove_non_informative_clauses(text):
     clauses = [c.strip() for c in text.split(",") if c.strip()]
     kept = []
@@ -744,18 +847,17 @@ def remove_non_informative_clauses(text):
 
         lc = c.lower()
 
-        if any(v in lc for v in INFORMATIVE_VERBS + STATE_VERBS):
+        if INFORMATIVE_OR_STATE.search(lc):
             kept.append(c)
             continue
 
-        if re.search(
-            r"(quân|đô|kinh|sông|thành|hiệp định|quốc hiệu|bài|tác phẩm|cải cách)",
-            lc
-        ):
+        if INFORMATIVE_NOUNS.search(lc):
             kept.append(c)
 
     return ", ".join(kept)
 
+SPACE_BEFORE_COMMA = re.compile(r"\s+,")
+
 def remove_year_phrases(text, year):
     text = re.sub(
         rf"(diễn ra|xảy ra)(?:\s+(?:vào|trong))?\s+năm\s+{year}",
@@ -763,7 +865,7 @@ def remove_year_phrases(text, year):
         text,
         flags=re.I
     )
-    return re.sub(r"\s+,", ",", text).strip(" ,.")
+    return SPACE_BEFORE_COMMA.sub(",", text).strip(" ,.")
 
 def force_person_from_text(event_text: str) -> list[str]:
     forced = []
@@ -783,6 +885,9 @@ def force_person_from_text(event_text: str) -> list[str]:
     return forced
 
 
+# Các trường danh sách được hợp (union + sort) khi gộp sự kiện trùng
+MERGED_LIST_FIELDS = ("persons", "persons_all", "places", "nature", "tone", "keywords")
+
 def merge_events_by_year(events: list[dict]) -> list[dict]:
     """
     Merge các sự kiện TRÙNG NỘI DUNG trong cùng một năm
@@ -799,31 +904,19 @@ def merge_events_by_year(events: list[dict]) -> list[dict]:
 
     merged_events: list[dict] = []
 
-    # 2️⃣ Merge từng bucket
+    # 2️⃣ Merge từng bucket: gom mọi trường danh sách trong một lượt qua bucket
     for bucket in buckets.values():
+        merged = {field: set() for field in MERGED_LIST_FIELDS}
+        for b in bucket:
+            for field, values in merged.items():
+                values.update(b.get(field, ()))
+
         base = {
             "year": bucket[0]["year"],
             "event": choose_representative_event(
                 [b["event"] for b in bucket]
             ),
-            "persons": sorted(
-                set(p for b in bucket for p in b.get("persons", []))
-            ),
-            "persons_all": sorted(
-                set(p for b in bucket for p in b.get("persons_all", []))
-            ),
-            "places": sorted(
-                set(p for b in bucket for p in b.get("places", []))
-            ),
-            "nature": sorted(
-                set(n for b in bucket for n in b.get("nature", []))
-            ),
-            "tone": sorted(
-                set(t for b in bucket for t in b.get("tone", []))
-            ),
-            "keywords": sorted(
-                set(k for b in bucket for k in b.get("keywords", []))
-            ),
+            **{field: sorted(values) for field, values in merged.items()},
             "dynasty": bucket[0].get("dynasty", "Khác")
         }
 
@@ -849,18 +942,23 @@ def build_year_summary(events):
 
     return "Một năm có những chuyển biến quan trọng trong tiến trình lịch sử."
 
-def extract_year(text: str):
+ANNIVERSARY = re.compile(r"(kỉ niệm|kỷ niệm)\s+\d+\s+năm", re.I)
+# Từ chỉ số lượng quân/vật: số đứng sau chúng không phải năm
+QUANTITY_CONTEXT = keyword_pattern(["vạn", "nghìn", "chiến thuyền", "binh", "chiến sĩ"])
+
+def extract_year_int(text: str) -> int | None:
+    """Năm của sự kiện dạng int (mỗi số chỉ parse một lần), hoặc None."""
     # Ưu tiên định dạng ngày/tháng/năm
     if m := DATE_WITH_YEAR.search(text):
-        return m.group(2)
+        return int(m.group(2))
     
     # Loại bỏ các số là phần của "kỉ niệm X năm"
-    text_clean = re.sub(r"(kỉ niệm|kỷ niệm)\s+\d+\s+năm", "", text, flags=re.I)
+    text_clean = ANNIVERSARY.sub("", text)
 
     # Ưu tiên "năm X"
     if m := YEAR_INLINE.search(text_clean):
-        y = m.group(1)
-        if 40 <= int(y) <= 2025:
+        y = int(m.group(1))
+        if 40 <= y <= 2025:
             return y
 
     # Tìm tất cả các số có 3-4 chữ số
@@ -873,42 +971,95 @@ def extract_year(text: str):
             pos = text.find(val)
             if pos > 0:
                 prefix = text[max(0, pos-15):pos].lower()
-                if any(k in prefix for k in ["vạn", "nghìn", "chiến thuyền", "binh", "chiến sĩ"]):
+                if QUANTITY_CONTEXT.search(prefix):
                     continue
-            return val
+            return year_int
             
     return None
 
+def extract_year(text: str) -> str | None:
+    """extract_year_int dạng chuỗi (các pattern không cho số 0 đứng đầu nên str() giữ nguyên chữ số)."""
+    y = extract_year_int(text)
+    return None if y is None else str(y)
+
+SPACE_BEFORE_DOT = re.compile(r"\s+\.")
+DOT_RUN = re.compile(r"\.+")
+
 def purge(text):
-    text = re.sub(r"\s+\.", ".", text)
-    text = re.sub(r"\.+", ".", text)
+    text = SPACE_BEFORE_DOT.sub(".", text)
+    text = DOT_RUN.sub(".", text)
     return text.strip(" .,-")
 
-def classify_tone(text: str, year: str | None = None) -> set[str]:
-    t = text.lower()
-    tones = set()
-
+# Từ khóa phân loại giọng điệu (tone) và tính chất (nature), theo nhóm
+KEYWORD_CATEGORIES = {
     # Nhóm Hào hùng (Heroic) - Thêm các từ khóa từ test case
-    heroic_keywords = [
+    "heroic": [
         "chiến thắng", "lừng lẫy", "chấn động",
         "đánh bại", "đánh tan", "đẩy lui", "toàn thắng", "giải phóng",
         "thống nhất", "giành độc lập", "tự chủ", "chấm dứt ách",
         "vang dội", "hào khí", "oanh liệt", "thắng lợi", "đại phá", "thắng trận"
-    ]
-    
+    ],
     # Nhóm Bi thương/Trầm lắng (Somber/Tragic)
-    tragic_keywords = [
+    "tragic": [
         "tàn phá", "điêu linh", "tổn thất", "đau đớn",
         "bị xâm lược", "mất nước", "bắc thuộc", "minh thuộc",
         "chia cắt", "áp đặt", "lầm than", "đau thương", "mất mát",
         "hy sinh", "khó khăn", "thất bại", "chiếm đóng",
         "thiêu rụi", "máu chảy thành sông", "nỗi nhục"
-    ]
+    ],
+    # Nhóm quân sự
+    "military": ["đánh bại", "đại phá", "chiến thắng", "đập tan", "chiến dịch", "giải phóng", "vùng lên", "thắng lợi", "xâm lược"],
+    # Nhóm thể chế / chính trị
+    "institutional": ["ban hành", "luật", "hình thư", "hiến pháp", "ký kết", "hiệp định", "dời đô", "giành chính quyền", "tuyên ngôn", "chiếu", "hội kiến"],
+    # Nhóm sự kiện chung
+    "event": ["thành lập", "lên ngôi", "xưng vương", "khởi nghĩa", "đổi tên", "thành phố", "dời đô"],
+    # Nhóm kinh tế
+    "economy": ["thương cảng", "mở cửa", "giao thương", "kinh tế", "thuế"],
+    # Nhóm văn hóa
+    "culture": ["văn miếu", "giáo dục", "văn hóa", "nghệ thuật", "xây dựng đền"],
+}
+
+def build_keyword_automaton():
+    """Automaton Aho-Corasick: từ khóa → các nhóm chứa nó; None nếu thiếu pyahocorasick."""
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+    groups = defaultdict(set)
+    for category, words in KEYWORD_CATEGORIES.items():
+        for w in words:
+            groups[w].add(category)
+    automaton = ahocorasick.Automaton()
+    for w, categories in groups.items():
+        automaton.add_word(w, frozenset(categories))
+    automaton.make_automaton()
+    return automaton
+
+KEYWORD_AC = build_keyword_automaton()
+# Dự phòng khi không có pyahocorasick: một alternation cho mỗi nhóm
+CATEGORY_PATTERNS = {c: keyword_pattern(ws) for c, ws in KEYWORD_CATEGORIES.items()}
 
-    if any(k in t for k in heroic_keywords):
+@lru_cache(maxsize=4096)
+def keyword_categories(text_low: str) -> frozenset[str]:
+    """
+    Các nhóm có ít nhất một từ khóa xuất hiện trong text_low (một lượt quét).
+    Cache để classify_nature và classify_tone trên cùng một câu chỉ quét một lần.
+    """
+    if KEYWORD_AC is None:
+        return frozenset(c for c, p in CATEGORY_PATTERNS.items() if p.search(text_low))
+    found = set()
+    for _end, categories in KEYWORD_AC.iter(text_low):
+        found |= categories
+    return frozenset(found)
+
+def classify_tone(text: str, year: str | None = None) -> set[str]:
+    categories = keyword_categories(text.lower())
+    tones = set()
+
+    if "heroic" in categories:
         tones.add("heroic")
 
-    if any(k in t for k in tragic_keywords):
+    if "tragic" in categories:
         tones.add("somber") # Sử dụng 'somber' thống nhất với test case
 
     # Tương thích ngược với nhãn 'tragic' nếu bạn vẫn muốn dùng
@@ -930,35 +1081,24 @@ def classify_tone(text: str, year: str | None = None) -> set[str]:
 
 @lru_cache(maxsize=2048)
 def classify_nature(text: str) -> tuple[str, ...]:
-    text_low = text.lower()
+    categories = keyword_categories(text.lower())
     labels = []
-    
-    # Nhóm quân sự
-    mil_keywords = ["đánh bại", "đại phá", "chiến thắng", "đập tan", "chiến dịch", "giải phóng", "vùng lên", "thắng lợi", "xâm lược"]
-    # Nhóm thể chế / chính trị
-    inst_keywords = ["ban hành", "luật", "hình thư", "hiến pháp", "ký kết", "hiệp định", "dời đô", "giành chính quyền", "tuyên ngôn", "chiếu", "hội kiến"]
-    # Nhóm sự kiện chung
-    event_keywords = ["thành lập", "lên ngôi", "xưng vương", "khởi nghĩa", "đổi tên", "thành phố", "dời đô"]
-    # Nhóm kinh tế
-    econ_keywords = ["thương cảng", "mở cửa", "giao thương", "kinh tế", "thuế"]
-    # Nhóm văn hóa
-    cult_keywords = ["văn miếu", "giáo dục", "văn hóa", "nghệ thuật", "xây dựng đền"]
 
-    if any(k in text_low for k in mil_keywords):
+    if "military" in categories:
         labels.append("military")
         labels.append("historical_event")
     
-    if any(k in text_low for k in inst_keywords):
+    if "institutional" in categories:
         labels.append("institutional")
         labels.append("historical_event")
         
-    if any(k in text_low for k in event_keywords):
+    if "event" in categories:
         labels.append("historical_event")
 
-    if any(k in text_low for k in econ_keywords):
+    if "economy" in categories:
         labels.append("economy")
 
-    if any(k in text_low for k in cult_keywords):
+    if "culture" in categories:
         labels.append("culture")
 
     if not labels:
@@ -966,20 +1106,33 @@ def classify_nature(text: str) -> tuple[str, ...]:
         
     return tuple(sorted(set(labels)))
 
+SENTENCE_SPLIT = re.compile(r'\.\s*')
+# Động từ lịch sử mở ra một sự kiện mới khi tách mệnh đề
+NEW_EVENT_VERBS = keyword_pattern(INFORMATIVE_VERBS + ["đại phá", "giải phóng", "vùng lên", "giành"])
+VAGUE_KEYWORDS = keyword_pattern(["có mưa", "vui vẻ", "phức tạp", "bình thường", "đẹp", "là một vùng đất"])
+CORE_HISTORICAL_ACTIONS = keyword_pattern([
+    "tiêu diệt", "dời đô", "lên ngôi", "xưng vương", "đánh bại", "đánh tan",
+    "giải phóng", "tuyên ngôn", "hiệp định", "chiến thắng", "thắng lợi",
+    "thành lập", "ban hành", "khởi nghĩa", "đại phá", "vùng lên", "giành độc lập",
+    "đánh đuổi", "xâm lược", "hội kiến", "nghiên cứu", "giành chính quyền"
+])
+IMPORTANT_ANCHORS = keyword_pattern([
+    "thăng long", "nhà trần", "nhà lê", "nhà lý", "nhân dân",
+    "bạch đằng", "điện biên phủ", "ngọc hồi", "đống đa"
+])
+
 def normalize(text: str) -> list[tuple]:
     """Chuẩn hóa và phân loại thông tin sự kiện lịch sử, hỗ trợ tách nhiều sự kiện."""
-    year_str = extract_year(text)
-    if not year_str: return []
-    try:
-        year_int = int(year_str)
-    except ValueError:
-        return []
+    # Loại câu hỏi trước khi tìm năm (kiểm tra rẻ nhất trước)
+    if not text or text.strip().endswith("?"): return []
+    year_int = extract_year_int(text)
+    if year_int is None: return []
+    year_str = str(year_int)
     
     dynasty = get_dynasty(year_int)
-    if text.strip().endswith("?"): return []
 
     # Tách sự kiện theo dấu chấm hoặc dấu phẩy (nếu có động từ mạnh)
-    raw_parts = re.split(r'\.\s*', text)
+    raw_parts = SENTENCE_SPLIT.split(text)
     refined_parts = []
     for p in raw_parts:
         clauses = [c.strip() for c in p.split(',') if c.strip()]
@@ -987,7 +1140,7 @@ def normalize(text: str) -> list[tuple]:
             current_event = ""
             for c in clauses:
                 # Nếu clause có động từ lịch sử quan trọng -> coi là sự kiện mới
-                if any(v in c.lower() for v in INFORMATIVE_VERBS + ["đại phá", "giải phóng", "vùng lên", "giành"]):
+                if NEW_EVENT_VERBS.search(c.lower()):
                     if current_event:
                         refined_parts.append(current_event)
                     current_event = c
@@ -1008,59 +1161,48 @@ def normalize(text: str) -> list[tuple]:
         body = clean_text(part)
         if not body or len(body.split()) < 3: continue
 
+        body_low = body.lower()
+
         # Kiểm tra bẫy nội dung mơ hồ
-        vague_keywords = {"có mưa", "vui vẻ", "phức tạp", "bình thường", "đẹp", "là một vùng đất"}
-        if any(vk in body.lower() for vk in vague_keywords):
+        if VAGUE_KEYWORDS.search(body_low):
             continue
 
-        all_extracted = extract_all_persons(body)
-        persons_valid = {p for p in all_extracted if is_valid_person(p)}
+        # Quét PERSON_PATTERN một lần: extract_persons_from_body đọc lại cùng kết quả từ cache
+        persons_valid = set(cached_extract_all_persons(body))
         subjects = extract_persons_from_body(body)
 
         # Kế thừa chủ thể nếu phần này thiếu chủ ngữ nhưng có hành động
         if subjects:
             primary_subject = sorted(list(subjects))[0]
-        elif primary_subject and (body[0].islower() or any(body.lower().startswith(v) for v in INFORMATIVE_VERBS)):
+        elif primary_subject and (body[0].islower() or body_low.startswith(INFORMATIVE_VERB_PREFIXES)):
             subjects = {primary_subject}
 
-        places = extract_all_places(body)
-        nature = classify_nature(body)
-        tone = list(classify_tone(body, year_str))
-
-        # Logic giữ lại sự kiện
-        keep = False
-        body_low = body.lower()
-        if persons_valid or subjects:
-            keep = True
-
-        core_historical_actions = {
-            "tiêu diệt", "dời đô", "lên ngôi", "xưng vương", "đánh bại", "đánh tan",
-            "giải phóng", "tuyên ngôn", "hiệp định", "chiến thắng", "thắng lợi",
-            "thành lập", "ban hành", "khởi nghĩa", "đại phá", "vùng lên", "giành độc lập",
-            "đánh đuổi", "xâm lược", "hội kiến", "nghiên cứu", "giành chính quyền"
-        }
-        if any(act in body_low for act in core_historical_actions):
-            keep = True
+        # Logic giữ lại sự kiện: quyết định trước, chỉ phần được giữ mới
+        # phải trích địa danh, tính chất và giọng điệu
+        keep = bool(persons_valid or subjects) or bool(CORE_HISTORICAL_ACTIONS.search(body_low))
 
-        important_anchors = {
-            "thăng long", "nhà trần", "nhà lê", "nhà lý", "nhân dân",
-            "bạch đằng", "điện biên phủ", "ngọc hồi", "đống đa"
-        }
-        if any(anchor in body_low for anchor in important_anchors):
-            if any(n in nature for n in ["military", "institutional", "historical_event"]):
+        if not keep and IMPORTANT_ANCHORS.search(body_low):
+            # classify_nature được cache nên lần gọi lại bên dưới không tính lại
+            if any(n in classify_nature(body) for n in ["military", "institutional", "historical_event"]):
                 keep = True
 
-        if keep:
-            results.append((
-                year_str,
-                body,
-                list(nature),
-                tone,
-                set(subjects),
-                set(persons_valid),
-                set(places),
-                dynasty
-            ))
+        if not keep:
+            continue
+
+        nature = classify_nature(body)
+        places = extract_all_places(body)
+        tone = list(classify_tone(body, year_str))
+
+        results.append((
+            year_str,
+            body,
+            list(nature),
+            tone,
+            set(subjects),
+            set(persons_valid),
+            set(places),
+            dynasty
+        ))
 
     return results
 
@@ -1076,6 +1218,22 @@ TRAGIC_ENDINGS = [
     "Thời kỳ ấy ghi dấu nỗi đau và những tổn thất nặng nề của đất nước.",
 ]
 
+def normalize_batch(texts: list[str], processes: int = 1) -> list[list[tuple]]:
+    """
+    normalize() cho cả danh sách câu, giữ nguyên thứ tự đầu vào.
+    Câu trùng lặp (rất nhiều trong corpus hội thoại) chỉ được chuẩn hóa một lần;
+    processes > 1 thì chia các câu duy nhất cho Pool.
+    """
+    unique = list(dict.fromkeys(texts))
+    if processes > 1 and len(unique) > 1:
+        with Pool(processes=processes) as pool:
+            results = pool.map(normalize, unique)
+    else:
+        results = [normalize(t) for t in unique]
+
+    by_text = dict(zip(unique, results))
+    return [by_text[t] for t in texts]
+
 def storyteller(year, kind=None, content=None, subject=None):
     if isinstance(year, list):
         events = year
@@ -1179,13 +1337,19 @@ def collapse_year_events(events: list[dict]) -> list[dict]:
     return collapsed
 
 
+NON_WORD_RUN = re.compile(r"\W+")
+LOWER_PHRASE = re.compile(r"[a-zà-ỹ]+(?:\s+[a-zà-ỹ]+){1,3}")
+CAPITALIZED_NAME = re.compile(r"[A-ZĐÂÊÔƯ][a-zà-ỹ]+(?:\s+[A-ZĐÂÊÔƯ][a-zà-ỹ]+)+")
+SENTENCE_BREAK = re.compile(r"\.\s+")
+FRAGMENT_BREAK = re.compile(r"\.\s+([a-zà-ỹ])", re.I)
+
 def deduplicate_phrases(text):
-    parts = re.split(r"[.]", text)
+    parts = text.split(".")
     seen = set()
     result = []
 
     for p in parts:
-        key = re.sub(r"\W+", "", p.lower())
+        key = NON_WORD_RUN.sub("", p.lower())
         if key and key not in seen:
             seen.add(key)
             result.append(p.strip())
@@ -1198,24 +1362,20 @@ def extract_core_tokens(text: str) -> set:
         if a in text.lower():
             cores.add(a)
 
-    names = re.findall(
-        r"[a-zà-ỹ]+(?:\s+[a-zà-ỹ]+){1,3}", text.lower()
-    )
+    names = LOWER_PHRASE.findall(text.lower())
     cores.update(names[:2])
     return cores
 
 def collapse_fragments(text):
-    return re.sub(r"\.\s+([a-zà-ỹ])", r", \1", text, flags=re.I)
+    return FRAGMENT_BREAK.sub(r", \1", text)
 
 def remove_repeated_subject(text):
-    parts = re.split(r"\.\s+", text)
+    parts = SENTENCE_BREAK.split(text)
     if len(parts) < 2:
         return text
 
     first = parts[0]
-    names = re.findall(
-        r"[A-ZĐÂÊÔƯ][a-zà-ỹ]+(?:\s+[A-ZĐÂÊÔƯ][a-zà-ỹ]+)+", first
-    )
+    names = CAPITALIZED_NAME.findall(first)
 
     for i in range(1, len(parts)):
         for name in names:
@@ -1224,7 +1384,7 @@ def remove_repeated_subject(text):
     return ". ".join(parts).strip()
 
 def remove_redundant_actions(text):
-    clauses = [c.strip() for c in re.split(r",", text)]
+    clauses = [c.strip() for c in text.split(",")]
     kept = []
     used_groups = set()
 
@@ -1232,8 +1392,8 @@ def remove_redundant_actions(text):
         lowered = clause.lower()
         matched_group = None
 
-        for i, group in enumerate(ACTION_GROUPS):
-            if any(k in lowered for k in group):
+        for i, pattern in enumerate(ACTION_GROUP_PATTERNS):
+            if pattern.search(lowered):
                 matched_group = i
                 break
 
@@ -1246,16 +1406,18 @@ def remove_redundant_actions(text):
 
     return ", ".join(kept)
 
+YEAR_TOKEN = re.compile(r"\b1[0-9]{3}\b")
+EVENT_FILLERS = re.compile(r"(diễn ra|xảy ra|năm|sau khi|được|vào|đã|các)")
+SIGNATURE_FILLERS = re.compile(r"(diễn ra|xảy ra|năm|sau khi|được|vua|triều)")
+PUNCTUATION = re.compile(r"[^\w\s]")
+TEMPORAL_CLAUSE = re.compile(r",?\s*Sau khi [^,]+?(?=,|$)", re.I)
+
 def normalize_event_text(text: str) -> set:
     text = text.lower()
 
-    text = re.sub(r"\b(1[0-9]{3})\b", "", text)
-    text = re.sub(
-        r"(diễn ra|xảy ra|năm|sau khi|được|vào|đã|các)",
-        "",
-        text
-    )
-    text = re.sub(r"[^\w\s]", " ", text)
+    text = YEAR_TOKEN.sub("", text)
+    text = EVENT_FILLERS.sub("", text)
+    text = PUNCTUATION.sub(" ", text)
 
     words = [
         w for w in text.split()
@@ -1265,12 +1427,7 @@ def normalize_event_text(text: str) -> set:
     return set(words)
 
 def normalize_temporal_clause(text: str) -> str:
-    return re.sub(
-        r",?\s*Sau khi [^,]+?(?=,|$)",
-        "",
-        text,
-        flags=re.I
-    )
+    return TEMPORAL_CLAUSE.sub("", text)
 
 
 
@@ -1297,19 +1454,15 @@ def is_same_event(e1: str, e2: str, threshold=0.3) -> bool:
     return score >= threshold
 
 
+COMMA_CAPITAL = re.compile(r",\s+(?![A-ZĐÂÊÔƯ][a-zà-ỹ]+\s+[A-ZĐÂÊÔƯ])([A-ZĐÂÊÔƯ])")
+TITLE_AFTER_COMMA = re.compile(r",\s*(Văn kiện|Tác phẩm|Sự kiện)\s+", re.I)
+
 def lowercase_after_comma(text):
-    return re.sub(
-        r",\s+(?![A-ZĐÂÊÔƯ][a-zà-ỹ]+\s+[A-ZĐÂÊÔƯ])([A-ZĐÂÊÔƯ])",
-        lambda m: ", " + m.group(1).lower(),
-        text
-    )
+    return COMMA_CAPITAL.sub(lambda m: ", " + m.group(1).lower(), text)
 
 
 def remove_repeated_subject_inline(text):
-    names = re.findall(
-        r"[A-ZĐÂÊÔƯ][a-zà-ỹ]+(?:\s+[A-ZĐÂÊÔƯ][a-zà-ỹ]+)+",
-        text
-    )
+    names = CAPITALIZED_NAME.findall(text)
     if len(names) < 2:
         return text
 
@@ -1327,25 +1480,16 @@ def remove_repeated_subject_inline(text):
         text
     )
 
-    return re.sub(r"\s+,", ",", text)
+    return SPACE_BEFORE_COMMA.sub(",", text)
 
 def normalize_titles(text):
-    return re.sub(
-        r",\s*(Văn kiện|Tác phẩm|Sự kiện)\s+",
-        ", ",
-        text,
-        flags=re.I
-    )
+    return TITLE_AFTER_COMMA.sub(", ", text)
 
 def event_signature(text: str) -> str:
     text = text.lower()
-    text = re.sub(r"\b1[0-9]{3}\b", "", text)
-    text = re.sub(
-        r"(diễn ra|xảy ra|năm|sau khi|được|vua|triều)",
-        "",
-        text
-    )
-    text = re.sub(r"[^\w\s]", " ", text)
+    text = YEAR_TOKEN.sub("", text)
+    text = SIGNATURE_FILLERS.sub("", text)
+    text = PUNCTUATION.sub(" ", text)
 
     tokens = [
         w for w in text.split()
@@ -1354,18 +1498,21 @@ def event_signature(text: str) -> str:
 
     return " ".join(tokens[:8])   # ⬅ tăng từ 6 → 8
 
+# Hành động và Sự kiện lịch sử cốt lõi
+KEYWORD_ACTIONS = re.compile(
+    r"(đánh bại|đánh tan|lên ngôi|xưng vương|dời đô|thành lập|giải phóng|thống nhất|"
+    r"khởi nghĩa|kháng chiến|chiến dịch|phong trào|hiệp định|tuyên ngôn|ban hành|ký kết|"
+    r"đại phá|tiêu diệt|phản công|tấn công|đình chiến|quốc hiệu|hiến pháp|luật|hình thư|chiếu|hòa ước|sắc lệnh|văn kiện)"
+)
+OCCUR_VERB = re.compile(r"(diễn ra|xảy ra)")
+
 def extract_keywords(text: str) -> list[str]:
     keywords = set()
     if not text:
         return []
 
     # 1. Hành động và Sự kiện lịch sử cốt lõi
-    actions = re.findall(
-        r"(đánh bại|đánh tan|lên ngôi|xưng vương|dời đô|thành lập|giải phóng|thống nhất|"
-        r"khởi nghĩa|kháng chiến|chiến dịch|phong trào|hiệp định|tuyên ngôn|ban hành|ký kết|"
-        r"đại phá|tiêu diệt|phản công|tấn công|đình chiến|quốc hiệu|hiến pháp|luật|hình thư|chiếu|hòa ước|sắc lệnh|văn kiện)",
-        text.lower()
-    )
+    actions = KEYWORD_ACTIONS.findall(text.lower())
     keywords.update(actions)
 
     # 2. Tác phẩm/Văn kiện nổi tiếng (nếu có trong text)
@@ -1383,13 +1530,13 @@ def merge_events(events: list[str]) -> str:
     clauses = []
 
     for e in events:
-        e = re.sub(r"(diễn ra|xảy ra)", "", e)
+        e = OCCUR_VERB.sub("", e)
         clauses.append(e.strip(" ,."))
 
     base = max(clauses, key=len)
 
     for c in clauses:
-        if "mở ra" in c or "chấm dứt" in c or "khẳng định" in c:
+        if CONSEQUENCE_KEYWORDS.search(c):
             if c not in base:
                 base += ", " + c
 
@@ -1401,6 +1548,7 @@ def prune_event_sentence(text: str) -> str:
         return text
 
     kept = []
+    lows = [c.lower() for c in clauses]
 
     # 1️⃣ clause có PERSON
     for c in clauses:
@@ -1410,15 +1558,16 @@ def prune_event_sentence(text: str) -> str:
 
     # 2️⃣ nếu chưa có → clause có action
     if not kept:
-        for c in clauses:
-            if any(v in c.lower() for v in INFORMATIVE_VERBS + STATE_VERBS):
+        for c, c_low in zip(clauses, lows):
+            if INFORMATIVE_OR_STATE.search(c_low):
                 kept.append(c)
 
-    # 3️⃣ giữ hệ quả lịch sử
-    for c in clauses:
-        if any(k in c.lower() for k in ["mở ra", "chấm dứt", "khẳng định"]):
-            if c not in kept:
-                kept.append(c)
+    # 3️⃣ giữ hệ quả lịch sử (set để tra trùng O(1) thay vì quét list)
+    seen = set(kept)
+    for c, c_low in zip(clauses, lows):
+        if CONSEQUENCE_KEYWORDS.search(c_low) and c not in seen:
+            seen.add(c)
+            kept.append(c)
 
     return ", ".join(kept or [clauses[0]])
 
@@ -1481,28 +1630,20 @@ def ask_by_year(timeline, year: int):
 
     return results
 
+# Thứ tự là thứ tự ưu tiên: nhóm đầu tiên khớp quyết định loại câu hỏi
+QUESTION_NATURE_PATTERNS = (
+    ("military", keyword_pattern(["chiến thắng", "trận", "chiến dịch", "đánh", "kháng chiến"])),
+    ("political", keyword_pattern(["lên ngôi", "vua", "triều", "nhà", "chính quyền"])),
+    ("institutional", keyword_pattern(["chiếu", "hiệp định", "tuyên ngôn", "sắc lệnh"])),
+    ("event", keyword_pattern(["là gì", "sự kiện", "ý nghĩa"])),
+)
+
 def classify_question_nature(question: str) -> str | None:
     q = question.lower()
 
-    if any(k in q for k in [
-        "chiến thắng", "trận", "chiến dịch", "đánh", "kháng chiến"
-    ]):
-        return "military"
-
-    if any(k in q for k in [
-        "lên ngôi", "vua", "triều", "nhà", "chính quyền"
-    ]):
-        return "political"
-
-    if any(k in q for k in [
-        "chiếu", "hiệp định", "tuyên ngôn", "sắc lệnh"
-    ]):
-        return "institutional"
-
-    if any(k in q for k in [
-        "là gì", "sự kiện", "ý nghĩa"
-    ]):
-        return "event"
+    for nature, pattern in QUESTION_NATURE_PATTERNS:
+        if pattern.search(q):
+            return nature
 
     return None
 
@@ -1534,6 +1675,8 @@ def _finalize_ask_results(results):
         return results[0]
     return "\n".join(results)
 
+QUESTION_PREFIX = re.compile(r"^(cho biết|hãy cho biết|xin cho biết|tìm hiểu|giải thích)\s+", re.I)
+
 def normalize_question(q: str) -> str | None:
     """
     Chuẩn hóa câu hỏi:
@@ -1551,15 +1694,12 @@ def normalize_question(q: str) -> str | None:
     q = q.replace("?", "").strip()
 
     # loại các tiền tố hỏi
-    q = re.sub(
-        r"^(cho biết|hãy cho biết|xin cho biết|tìm hiểu|giải thích)\s+",
-        "",
-        q,
-        flags=re.I
-    )
+    q = QUESTION_PREFIX.sub("", q)
 
     return q if len(q) >= 3 else None
 
+CAPITALIZED_PHRASE = re.compile(r"[A-ZĐÂÊÔƯ][a-zà-ỹ]+(?:\s+[A-ZĐÂÊÔƯ][a-zà-ỹ]+){0,4}")
+
 def extract_event_keywords(q: str) -> list[str]:
     """
     Trích keyword sự kiện từ câu hỏi.
@@ -1573,10 +1713,7 @@ def extract_event_keywords(q: str) -> list[str]:
     keywords = set()
 
     # 1️⃣ cụm viết hoa (event name)
-    caps = re.findall(
-        r"[A-ZĐÂÊÔƯ][a-zà-ỹ]+(?:\s+[A-ZĐÂÊÔƯ][a-zà-ỹ]+){0,4}",
-        q
-    )
+    caps = CAPITALIZED_PHRASE.findall(q)
     for c in caps:
         keywords.add(c)
 
@@ -1627,11 +1764,14 @@ def ask(timeline: dict, question: str):
     # 2. FALLBACK: HỎI THEO EVENT / KEYWORD
     # ======================================================
     keywords = extract_event_keywords(q)
+    if not keywords:
+        return None
+    keyword_re = keyword_pattern([k.lower() for k in keywords])
 
     for year, block in timeline.items():
         for e in block.get("events", []):
             event_text = e.get("event", "")
-            if any(k.lower() in event_text.lower() for k in keywords):
+            if keyword_re.search(event_text.lower()):
                 story = storyteller(
                     year=int(year),
                     kind=pick_tone(e.get("tone", [])),
@@ -1665,15 +1805,14 @@ def narrate_year(timeline, year):
         "tone": tones
     }
 
+LEADING_PROPER_NAME = re.compile(r"^([A-ZĐÂÊÔƯ][a-zà-ỹ]+(?:\s+[A-ZĐÂÊÔƯ][a-zà-ỹ]+)+)\b")
+
 def remove_duplicate_subjects_global(text):
     clauses = [c.strip() for c in text.split(",")]
     if len(clauses) < 2:
         return text
 
-    m = re.match(
-        r"^([A-ZĐÂÊÔƯ][a-zà-ỹ]+(?:\s+[A-ZĐÂÊÔƯ][a-zà-ỹ]+)+)\b",
-        clauses[0]
-    )
+    m = LEADING_PROPER_NAME.match(clauses[0])
     if not m:
         return text
 
@@ -1686,34 +1825,67 @@ def remove_duplicate_subjects_global(text):
 
     return ", ".join(cleaned)
 
-def infer_subject(body: str, persons: set, nature: list) -> str:
+# Từ khóa tập thể trong văn bản → chủ thể (theo thứ tự ưu tiên)
+COLLECTIVE_SUBJECTS = (
+    ("quân dân", "Quân dân Việt Nam"),
+    ("nhân dân", "Nhân dân Việt Nam"),
+)
+
+class Nature(IntFlag):
+    """Nhãn tính chất (nature) dạng bit, để kiểm tra nhóm nhãn bằng một phép AND."""
+    MILITARY = 1
+    POLITICAL = 2
+    DIPLOMACY = 4
+    INSTITUTIONAL = 8
+    HISTORICAL_EVENT = 16
+    ECONOMY = 32
+    CULTURE = 64
+    GENERAL = 128
+
+NATURE_BITS = {flag.name.lower(): flag for flag in Nature}
+
+def nature_mask(nature) -> int:
+    """Mask của danh sách nhãn; nhận luôn mask có sẵn, bỏ qua nhãn lạ."""
+    if isinstance(nature, int):
+        return nature
+    mask = 0
+    for label in nature:
+        mask |= NATURE_BITS.get(label, 0)
+    return mask
+
+@lru_cache(maxsize=256)
+def subject_from_features(collective: str | None, mask: int) -> str:
+    """Chủ thể khi không có nhân vật: chỉ phụ thuộc vài đặc trưng, nên cache được."""
+    # 2. Từ khóa tập thể xuất hiện trực tiếp trong văn bản
+    if collective:
+        return collective
+
+    # 3. Ánh xạ dựa trên nhãn (Nature)
+    # Thêm "diplomacy" vào nhóm Chính quyền đương thời
+    if mask & Nature.MILITARY:
+        return "Quân dân Việt Nam"
+
+    if mask & (Nature.POLITICAL | Nature.DIPLOMACY):
+        return "Chính quyền đương thời"
+
+    if mask & Nature.INSTITUTIONAL:
+        return "Văn kiện lịch sử"
+
+    return "Sự kiện lịch sử"
+
+def infer_subject(body: str, persons: set, nature) -> str:
+    """nature: danh sách nhãn như trong timeline, hoặc mask Nature."""
     # 1. Ưu tiên nhân vật cụ thể nếu có
     if persons:
         # Lọc bỏ các nhân vật quá ngắn (ví dụ chỉ có họ 'Nguyễn')
         valid_subjects = [p for p in persons if len(p.split()) >= 2]
         if valid_subjects:
-            return sorted(valid_subjects)[0]
+            return min(valid_subjects)
     
     body_low = body.lower()
-    
-    # 2. Kiểm tra từ khóa tập thể xuất hiện trực tiếp trong văn bản
-    if "quân dân" in body_low:
-        return "Quân dân Việt Nam"
-    if "nhân dân" in body_low:
-        return "Nhân dân Việt Nam"
-    
-    # 3. Ánh xạ dựa trên nhãn (Nature)
-    # Thêm "diplomacy" vào nhóm Chính quyền đương thời
-    if "military" in nature:
-        return "Quân dân Việt Nam"
-        
-    if "political" in nature or "diplomacy" in nature:
-        return "Chính quyền đương thời"
-        
-    if "institutional" in nature:
-        return "Văn kiện lịch sử"
-        
-    return "Sự kiện lịch sử"
+    collective = next((subject for kw, subject in COLLECTIVE_SUBJECTS if kw in body_low), None)
+
+    return subject_from_features(collective, nature_mask(nature))
 
 def render_event_with_subject(year, body, subject=None):
     if subject:
@@ -1724,10 +1896,7 @@ def render_event_with_subject(year, body, subject=None):
 def extract_person_query(q: str) -> str | None:
     q = q.lower().strip()
 
-    matches = re.findall(
-        r"[a-zà-ỹ]+(?:\s+[a-zà-ỹ]+){1,3}",
-        q
-    )
+    matches = LOWER_PHRASE.findall(q)
 
     for m in sorted(matches, key=len, reverse=True):
         if m in NON_PERSON_PHRASES:
@@ -1739,37 +1908,33 @@ def extract_person_query(q: str) -> str | None:
 
     return None
 
-def fix_common_noun_phrases(text):
-    return re.sub(
-        r",\s*(Quân|Nghĩa quân|Triều|Chính quyền)\b",
-        lambda m: ", " + m.group(1).lower(),
-        text
-    )
+COMMON_NOUN_AFTER_COMMA = re.compile(r",\s*(Quân|Nghĩa quân|Triều|Chính quyền)\b")
 
-def smooth_actions(text):
-    text = re.sub(
-        r"(đánh (?:tan|bại|lui)[^,]+),\s*(lãnh đạo[^,]+)",
-        r"\2 \1",
-        text,
-        flags=re.I
-    )
+def fix_common_noun_phrases(text):
+    return COMMON_NOUN_AFTER_COMMA.sub(lambda m: ", " + m.group(1).lower(), text)
 
-    text = re.sub(
-        r"(dựng[^,]+),\s*(nắm quyền[^,]+)",
-        r"\1, sau đó \2",
-        text,
-        flags=re.I
-    )
+# (pattern, thay thế) áp dụng lần lượt để câu hành động đọc trôi hơn
+SMOOTH_ACTION_RULES = (
+    (re.compile(r"(đánh (?:tan|bại|lui)[^,]+),\s*(lãnh đạo[^,]+)", re.I), r"\2 \1"),
+    (re.compile(r"(dựng[^,]+),\s*(nắm quyền[^,]+)", re.I), r"\1, sau đó \2"),
+    (re.compile(r"(dùng[^,]+),\s*(đánh (?:bại|tan|lui)[^,]+)", re.I), r"\1 và \2"),
+)
 
-    text = re.sub(
-        r"(dùng[^,]+),\s*(đánh (?:bại|tan|lui)[^,]+)",
-        r"\1 và \2",
-        text,
-        flags=re.I
-    )
+def smooth_actions(text):
+    for pattern, repl in SMOOTH_ACTION_RULES:
+        text = pattern.sub(repl, text)
 
     return text
 
+COLLECTIVE_EVENT_KEYWORDS = keyword_pattern([
+    "cách mạng",
+    "tổng tiến công",
+    "kháng chiến",
+    "chiến dịch",
+    "toàn thắng",
+    "quân dân"
+])
+
 def is_collective_event(nature: list[str], body: str) -> bool:
     # ⛔ nếu text có PERSON → KHÔNG BAO GIỜ collective
     if extract_all_persons(body):
@@ -1777,28 +1942,21 @@ def is_collective_event(nature: list[str], body: str) -> bool:
 
     t = body.lower()
 
-    if "military" in nature and any(k in t for k in [
-        "cách mạng",
-        "tổng tiến công",
-        "kháng chiến",
-        "chiến dịch",
-        "toàn thắng",
-        "quân dân"
-    ]):
+    if "military" in nature and COLLECTIVE_EVENT_KEYWORDS.search(t):
         return True
 
     return False
 
+KING_NAME_PATTERNS = (
+    re.compile(r"(?:Vua\s+)?([A-ZĐÂÊÔƯ][a-zà-ỹ]+\s+(?:Thái|Thánh|Nhân)\s+(?:Tổ|Tông))"),
+    re.compile(r"(?:thời|dưới thời|triều)\s+([A-ZĐÂÊÔƯ][a-zà-ỹ]+\s+(?:Thái|Thánh|Nhân)\s+(?:Tổ|Tông))"),
+)
+
 def extract_implicit_ruler(text: str) -> set[str]:
     persons = set()
 
-    patterns = [
-        r"(?:Vua\s+)?([A-ZĐÂÊÔƯ][a-zà-ỹ]+\s+(?:Thái|Thánh|Nhân)\s+(?:Tổ|Tông))",
-        r"(?:thời|dưới thời|triều)\s+([A-ZĐÂÊÔƯ][a-zà-ỹ]+\s+(?:Thái|Thánh|Nhân)\s+(?:Tổ|Tông))",
-    ]
-
-    for p in patterns:
-        for m in re.findall(p, text):
+    for p in KING_NAME_PATTERNS:
+        for m in p.findall(text):
             persons.add(canonical_person(m))
 
     return persons
@@ -1811,6 +1969,13 @@ def cached_extract_all_persons(text: str) -> tuple[str, ...]:
     """
     return tuple(extract_all_persons(text))
 
+def extract_all_persons_batch(texts: list[str]) -> list[set[str]]:
+    """
+    extract_all_persons cho cả danh sách văn bản, giữ nguyên thứ tự.
+    Văn bản trùng lặp đi qua cache nên chỉ quét một lần.
+    """
+    return [set(cached_extract_all_persons(t)) if t else set() for t in texts]
+
 YEAR_PATTERN = re.compile(r"(?:năm|Năm|\s|/|^)([1-9][0-9]{2,3})(?![0-9])")
 
 def iter_raw(ds):
@@ -1832,8 +1997,7 @@ def main():
     total_kept = 0
 
     print(f"[INFO] Normalizing {total_raw} lines using parallel processing...")
-    with Pool(processes=min(cpu_count(), 4)) as pool:
-        results = pool.map(normalize, lines)
+    results = normalize_batch(lines, processes=min(cpu_count(), 4))
 
     for res_list in results:
         if not res_list:
@@ -8,6 +8,8 @@ import os
 from pathlib import Path
 from unittest.mock import MagicMock
 
+import pytest
+
 # Add ai-service to path for imports
 AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
 PIPELINE_DIR = Path(__file__).parent.parent / "pipeline"
@@ -17,12 +19,14 @@ if str(AI_SERVICE_DIR) not in sys.path:
 if str(PIPELINE_DIR.parent) not in sys.path:
     sys.path.insert(0, str(PIPELINE_DIR.parent))
 
-# Mock heavy dependencies that aren't needed for unit tests
+# Mock heavy dependencies that aren't needed for unit tests.
+# Installed here once, before any test module is imported.
 mock_modules = [
     'faiss',
     'sentence_transformers',
     'datasets',
     'huggingface_hub',
+    'onnxruntime',
 ]
 
 for mod_name in mock_modules:
@@ -35,3 +39,43 @@ try:
 except ImportError:
     sys.modules["numpy"] = MagicMock()
     import numpy as np
+
+
+@pytest.fixture(scope="session")
+def entity_temporal_metadata():
+    """conflict_detector.ENTITY_TEMPORAL_METADATA, imported once per session."""
+    from app.services.conflict_detector import ENTITY_TEMPORAL_METADATA
+    return ENTITY_TEMPORAL_METADATA
+
+
+class FakeOnnxSession:
+    """Stand-in for onnxruntime.InferenceSession: ones for every token, counts runs."""
+
+    def __init__(self, dim: int = 4):
+        self.dim = dim
+        self.run_count = 0
+
+    def get_inputs(self):
+        return []
+
+    def run(self, output_names, inputs):
+        self.run_count += 1
+        return [np.ones(inputs["input_ids"].shape + (self.dim,), dtype="float32")]
+
+
+def fake_tokenizer(queries, **kwargs):
+    """Batch tokenizer returning three tokens per query, as numpy arrays."""
+    ids = np.ones((len(queries), 3), dtype=np.int64)
+    return {"input_ids": ids, "attention_mask": ids}
+
+
+@pytest.fixture(scope="module")
+def onnx_mocks():
+    """Installs one FakeOnnxSession and fake_tokenizer on startup for the module."""
+    import app.core.startup as startup
+
+    session = FakeOnnxSession()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(startup, "session", session)
+        mp.setattr(startup, "tokenizer", fake_tokenizer)
+        yield session, fake_tokenizer
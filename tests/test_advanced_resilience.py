@@ -16,6 +16,7 @@ ALL assertions are dynamic — derive expected values from the engine's own data
 """
 
 import hashlib
+import importlib.machinery
 import json
 import os
 import sys
@@ -27,17 +28,6 @@ from unittest.mock import MagicMock, patch
 
 import pytest
 
-# ---------------------------------------------------------------------------
-# PATH SETUP — identical to test_enterprise_levels.py
-# ---------------------------------------------------------------------------
-_AI_SERVICE_DIR = os.path.join(os.path.dirname(__file__), "..", "ai-service")
-if _AI_SERVICE_DIR not in sys.path:
-    sys.path.insert(0, os.path.abspath(_AI_SERVICE_DIR))
-
-# Mock heavy deps before import
-sys.modules.setdefault("faiss", MagicMock())
-sys.modules.setdefault("sentence_transformers", MagicMock())
-
 # ---------------------------------------------------------------------------
 # MOCK DATA — reuse from test_enterprise_levels
 # ---------------------------------------------------------------------------
@@ -297,20 +287,8 @@ _META_PATH = os.path.join(
     os.path.dirname(__file__), "..", "ai-service", "faiss_index", "meta.json"
 )
 
-# Try importing real faiss (not the mock) to check availability
-try:
-    # Temporarily remove mock to test real import
-    _faiss_mock = sys.modules.get("faiss")
-    if isinstance(_faiss_mock, MagicMock):
-        del sys.modules["faiss"]
-    import faiss as _real_faiss
-    _HAS_FAISS = True
-    # Restore mock for other tests
-    sys.modules["faiss"] = _faiss_mock if _faiss_mock else _real_faiss
-except ImportError:
-    _HAS_FAISS = False
-    # Re-install mock
-    sys.modules["faiss"] = MagicMock()
+# Look for a real faiss on sys.path without touching conftest's sys.modules mock
+_HAS_FAISS = importlib.machinery.PathFinder.find_spec("faiss") is not None
 
 _HAS_INDEX = _HAS_FAISS and os.path.exists(_INDEX_PATH) and os.path.exists(_META_PATH)
 
@@ -321,7 +299,6 @@ class TestCat4FAISSIntegrity:
 
     def _load_real_faiss(self):
         """Import real faiss, bypassing mock."""
-        import importlib
         saved = sys.modules.get("faiss")
         if isinstance(saved, MagicMock):
             del sys.modules["faiss"]
@@ -374,17 +351,16 @@ class TestCat4FAISSIntegrity:
 class TestCat5VersionFreeze:
     """Verify entity metadata, aliases, and synonym integrity."""
 
-    def test_44_entity_metadata_core_coverage(self):
+    def test_44_entity_metadata_core_coverage(self, entity_temporal_metadata):
         """Core historical figures must exist in ENTITY_TEMPORAL_METADATA."""
-        from app.services.conflict_detector import ENTITY_TEMPORAL_METADATA
 
         core_entities = [
             "trần hưng đạo", "hồ chí minh", "ngô quyền", "lý thường kiệt"
         ]
         for entity in core_entities:
-            assert entity in ENTITY_TEMPORAL_METADATA, \
+            assert entity in entity_temporal_metadata, \
                 f"Core entity '{entity}' missing from ENTITY_TEMPORAL_METADATA"
-            meta = ENTITY_TEMPORAL_METADATA[entity]
+            meta = entity_temporal_metadata[entity]
             assert "lifespan" in meta or "year_range" in meta, \
                 f"Entity '{entity}' has no temporal data"
 
@@ -419,12 +395,11 @@ class TestCat5VersionFreeze:
             assert startup.TOPIC_SYNONYMS[canon] == canon, \
                 f"Self-map broken: '{canon}' → '{startup.TOPIC_SYNONYMS[canon]}'"
 
-    def test_47_missing_entity_graceful(self):
+    def test_47_missing_entity_graceful(self, entity_temporal_metadata):
         """Querying a removed entity should not crash the engine."""
-        from app.services.conflict_detector import ENTITY_TEMPORAL_METADATA
 
         # Verify accessing a non-existent key returns None (not crash)
-        result = ENTITY_TEMPORAL_METADATA.get("non_existent_entity_xyz")
+        result = entity_temporal_metadata.get("non_existent_entity_xyz")
         assert result is None, "Non-existent entity should return None"
 
 
@@ -456,6 +431,10 @@ class TestCat6ChaoCorruption:
             startup.DYNASTY_INDEX = defaultdict(list)
             startup.KEYWORD_INDEX = defaultdict(list)
             startup.PLACES_INDEX = defaultdict(list)
+            startup.rebuild_year_view()
+            startup.rebuild_canonical_index()
+            startup.rebuild_ascii_indexes()
+            startup.rebuild_key_matchers()
 
             r = engine_answer("Ngô Quyền mất năm nào?")
             assert isinstance(r, dict), "Should return valid dict"
@@ -486,9 +465,13 @@ class TestCat6ChaoCorruption:
             y = single_doc.get("year")
             if y is not None:
                 startup.DOCUMENTS_BY_YEAR[y].append(single_doc)
+            startup.rebuild_year_view()
             startup.PERSONS_INDEX = defaultdict(list)
             for p in single_doc.get("persons", []):
                 startup.PERSONS_INDEX[p.strip().lower()].append(0)
+            startup.rebuild_canonical_index()
+            startup.rebuild_ascii_indexes()
+            startup.rebuild_key_matchers()
 
             r = engine_answer("Kể cho tôi về lịch sử")
             assert isinstance(r, dict), "Should return valid dict for 1 doc"
@@ -542,6 +525,7 @@ class TestCat6ChaoCorruption:
             if y is not None:
                 for i in range(1000):
                     startup.DOCUMENTS_BY_YEAR[y].append(single_doc)
+            startup.rebuild_year_view()
 
             r = engine_answer("Kể cho tôi về lịch sử")
             assert isinstance(r, dict), "Should handle 1000 duplicate docs"
@@ -10,11 +10,6 @@ Tests for the 7 bugs identified in bug analysis report:
 Priority: CRITICAL crashes
 """
 import pytest
-import sys
-import os
-
-# Add ai-service to path for imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ai-service'))
 
 from app.services.engine import (
     clean_story_text,
@@ -239,6 +234,9 @@ class TestBug5NegativeFAISSIndices:
             {"story": "Event 0", "year": 1789, "persons": ["nguyễn huệ"]},
             {"story": "Event 1", "year": 1790, "persons": ["nguyễn huệ"]},
         ])
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
 
         resolved = {"persons": ["nguyễn huệ"], "dynasties": [], "topics": [], "places": []}
         result = scan_by_entities(resolved, max_results=50)
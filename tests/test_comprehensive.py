@@ -17,7 +17,7 @@ Coverage:
 import sys
 import json
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 from collections import defaultdict
 import pytest
 
@@ -25,15 +25,9 @@ import pytest
 AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
 SCRIPTS_DIR = AI_SERVICE_DIR / "scripts"
 
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
 if str(SCRIPTS_DIR) not in sys.path:
     sys.path.insert(0, str(SCRIPTS_DIR))
 
-# Mock heavy dependencies before import
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
-
 
 # ===================================================================
 # HELPERS
@@ -129,6 +123,7 @@ def setup_full_mocks():
         y = doc.get("year")
         if y is not None:
             startup.DOCUMENTS_BY_YEAR[y].append(doc)
+    startup.rebuild_year_view()
 
     startup.PERSONS_INDEX = defaultdict(list)
     startup.DYNASTY_INDEX = defaultdict(list)
@@ -167,6 +162,9 @@ def setup_full_mocks():
         startup.TOPIC_SYNONYMS[canonical] = canonical
         for syn in synonyms:
             startup.TOPIC_SYNONYMS[syn] = canonical
+    startup.rebuild_canonical_index()
+    startup.rebuild_ascii_indexes()
+    startup.rebuild_key_matchers()
 
 
 # ===================================================================
@@ -444,6 +442,9 @@ class TestScanByEntitiesTextFallback:
         for key in list(startup.PERSONS_INDEX.keys()):
             if "trưng" in key or "hai bà" in key:
                 del startup.PERSONS_INDEX[key]
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
 
         docs = self.scan({
             "persons": ["hai bà trưng"],
@@ -457,6 +458,9 @@ class TestScanByEntitiesTextFallback:
         import app.core.startup as startup
         # Remove from index
         startup.PERSONS_INDEX.pop("nguyễn huệ", None)
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
 
         docs = self.scan({
             "persons": ["nguyễn huệ"],
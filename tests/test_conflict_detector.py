@@ -5,12 +5,8 @@ Verifies that ConflictDetector correctly identifies temporal contradictions
 in queries before search is executed.
 """
 
-import sys
-import os
 import pytest
 
-# Add ai-service to path for imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ai-service"))
 
 from app.core.query_schema import QueryInfo
 from app.services.conflict_detector import ConflictDetector
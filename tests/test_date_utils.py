@@ -6,9 +6,6 @@ search_service.py, engine.py, answer_synthesis.py.
 
 Covers: None, "", bool, list, dict, "invalid", extreme values.
 """
-import sys
-import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ai-service'))
 
 from app.core.utils.date_utils import safe_year
 
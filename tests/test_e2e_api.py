@@ -7,10 +7,6 @@ import pytest
 from fastapi.testclient import TestClient
 
 # Import app for testing
-import sys
-import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ai-service'))
-
 from app.main import app
 
 
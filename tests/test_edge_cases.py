@@ -11,10 +11,7 @@ Tests for edge cases not covered by existing tests:
 - Empty document store
 """
 import pytest
-import sys
-import os
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ai-service'))
 
 from app.services.engine import engine_answer, extract_single_year, extract_year_range
 from app.services.search_service import semantic_search, scan_by_entities, resolve_query_entities
@@ -264,6 +261,9 @@ class TestKnowledgeBaseEntityNotFound:
         monkeypatch.setattr(startup, "KEYWORD_INDEX", {})
         monkeypatch.setattr(startup, "PLACES_INDEX", {})
         monkeypatch.setattr(startup, "DOCUMENTS", [])
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
 
         resolved = {
             "persons": ["unknown person"],
@@ -314,6 +314,9 @@ class TestEmptyDocumentStore:
         monkeypatch.setattr(startup, "KEYWORD_INDEX", {})
         monkeypatch.setattr(startup, "PLACES_INDEX", {})
         monkeypatch.setattr(startup, "DOCUMENTS", [])  # Empty
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
 
         resolved = {"persons": ["trần hưng đạo"], "dynasties": [], "topics": [], "places": []}
         result = scan_by_entities(resolved)
@@ -4,21 +4,10 @@ test_engine.py - Comprehensive unit tests for HistoryMindAI engine.
 Covers: intent detection, entity resolution, synonym matching,
 multi-entity queries, inverted index scan, edge cases, and formatting.
 """
-import sys
-from pathlib import Path
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from collections import defaultdict
 import pytest
 
-# Ensure ai-service is in path
-AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
-
-# Mock heavy dependencies before import
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
-
 # ===================================================================
 # RICH MOCK DATA — covers multiple dynasties, persons, places, topics
 # ===================================================================
@@ -122,6 +111,7 @@ def _setup_full_mocks():
         y = doc.get("year")
         if y is not None:
             startup.DOCUMENTS_BY_YEAR[y].append(doc)
+    startup.rebuild_year_view()
 
     startup.PERSONS_INDEX = defaultdict(list)
     startup.DYNASTY_INDEX = defaultdict(list)
@@ -175,6 +165,9 @@ def _setup_full_mocks():
         "cách mạng tháng tám": "cách mạng tháng tám", "tổng khởi nghĩa": "cách mạng tháng tám",
         "nam quốc sơn hà": "nam quốc sơn hà", "bài thơ thần": "nam quốc sơn hà",
     }
+    startup.rebuild_canonical_index()
+    startup.rebuild_ascii_indexes()
+    startup.rebuild_key_matchers()
 
 
 # ===================================================================
@@ -187,6 +180,7 @@ class TestIdentityCreator:
         r = engine_answer("Bạn là ai?")
         assert r["intent"] == "identity"
         assert "History Mind AI" in r["answer"]
+        assert r["stories"] == []
 
     def test_gioi_thieu_ban_than(self):
         from app.services.engine import engine_answer
@@ -197,6 +191,7 @@ class TestIdentityCreator:
         from app.services.engine import engine_answer
         r = engine_answer("Ai tạo ra bạn?")
         assert r["intent"] == "creator"
+        assert r["stories"] == []
         assert "Võ Đức Hiếu" in r["answer"]
 
     def test_ai_phat_trien_ban(self):
@@ -594,6 +589,9 @@ class TestEngineIntentRouting:
         startup.PERSON_ALIASES = {}
         startup.DYNASTY_ALIASES = {}
         startup.TOPIC_SYNONYMS = {}
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
         mock_search.return_value = [MOCK_DAI_VIET]
         from app.services.engine import engine_answer
         r = engine_answer("Điều ước Giáp Tuất là gì?")
@@ -752,6 +750,9 @@ class TestEdgeCases:
         import app.core.startup as startup
         # Remove person alias for just "trần" to test isolation
         startup.PERSON_ALIASES.pop("trần", None)
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
         r = self.resolve("Triều Trần")
         # Should find dynasty but not necessarily a person (unless index has "trần")
         assert "trần" in r["dynasties"]
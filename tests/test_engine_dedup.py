@@ -8,13 +8,6 @@ Tests:
   4. deduplicate_answer — answer-level sentence dedup
   5. canonicalize_year_format — year format normalization
 """
-
-import sys
-import os
-
-# Add ai-service to path so we can import app modules
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ai-service'))
-
 from app.services.event_aggregator import normalize_for_dedup, aggregate_events
 from app.services.answer_postprocessor import deduplicate_answer, canonicalize_year_format, _dedup_intra_line, _is_fuzzy_dup
 from app.services.engine import _is_similar_event, compute_text_similarity
@@ -3,25 +3,23 @@ Test Fuzzy Matching and Flexible Query Understanding
 
 Kiểm tra khả năng hiểu câu hỏi linh hoạt với typo, từ đồng nghĩa, và các biến thể.
 """
-import sys
-from pathlib import Path
-from unittest.mock import patch, MagicMock
+from types import MappingProxyType
+from unittest.mock import patch
 from collections import defaultdict
-
-# Ensure ai-service is in path
-AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
-
-# Mock heavy dependencies before import
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
+from itertools import chain
 
 import pytest
 
+from app.services.context7_service import (
+    calculate_relevance_score,
+    extract_query_focus,
+    filter_and_rank_events,
+)
+from app.services.engine import engine_answer
+
 
-# Mock data for testing
-MOCK_TRAN_HUNG_DAO_EVENT = {
+# Mock data for testing (read-only: the indexes built from it are shared module-wide)
+MOCK_TRAN_HUNG_DAO_EVENT = MappingProxyType({
     "year": 1288,
     "event": "Trận Bạch Đằng",
     "story": "Trần Hưng Đạo nhử địch vào bãi cọc ngầm trên sông Bạch Đằng, tiêu diệt thủy quân Nguyên.",
@@ -32,9 +30,9 @@ MOCK_TRAN_HUNG_DAO_EVENT = {
     "dynasty": "Trần",
     "keywords": ["bạch_đằng", "trần_hưng_đạo", "chiến_thắng", "nguyên"],
     "title": "Trận Bạch Đằng"
-}
+})
 
-MOCK_NGUYEN_HUE_EVENT = {
+MOCK_NGUYEN_HUE_EVENT = MappingProxyType({
     "year": 1789,
     "event": "Trận Đống Đa",
     "story": "Nguyễn Huệ đánh tan quân Thanh ở Đống Đa, giành thắng lợi vang dội.",
@@ -45,7 +43,25 @@ MOCK_NGUYEN_HUE_EVENT = {
     "dynasty": "Tây Sơn",
     "keywords": ["đống_đa", "nguyễn_huệ", "quang_trung", "chiến_thắng"],
     "title": "Trận Đống Đa"
-}
+})
+
+
+MOCK_PERSON_ALIASES = MappingProxyType({
+    "trần hưng đạo": "trần hưng đạo",
+    "trần quốc tuấn": "trần hưng đạo",
+    "nguyễn huệ": "nguyễn huệ",
+    "quang trung": "nguyễn huệ",
+})
+MOCK_DYNASTY_ALIASES = MappingProxyType({
+    "trần": "trần",
+    "nhà trần": "trần",
+    "tây sơn": "tây sơn",
+})
+MOCK_TOPIC_SYNONYMS = MappingProxyType({
+    "nguyên mông": "nguyên mông",
+    "mông cổ": "nguyên mông",
+    "thanh": "thanh",
+})
 
 
 def _setup_mocks():
@@ -58,48 +74,46 @@ def _setup_mocks():
         y = doc.get("year")
         if y is not None:
             startup.DOCUMENTS_BY_YEAR[y].append(doc)
+    startup.rebuild_year_view()
     
-    startup.PERSONS_INDEX = defaultdict(list)
-    startup.DYNASTY_INDEX = defaultdict(list)
-    startup.KEYWORD_INDEX = defaultdict(list)
-    startup.PLACES_INDEX = defaultdict(list)
-    
+    persons_index, dynasty_index, keyword_index, places_index = {}, {}, {}, {}
     for idx, doc in enumerate(startup.DOCUMENTS):
-        all_persons = set(doc.get("persons", []) + doc.get("persons_all", []))
-        for person in all_persons:
-            startup.PERSONS_INDEX[person.strip().lower()].append(idx)
+        seen = set()
+        for person in chain(doc.get("persons", ()), doc.get("persons_all", ())):
+            key = person.strip().lower()
+            if key not in seen:
+                seen.add(key)
+                persons_index.setdefault(key, []).append(idx)
         dynasty = doc.get("dynasty", "").strip().lower()
         if dynasty:
-            startup.DYNASTY_INDEX[dynasty].append(idx)
-        for kw in doc.get("keywords", []):
-            startup.KEYWORD_INDEX[kw.lower().replace("_", " ")].append(idx)
-        for place in doc.get("places", []):
-            startup.PLACES_INDEX[place.strip().lower()].append(idx)
-    
-    startup.PERSON_ALIASES = {
-        "trần hưng đạo": "trần hưng đạo",
-        "trần quốc tuấn": "trần hưng đạo",
-        "nguyễn huệ": "nguyễn huệ",
-        "quang trung": "nguyễn huệ",
-    }
-    startup.DYNASTY_ALIASES = {
-        "trần": "trần",
-        "nhà trần": "trần",
-        "tây sơn": "tây sơn",
-    }
-    startup.TOPIC_SYNONYMS = {
-        "nguyên mông": "nguyên mông",
-        "mông cổ": "nguyên mông",
-        "thanh": "thanh",
-    }
+            dynasty_index.setdefault(dynasty, []).append(idx)
+        for kw in doc.get("keywords", ()):
+            keyword_index.setdefault(kw.lower().replace("_", " "), []).append(idx)
+        for place in doc.get("places", ()):
+            places_index.setdefault(place.strip().lower(), []).append(idx)
+    startup.PERSONS_INDEX = persons_index
+    startup.DYNASTY_INDEX = dynasty_index
+    startup.KEYWORD_INDEX = keyword_index
+    startup.PLACES_INDEX = places_index
+
+    startup.PERSON_ALIASES = MOCK_PERSON_ALIASES
+    startup.DYNASTY_ALIASES = MOCK_DYNASTY_ALIASES
+    startup.TOPIC_SYNONYMS = MOCK_TOPIC_SYNONYMS
+    startup.rebuild_canonical_index()
+    startup.rebuild_ascii_indexes()
+    startup.rebuild_key_matchers()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _mocks():
+    """Tests only read the mock indexes, so build them once per module."""
+    _setup_mocks()
+    yield
 
 
 class TestFuzzyMatching:
     """Test fuzzy matching and flexible query understanding."""
 
-    def setup_method(self):
-        _setup_mocks()
-
     @patch("app.services.engine.semantic_search")
     @patch("app.services.engine.scan_by_entities")
     def test_typo_in_person_name(self, mock_scan, mock_search):
@@ -107,8 +121,6 @@ class TestFuzzyMatching:
         mock_scan.return_value = [MOCK_TRAN_HUNG_DAO_EVENT]
         mock_search.return_value = []
         
-        from app.services.engine import engine_answer
-        
         # Query with typo (missing accents)
         result = engine_answer("Tran Hung Dao la ai?")
         
@@ -128,8 +140,6 @@ class TestFuzzyMatching:
         mock_scan.return_value = [MOCK_NGUYEN_HUE_EVENT]
         mock_search.return_value = []
         
-        from app.services.engine import engine_answer
-        
         # Query with synonym
         result = engine_answer("Quang Trung đánh ai?")
         
@@ -148,8 +158,6 @@ class TestFuzzyMatching:
         mock_scan.return_value = [MOCK_TRAN_HUNG_DAO_EVENT]
         mock_search.return_value = []
         
-        from app.services.engine import engine_answer
-        
         result = engine_answer("Trần Hưng chiến thắng")
         
         assert not result["no_data"]
@@ -163,8 +171,6 @@ class TestFuzzyMatching:
         mock_scan.return_value = [MOCK_TRAN_HUNG_DAO_EVENT]
         mock_search.return_value = []
         
-        from app.services.engine import engine_answer
-        
         result1 = engine_answer("chiến thắng của Trần Hưng Đạo")
         result2 = engine_answer("Trần Hưng Đạo chiến thắng")
         
@@ -183,8 +189,6 @@ class TestFuzzyMatching:
         mock_scan.return_value = [MOCK_TRAN_HUNG_DAO_EVENT]
         mock_search.return_value = []
         
-        from app.services.engine import engine_answer
-        
         result = engine_answer("Ơi bạn ơi, cho mình hỏi là Trần Hưng Đạo là ai vậy nhỉ?")
         
         # Should still understand the core question
@@ -199,8 +203,6 @@ class TestFuzzyMatching:
         mock_scan.return_value = [MOCK_TRAN_HUNG_DAO_EVENT]
         mock_search.return_value = []
         
-        from app.services.engine import engine_answer
-        
         result1 = engine_answer("kể về Trần Hưng Đạo")
         result2 = engine_answer("nói về Trần Hưng Đạo")
         result3 = engine_answer("giới thiệu Trần Hưng Đạo")
@@ -212,8 +214,6 @@ class TestFuzzyMatching:
 
     def test_context7_fuzzy_matching(self):
         """Test Context7 fuzzy matching in calculate_relevance_score."""
-        from app.services.context7_service import calculate_relevance_score, extract_query_focus
-        
         # Query with slight typo
         query = "Trần Hưng Đao chiến thắng"  # "Đao" instead of "Đạo"
         focus = extract_query_focus(query)
@@ -226,8 +226,6 @@ class TestFuzzyMatching:
 
     def test_context7_synonym_matching(self):
         """Test Context7 handles synonyms."""
-        from app.services.context7_service import calculate_relevance_score, extract_query_focus
-        
         # Query with synonym
         query = "Quang Trung đánh Thanh"
         focus = extract_query_focus(query)
@@ -239,8 +237,6 @@ class TestFuzzyMatching:
 
     def test_context7_partial_keyword_match(self):
         """Test Context7 handles partial keyword matches."""
-        from app.services.context7_service import calculate_relevance_score, extract_query_focus
-        
         # Query with partial keyword
         query = "chiến thắng Bạch Đăng"  # "Đăng" instead of "Đằng"
         focus = extract_query_focus(query)
@@ -257,8 +253,6 @@ class TestFuzzyMatching:
         mock_scan.return_value = [MOCK_TRAN_HUNG_DAO_EVENT]
         mock_search.return_value = []
         
-        from app.services.engine import engine_answer
-        
         # Multiple typos: "Tran Hung Dao" (no accents) + "chien thang" (no accents)
         result = engine_answer("Tran Hung Dao chien thang")
         
@@ -274,8 +268,6 @@ class TestFuzzyMatching:
         mock_scan.return_value = [MOCK_TRAN_HUNG_DAO_EVENT]
         mock_search.return_value = []
         
-        from app.services.engine import engine_answer
-        
         result = engine_answer("Who is Trần Hưng Đạo?")
         
         # Should understand despite mixed language
@@ -285,8 +277,6 @@ class TestFuzzyMatching:
 
     def test_context7_filter_and_rank_fuzzy(self):
         """Test filter_and_rank_events with fuzzy matching."""
-        from app.services.context7_service import filter_and_rank_events
-        
         # Query with typo
         query = "Trần Hưng Đao chiến thắng Nguyên"
         events = [MOCK_TRAN_HUNG_DAO_EVENT, MOCK_NGUYEN_HUE_EVENT]
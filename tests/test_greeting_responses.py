@@ -3,29 +3,16 @@ Test Greeting and Social Responses
 
 Kiểm tra khả năng chatbot phản hồi các câu chào hỏi xã giao.
 """
-import sys
-from pathlib import Path
-from unittest.mock import MagicMock
-
-# Ensure ai-service is in path
-AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
-
-# Mock heavy dependencies before import
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
-
 import pytest
 
+from app.services.engine import engine_answer
+
 
 class TestGreetingResponses:
     """Test greeting and social interaction responses."""
 
     def test_english_hello(self):
         """Test English 'hello' greeting."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("hello")
         
         assert result["intent"] == "greeting"
@@ -36,8 +23,6 @@ class TestGreetingResponses:
 
     def test_english_hi(self):
         """Test English 'hi' greeting."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("hi")
         
         assert result["intent"] == "greeting"
@@ -46,8 +31,6 @@ class TestGreetingResponses:
 
     def test_vietnamese_xin_chao(self):
         """Test Vietnamese 'xin chào' greeting."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("xin chào")
         
         assert result["intent"] == "greeting"
@@ -57,8 +40,6 @@ class TestGreetingResponses:
 
     def test_vietnamese_chao_ban(self):
         """Test Vietnamese 'chào bạn' greeting."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("chào bạn")
         
         assert result["intent"] == "greeting"
@@ -67,8 +48,6 @@ class TestGreetingResponses:
 
     def test_casual_alo(self):
         """Test casual 'alo' greeting."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("alo")
         
         assert result["intent"] == "greeting"
@@ -77,8 +56,6 @@ class TestGreetingResponses:
 
     def test_good_morning(self):
         """Test 'good morning' greeting."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("good morning")
         
         assert result["intent"] == "greeting"
@@ -87,8 +64,6 @@ class TestGreetingResponses:
 
     def test_how_are_you(self):
         """Test 'how are you' greeting."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("how are you")
         
         assert result["intent"] == "greeting"
@@ -97,8 +72,6 @@ class TestGreetingResponses:
 
     def test_thank_you_english(self):
         """Test English 'thank you' response."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("thank you")
         
         assert result["intent"] == "thank"
@@ -108,8 +81,6 @@ class TestGreetingResponses:
 
     def test_thank_you_vietnamese(self):
         """Test Vietnamese 'cảm ơn' response."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("cảm ơn")
         
         assert result["intent"] == "thank"
@@ -118,8 +89,6 @@ class TestGreetingResponses:
 
     def test_thank_you_casual(self):
         """Test casual 'thanks' response."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("thanks bạn")
         
         assert result["intent"] == "thank"
@@ -128,8 +97,6 @@ class TestGreetingResponses:
 
     def test_goodbye_english(self):
         """Test English 'goodbye' response."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("goodbye")
         
         assert result["intent"] == "goodbye"
@@ -139,8 +106,6 @@ class TestGreetingResponses:
 
     def test_goodbye_vietnamese(self):
         """Test Vietnamese 'tạm biệt' response."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("tạm biệt")
         
         assert result["intent"] == "goodbye"
@@ -149,8 +114,6 @@ class TestGreetingResponses:
 
     def test_goodbye_casual(self):
         """Test casual 'bye bye' response."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("bye bye")
         
         assert result["intent"] == "goodbye"
@@ -159,8 +122,6 @@ class TestGreetingResponses:
 
     def test_see_you(self):
         """Test 'see you' response."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("see you")
         
         assert result["intent"] == "goodbye"
@@ -169,8 +130,6 @@ class TestGreetingResponses:
 
     def test_greeting_with_question(self):
         """Test greeting combined with question should prioritize greeting."""
-        from app.services.engine import engine_answer
-        
         result = engine_answer("hello, ai là Trần Hưng Đạo?")
         
         # Should recognize greeting first
@@ -180,8 +139,6 @@ class TestGreetingResponses:
 
     def test_case_insensitive_greeting(self):
         """Test greetings are case-insensitive."""
-        from app.services.engine import engine_answer
-        
         result1 = engine_answer("HELLO")
         result2 = engine_answer("Hello")
         result3 = engine_answer("hello")
@@ -192,10 +149,18 @@ class TestGreetingResponses:
 
     def test_greeting_with_punctuation(self):
         """Test greetings with punctuation."""
-        from app.services.engine import engine_answer
-        
         result1 = engine_answer("hello!")
         result2 = engine_answer("xin chào?")
         
         assert result1["intent"] == "greeting"
         assert result2["intent"] == "greeting"
+
+    def test_repeated_greeting_returns_fresh_response(self):
+        """Cached social intents must not share response objects between calls."""
+        result1 = engine_answer("cảm ơn!")
+        result1["events"].append({"year": 1288})
+        result2 = engine_answer("cảm ơn")
+
+        assert result2["intent"] == "thank"
+        assert result2["query"] == "cảm ơn"
+        assert result2["events"] == []
@@ -8,6 +8,7 @@ test_intent_classifier.py — Test Suite for Intent Classifier V2
 - All 10 intents
 - Edge cases and typo tolerance
 """
+import dataclasses
 import pytest
 from app.services.intent_classifier import (
     detect_duration_guard,
@@ -65,6 +66,14 @@ class TestDurationGuard:
     def test_NOT_duration_no_number(self):
         assert detect_duration_guard("Trần Hưng Đạo là ai") is False
 
+    def test_uppercase_and_unspaced_duration(self):
+        """The number+năm pre-check is case-insensitive and allows no space."""
+        assert detect_duration_guard("HƠN 150 NĂM chia cắt") is True
+        assert detect_duration_guard("hơn 150năm") is True
+
+    def test_NOT_duration_number_without_nam(self):
+        assert detect_duration_guard("hơn 150 trận đánh") is False
+
 
 # ===================================================================
 # 2. QUESTION TYPE DETECTION TESTS (Principle 3)
@@ -121,6 +130,10 @@ class TestQuestionType:
     def test_default_what(self):
         assert detect_question_type("Trần Hưng Đạo đánh giặc") == "what"
 
+    def test_priority_beats_position(self):
+        # "when" outranks "who" even though "là ai" comes first in the query
+        assert detect_question_type("Trần Hưng Đạo là ai, sinh năm nào") == "when"
+
 
 # ===================================================================
 # 3. DATA SCOPE TESTS (Principle 5)
@@ -246,6 +259,21 @@ class TestClassifyIntent:
         r = classify_intent("các cuộc kháng chiến")
         assert r.intent == "broad_history"
 
+    # 4.14 memoized classification hands out independent results
+    def test_repeated_call_returns_fresh_analysis(self):
+        entities = {"persons": ["trần hưng đạo"], "topics": []}
+        first = classify_intent("trần hưng đạo là ai", resolved_entities=entities)
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            first.intent = "mutated"
+        second = classify_intent("trần hưng đạo là ai", resolved_entities=dict(entities))
+        assert second.intent == "definition"
+        assert second is not first
+        assert second.entities == entities
+
+    def test_unhashable_entities_still_classified(self):
+        r = classify_intent("kháng chiến", resolved_entities={"topics": [["nested"]]})
+        assert r.intent == "event_query"
+
 
 # ===================================================================
 # 5. DURATION GUARD INTEGRATION TESTS
@@ -4,22 +4,11 @@ test_nlu.py - Tests for Natural Language Understanding improvements.
 Covers: query rewriting, fuzzy matching, accent restoration,
 abbreviation expansion, question intent detection, and fallback chain.
 """
-import sys
-from pathlib import Path
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from collections import defaultdict
+from itertools import chain
 import pytest
 
-# Ensure ai-service is in path
-AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
-
-# Mock heavy dependencies before import
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
-sys.modules.setdefault('onnxruntime', MagicMock())
-
 from app.services.query_understanding import (
     rewrite_query,
     fuzzy_match_entity,
@@ -32,7 +21,7 @@ from app.services.query_understanding import (
 
 
 # ===================================================================
-# A. QUERY REWRITING (13 tests)
+# A. QUERY REWRITING (17 tests)
 # ===================================================================
 
 class TestQueryRewriting:
@@ -105,9 +94,59 @@ class TestQueryRewriting:
         result = rewrite_query("TRẦN HƯNG ĐẠO")
         assert result == "trần hưng đạo"
 
+    def test_repeated_query_hits_cache(self):
+        """Second rewrite of the same raw string should be served from cache."""
+        rewrite_query("tran hung dao")
+        hits = rewrite_query.cache_info().hits
+        assert rewrite_query("tran hung dao") == rewrite_query("tran hung dao")
+        assert rewrite_query.cache_info().hits > hits
+
+    def test_clear_rewrite_cache_after_swapping_typo_table(self):
+        """Replacing TYPO_FIXES then clearing must not serve stale cached rewrites."""
+        import app.core.startup as startup
+        import app.services.query_understanding as qu
+        original = startup.TYPO_FIXES
+        try:
+            startup.TYPO_FIXES = {}
+            qu.clear_rewrite_cache()
+            before = rewrite_query("trận qzxw")
+            startup.TYPO_FIXES = {"qzxw": "bạch đằng"}
+            qu.clear_rewrite_cache()
+            after = rewrite_query("trận qzxw")
+            assert before == "trận qzxw"
+            assert after == "trận bạch đằng"
+        finally:
+            startup.TYPO_FIXES = original
+            qu.clear_rewrite_cache()
+
+    def test_clear_rewrite_cache_after_editing_expansion_in_place(self):
+        """Same table object and size, new expansion: clearing recompiles the patterns."""
+        import app.core.startup as startup
+        import app.services.query_understanding as qu
+        with patch.dict(startup.ABBREVIATIONS, {"qzx": "bạch đằng"}):
+            qu.clear_rewrite_cache()
+            assert "bạch đằng" in rewrite_query("trận qzx")
+            startup.ABBREVIATIONS["qzx"] = "chi lăng"
+            qu.clear_rewrite_cache()
+            result = rewrite_query("trận qzx")
+            assert "chi lăng" in result and "bạch đằng" not in result
+        qu.clear_rewrite_cache()
+
+    def test_canonical_query_skips_rewrite_steps(self):
+        """Accented text with nothing to fix, expand or drop returns after normalizing."""
+        import app.services.query_understanding as qu
+        with patch.object(qu, "_has_mixed_accents", return_value=False), \
+                patch.object(qu, "_abbreviation_patterns", side_effect=AssertionError):
+            assert qu.rewrite_query_uncached("Trần Hưng  Đạo là ai") == "trần hưng đạo là ai"
+
+    def test_filler_defeats_canonical_fast_path(self):
+        import app.services.query_understanding as qu
+        with patch.object(qu, "_has_mixed_accents", return_value=False):
+            assert qu.rewrite_query_uncached("trần hưng đạo là ai nhé") == "trần hưng đạo là ai"
+
 
 # ===================================================================
-# B. UNACCENTED DETECTION (5 tests)
+# B. UNACCENTED DETECTION (6 tests)
 # ===================================================================
 
 class TestUnaccentedDetection:
@@ -129,9 +168,14 @@ class TestUnaccentedDetection:
     def test_numbers_only(self):
         assert not _looks_unaccented("1288")
 
+    def test_uppercase_accents_counted(self):
+        """Uppercase diacritics count toward the accent ratio."""
+        assert not _looks_unaccented("TRẬN BẠCH ĐẰNG NĂM 938")
+        assert _looks_unaccented("TRAN BACH DANG NAM 938")
+
 
 # ===================================================================
-# C. ACCENT RESTORATION (6 tests)
+# C. ACCENT RESTORATION (8 tests)
 # ===================================================================
 
 class TestAccentRestoration:
@@ -162,9 +206,32 @@ class TestAccentRestoration:
         result = _restore_accents("xyz abc")
         assert result == "xyz abc"
 
+    def test_restored_text_is_not_rewritten_again(self):
+        """A short key inside an already-restored phrase must not be re-accented."""
+        import app.services.query_understanding as qu
+        try:
+            restored = {"nha ho": "nhà hồ", "phat hoang": "phật hoàng", "ho": "hồ"}
+            with patch.dict(qu.UNACCENTED_MAP, restored, clear=True):
+                qu._rebuild_unaccented_sorted()
+                assert _restore_accents("nha ho phat hoang") == "nhà hồ phật hoàng"
+        finally:
+            qu._rebuild_unaccented_sorted()
+
+    def test_overlapping_keys_resolve_longest_first(self):
+        """Overlapping keys: the longer key wins even when a shorter one starts earlier."""
+        import app.services.query_understanding as qu
+        try:
+            overlapping = {"bac ho": "bác hồ", "ho chi minh": "hồ chí minh"}
+            with patch.dict(qu.UNACCENTED_MAP, overlapping, clear=True), \
+                    patch.object(qu, "_looks_unaccented", return_value=False):
+                qu._rebuild_unaccented_sorted()
+                assert _restore_accents("bac ho chi minh") == "bac hồ chí minh"
+        finally:
+            qu._rebuild_unaccented_sorted()
+
 
 # ===================================================================
-# D. FUZZY ENTITY MATCHING (7 tests)
+# D. FUZZY ENTITY MATCHING (10 tests)
 # ===================================================================
 
 class TestFuzzyEntityMatching:
@@ -217,9 +284,37 @@ class TestFuzzyEntityMatching:
         keys = [m[0] for m in result]
         assert len(keys) == len(set(keys))
 
+    def test_ratio_exactly_at_threshold(self):
+        """The score cutoff must keep candidates whose ratio equals the threshold."""
+        result = fuzzy_match_entity("nhà mạ", {"mạc": "mạc", "lý": "lý"}, threshold=0.8)
+        assert result == [("mạc", 0.8)]
+
+    def test_typo_in_first_character(self):
+        """A typo at the start of the name must still match (no prefix bucketing)."""
+        result = fuzzy_match_entity("chần hưng đạo", self.person_aliases, threshold=0.8)
+        assert result and result[0][0] == "trần hưng đạo"
+
+    def test_alias_buckets_rebuilt_after_in_place_swap(self):
+        """Same alias table object and size: rebuilding picks up the swapped key."""
+        import app.core.startup as startup
+        import app.services.query_understanding as qu
+        orig = startup.PERSON_ALIASES
+        try:
+            startup.PERSON_ALIASES = aliases = dict(self.person_aliases)
+            qu.rebuild_alias_buckets()
+            assert fuzzy_match_entity("quang trunh", aliases)[0][0] == "quang trung"
+            del aliases["quang trung"]
+            aliases["lê thái tổ"] = "lê lợi"
+            qu.rebuild_alias_buckets()
+            keys = [m[0] for m in fuzzy_match_entity("quang trunh lê thái tỗ", aliases)]
+            assert "quang trung" not in keys and "lê thái tổ" in keys
+        finally:
+            startup.PERSON_ALIASES = orig
+            qu.rebuild_alias_buckets()
+
 
 # ===================================================================
-# E. QUESTION INTENT DETECTION (8 tests)
+# E. QUESTION INTENT DETECTION (9 tests)
 # ===================================================================
 
 class TestQuestionIntentDetection:
@@ -256,6 +351,11 @@ class TestQuestionIntentDetection:
         result = extract_question_intent("Trần Hưng Đạo đánh quân Nguyên")
         assert result is None
 
+    def test_group_priority_beats_position(self):
+        """Person patterns outrank comparison even when "so sánh" comes first."""
+        result = extract_question_intent("So sánh xem ai đã thắng trận Bạch Đằng")
+        assert result == "person_search"
+
 
 # ===================================================================
 # F. QUERY EXPANSION / VARIATIONS (4 tests)
@@ -319,28 +419,34 @@ def _setup_engine_mocks():
     import app.core.startup as startup
 
     startup.DOCUMENTS = [MOCK_TRAN_HUNG_DAO, MOCK_HCM, MOCK_QUANG_TRUNG]
-    startup.DOCUMENTS_BY_YEAR = defaultdict(list)
-    for doc in startup.DOCUMENTS:
-        y = doc.get("year")
-        if y is not None:
-            startup.DOCUMENTS_BY_YEAR[y].append(doc)
-
-    startup.PERSONS_INDEX = defaultdict(list)
-    startup.DYNASTY_INDEX = defaultdict(list)
-    startup.KEYWORD_INDEX = defaultdict(list)
-    startup.PLACES_INDEX = defaultdict(list)
+    by_year = defaultdict(list)
+    persons_index, dynasty_index, keyword_index, places_index = {}, {}, {}, {}
 
+    # One pass over the documents, like startup._build_inverted_indexes
     for idx, doc in enumerate(startup.DOCUMENTS):
-        all_persons = set(doc.get("persons", []) + doc.get("persons_all", []))
-        for person in all_persons:
-            startup.PERSONS_INDEX[person.strip().lower()].append(idx)
+        y = doc.get("year")
+        if y is not None:
+            by_year[y].append(doc)
+        seen = set()
+        for person in chain(doc.get("persons", ()), doc.get("persons_all", ())):
+            key = person.strip().lower()
+            if key not in seen:
+                seen.add(key)
+                persons_index.setdefault(key, []).append(idx)
         dynasty = doc.get("dynasty", "").strip().lower()
         if dynasty:
-            startup.DYNASTY_INDEX[dynasty].append(idx)
-        for kw in doc.get("keywords", []):
-            startup.KEYWORD_INDEX[kw.lower().replace("_", " ")].append(idx)
-        for place in doc.get("places", []):
-            startup.PLACES_INDEX[place.strip().lower()].append(idx)
+            dynasty_index.setdefault(dynasty, []).append(idx)
+        for kw in doc.get("keywords", ()):
+            keyword_index.setdefault(kw.lower().replace("_", " "), []).append(idx)
+        for place in doc.get("places", ()):
+            places_index.setdefault(place.strip().lower(), []).append(idx)
+
+    startup.DOCUMENTS_BY_YEAR = by_year
+    startup.rebuild_year_view()
+    startup.PERSONS_INDEX = persons_index
+    startup.DYNASTY_INDEX = dynasty_index
+    startup.KEYWORD_INDEX = keyword_index
+    startup.PLACES_INDEX = places_index
 
     startup.PERSON_ALIASES = {
         "trần hưng đạo": "trần hưng đạo", "trần quốc tuấn": "trần hưng đạo",
@@ -357,6 +463,9 @@ def _setup_engine_mocks():
         "nguyên mông": "nguyên mông", "mông cổ": "nguyên mông",
         "cách mạng tháng tám": "cách mạng tháng tám",
     }
+    startup.rebuild_canonical_index()
+    startup.rebuild_ascii_indexes()
+    startup.rebuild_key_matchers()
 
 
 class TestEngineWithNLU:
@@ -412,13 +521,16 @@ class TestEngineWithNLU:
         """When no data found, should return helpful suggestions instead of None."""
         import app.core.startup as startup
         startup.DOCUMENTS = []
-        startup.PERSONS_INDEX = defaultdict(list)
-        startup.DYNASTY_INDEX = defaultdict(list)
-        startup.KEYWORD_INDEX = defaultdict(list)
-        startup.PLACES_INDEX = defaultdict(list)
+        startup.PERSONS_INDEX = {}
+        startup.DYNASTY_INDEX = {}
+        startup.KEYWORD_INDEX = {}
+        startup.PLACES_INDEX = {}
         startup.PERSON_ALIASES = {}
         startup.DYNASTY_ALIASES = {}
         startup.TOPIC_SYNONYMS = {}
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
         mock_search.return_value = []
         from app.services.engine import engine_answer
         r = engine_answer("abc xyz không có gì cả")
@@ -428,7 +540,7 @@ class TestEngineWithNLU:
 
 
 # ===================================================================
-# H. PHONETIC NORMALIZATION (NEW - 6 tests)
+# H. PHONETIC NORMALIZATION (NEW - 7 tests)
 # ===================================================================
 
 class TestPhoneticNormalization:
@@ -463,3 +575,28 @@ class TestPhoneticNormalization:
         variants = generate_phonetic_variants("chần trọng")
         # "chần" → "trần" and "trọng" → "chọng" are both possible
         assert len(variants) > 0
+
+    def test_variants_in_word_order(self):
+        """Variant order is deterministic: word by word, then swap-table order."""
+        assert generate_phonetic_variants("chần trọng") == ["trần trọng", "chần chọng"]
+
+
+# ===================================================================
+# I. PREPROCESS BUNDLE (2 tests)
+# ===================================================================
+
+class TestPreprocessQuery:
+    def test_bundle_matches_individual_steps(self):
+        """preprocess_query carries the same rewrite and intent as the separate calls."""
+        from app.services.query_preprocess import preprocess_query
+        pre = preprocess_query("Vị tướng nào chỉ huy trận Bạch Đằng?")
+        assert pre.raw == "Vị tướng nào chỉ huy trận Bạch Đằng?"
+        assert pre.text == rewrite_query(pre.raw)
+        assert pre.lowered == pre.text.lower()
+        assert pre.intent == extract_question_intent(pre.text) == "person_search"
+
+    def test_blank_query_passthrough(self):
+        from app.services.query_preprocess import preprocess_query
+        pre = preprocess_query("   ")
+        assert pre.text == "   "
+        assert pre.intent is None
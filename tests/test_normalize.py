@@ -3,16 +3,10 @@ test_normalize.py - Unit tests for text normalization utilities
 
 Tests query normalization and accent handling.
 """
-import sys
-from pathlib import Path
+import unicodedata
 import pytest
 
-# Ensure ai-service is in path
-AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
-
-from app.utils.normalize import normalize_query, normalize
+from app.utils.normalize import normalize_query, normalize, to_ascii_key, remove_accents
 
 
 def test_normalize_query_preserves_accents():
@@ -36,6 +30,12 @@ def test_normalize_query_strips_whitespace():
     assert normalize_query(raw) == expected
 
 
+def test_normalize_query_collapses_unicode_whitespace():
+    """Test that tabs, NBSP and zero-width spaces collapse to one space."""
+    raw = "Hòa\tước\u00a0\u200bPatenôtre\n"
+    assert normalize_query(raw) == "hòa ước patenôtre"
+
+
 def test_normalize_strips_accents():
     """Test that normalize removes accents."""
     raw = "Hòa ước Patenôtre"
@@ -48,3 +48,24 @@ def test_normalize_handles_complex_accents():
     raw = "Tiếng Việt"
     expected = "tieng viet"
     assert normalize(raw) == expected
+
+
+def test_normalize_matches_nfd_fallback():
+    """Test the translate-table path agrees with remove_accents, keeping đ."""
+    assert normalize("Đại Việt") == "đai viet"
+    decomposed = unicodedata.normalize("NFD", "Bạch Đằng")
+    assert normalize(decomposed) == "bach đang"
+    assert normalize("Façade Ñam") == remove_accents("façade ñam")
+
+
+def test_to_ascii_key_folds_vietnamese():
+    """Test that to_ascii_key strips every Vietnamese diacritic, including đ."""
+    assert to_ascii_key("  Trần Hưng ĐẠO ") == "tran hung dao"
+    assert to_ascii_key("Lý Thường Kiệt") == "ly thuong kiet"
+
+
+def test_to_ascii_key_handles_decomposed_and_foreign_accents():
+    """Test the NFD fallback for input the translate table does not cover."""
+    decomposed = unicodedata.normalize("NFD", "Bạch Đằng")
+    assert to_ascii_key(decomposed) == "bach dang"
+    assert to_ascii_key("Patenôtre Façade") == "patenotre facade"
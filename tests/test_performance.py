@@ -8,40 +8,14 @@ Tests:
 """
 import pytest
 import time
-import sys
 import numpy as np
-from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
-# Add ai-service to path (portable)
-AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
 
-# Mock heavy dependencies
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
-
-
-def test_embedding_cache_efficiency():
+def test_embedding_cache_efficiency(onnx_mocks):
     """Verify that the embedding cache prevents redundant calls to the model."""
     from app.services.search_service import get_cached_embedding
-    import app.core.startup as startup
-    
-    # Mock ONNX session and Tokenizer
-    mock_session = MagicMock()
-    mock_tokenizer = MagicMock()
-    startup.session = mock_session
-    startup.tokenizer = mock_tokenizer
-    
-    # Mock output of session.run (list of one numpy array)
-    mock_session.run.return_value = [np.array([[[0.1, 0.2, 0.3]]], dtype="float32")]
-    
-    # Mock tokenizer output (dict)
-    mock_tokenizer.return_value = {
-        "input_ids": np.array([[1, 2, 3]]),
-        "attention_mask": np.array([[1, 1, 1]])
-    }
+    session, _ = onnx_mocks
         
     # Use unique query
     query = f"performance_test_{time.time()}"
@@ -50,23 +24,38 @@ def test_embedding_cache_efficiency():
     get_cached_embedding.cache_clear()
     
     # First execution
+    runs_before = session.run_count
     get_cached_embedding(query)
-    first_call_count = mock_session.run.call_count
+    first_call_count = session.run_count
     
     # Second execution (should hit cache)
     get_cached_embedding(query)
-    assert first_call_count > 0, "First call should trigger run"
-    assert mock_session.run.call_count == first_call_count, "Cache missed!"
+    assert first_call_count > runs_before, "First call should trigger run"
+    assert session.run_count == first_call_count, "Cache missed!"
+
 
+class CountingDict(dict):
+    """dict that counts key lookups, to assert on probes rather than time."""
 
-def test_year_lookup_performance():
-    """Ensure year lookup is fast (O(1))."""
+    probes = 0
+
+    def __getitem__(self, key):
+        self.probes += 1
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.probes += 1
+        return super().get(key, default)
+
+
+def test_year_lookup_performance(monkeypatch):
+    """Ensure year lookup is a single index probe (O(1)), not a scan."""
     from app.services.search_service import scan_by_year
     from app.core import startup
     
     test_year = 9999  # Use unique year to avoid conflicts
-    startup.DOCUMENTS_BY_YEAR = {}
-    startup.DOCUMENTS_BY_YEAR[test_year] = [{"event": "Test Event", "year": test_year}]
+    index = CountingDict({test_year: [{"event": "Test Event", "year": test_year}]})
+    monkeypatch.setattr(startup, "DOCUMENTS_BY_YEAR", index)
     
     start = time.perf_counter()
     results = scan_by_year(test_year)
@@ -74,7 +63,31 @@ def test_year_lookup_performance():
     
     assert len(results) == 1
     assert results[0]["year"] == test_year
-    assert elapsed < 0.01  # Should be very fast
+    assert index.probes == 1
+    assert elapsed < 1.0  # Guards against hangs only
+
+
+def test_year_lookup_scales_flat(monkeypatch):
+    """Year lookup cost stays flat from 1k to 100k indexed years (ratio, not absolute time)."""
+    from app.services.search_service import scan_by_year
+    from app.core import startup
+
+    lookups = 1000
+    timings = []
+    for n in (1_000, 10_000, 100_000):
+        monkeypatch.setattr(
+            startup, "DOCUMENTS_BY_YEAR", {y: [{"year": y}] for y in range(n)}
+        )
+        probe_years = range(0, n, n // lookups)
+        best = float("inf")
+        for _ in range(5):  # best of 5 filters scheduler noise
+            start = time.perf_counter()
+            for y in probe_years:
+                scan_by_year(y)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best)
+
+    assert max(timings) / min(timings) < 3.0, timings
 
 
 def test_engine_deduplication():
@@ -92,25 +105,24 @@ def test_engine_deduplication():
         
         # Should have deduplicated
         assert result["answer"] is not None
+        stories = result["stories"]
+        assert len(stories) == len(set(stories))
+        assert sum("dời đô về Thăng Long" in s for s in stories) == 1
+
+
+def test_unique_docs_keeps_first_occurrence():
+    """Verify merged doc lists drop repeated documents in one pass, order preserved."""
+    from app.services.engine import _unique_docs
 
+    a, b, c = {"story": "A"}, {"story": "B"}, {"story": "C"}
+    assert _unique_docs([a, b], [b, c, a], iter([c])) == [a, b, c]
 
-def test_query_normalization_caching():
-    """Verify normalized queries hit the same cache."""
+
+def test_query_normalization_caching(onnx_mocks):
+    """Verify queries that normalize alike hit the same cache entry."""
     from app.utils.normalize import normalize_query
     from app.services.search_service import get_cached_embedding
-    import app.core.startup as startup
-    
-    # Mock startup.session/tokenizer (reuse logic)
-    mock_session = MagicMock()
-    mock_tokenizer = MagicMock()
-    startup.session = mock_session
-    startup.tokenizer = mock_tokenizer
-    
-    mock_session.run.return_value = [np.array([[[0.1, 0.2, 0.3]]], dtype="float32")]
-    mock_tokenizer.return_value = {
-        "input_ids": np.array([[1, 2, 3]]),
-        "attention_mask": np.array([[1, 1, 1]])
-    }
+    session, _ = onnx_mocks
     
     q1 = "Quang   Trung"
     q2 = "quang trung "
@@ -122,9 +134,101 @@ def test_query_normalization_caching():
     get_cached_embedding.cache_clear()
     
     # First call
-    get_cached_embedding(normalize_query(q1))
-    count_after_q1 = mock_session.run.call_count
+    get_cached_embedding(q1)
+    count_after_q1 = session.run_count
     
-    # Second call (should hit cache)
-    get_cached_embedding(normalize_query(q2))
-    assert mock_session.run.call_count == count_after_q1
+    # Second call (should hit cache without the caller normalizing)
+    get_cached_embedding(q2)
+    assert session.run_count == count_after_q1
+
+
+def test_lfu_cache_keeps_frequent_entries():
+    """A burst of one-off keys evicts cold entries, not the frequently hit one."""
+    from app.utils.lfu_cache import lfu_cache
+
+    calls = []
+
+    @lfu_cache(maxsize=3)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    for _ in range(3):
+        square(2)
+    for x in (10, 11, 12, 13):
+        square(x)
+
+    calls.clear()
+    assert square(2) == 4
+    assert calls == []  # still cached after the burst
+    info = square.cache_info()
+    assert info.currsize == 3 and info.maxsize == 3
+
+    # Most-hit entry first; listing does not count as hits
+    assert square.cache_items()[0] == (2, 4)
+    assert square.cache_info().hits == 3
+
+    square.cache_clear()
+    assert square.cache_info() == (0, 0, 3, 0)
+
+
+def test_warmup_populates_cache(onnx_mocks):
+    """Queries embedded at startup are served from the cache afterwards."""
+    from app.core.warmup import load_popular_queries, warm_embedding_cache
+    from app.services.search_service import get_cached_embedding
+    from app.services.query_understanding import rewrite_query
+    from app.utils.normalize import normalize_query
+    session, _ = onnx_mocks
+
+    queries = load_popular_queries()
+    assert "trần hưng đạo là ai" in queries
+
+    get_cached_embedding.cache_clear()
+    runs_before = session.run_count
+    assert warm_embedding_cache(queries[:40]) > 0
+    assert session.run_count - runs_before == 2  # batches of 32
+
+    get_cached_embedding(normalize_query(rewrite_query(queries[0])))
+    assert get_cached_embedding.cache_info().hits > 0
+    assert session.run_count - runs_before == 2
+
+
+def test_embedding_store_survives_restart(onnx_mocks, tmp_path):
+    """Embeddings persisted at shutdown are served from disk by the next process."""
+    from app.core.embedding_store import load_embedding_store, persist_query_cache
+    from app.services.search_service import get_cached_embedding
+    import app.core.startup as startup
+
+    session, _ = onnx_mocks
+    orig_store = startup.EMBED_STORE
+    try:
+        startup.EMBED_STORE = None
+        get_cached_embedding.cache_clear()
+        first = get_cached_embedding("Chiến thắng Điện Biên Phủ")
+        assert persist_query_cache(str(tmp_path)) == 1
+
+        # "Restart": empty in-memory cache, snapshot memory-mapped from disk
+        get_cached_embedding.cache_clear()
+        startup.EMBED_STORE = load_embedding_store(str(tmp_path))
+        assert len(startup.EMBED_STORE) == 1
+
+        runs = session.run_count
+        again = get_cached_embedding("chiến thắng điện biên phủ")
+        assert session.run_count == runs  # no model run
+        assert again.dtype == np.float16
+        assert np.array_equal(again, first)
+    finally:
+        startup.EMBED_STORE = orig_store
+        get_cached_embedding.cache_clear()
+
+
+def test_embedding_store_rejects_other_model(tmp_path, monkeypatch):
+    """A snapshot written for another embedding model is ignored."""
+    from app.core import embedding_store
+
+    vec = np.ones(4, dtype=np.float16)
+    assert embedding_store.save_embedding_store([("a", vec), ("a", vec)], str(tmp_path)) == 1
+    assert embedding_store.load_embedding_store(str(tmp_path)).get("a") is not None
+
+    monkeypatch.setattr(embedding_store, "EMBED_MODEL", "another/model")
+    assert embedding_store.load_embedding_store(str(tmp_path)) is None
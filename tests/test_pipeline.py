@@ -3,26 +3,25 @@ test_pipeline.py - Unit tests for storyteller pipeline
 
 Tests person/place extraction, entity classification, and normalization.
 """
-import pytest
-import sys
-from pathlib import Path
+import importlib
 
-# Add pipeline directory to path
-PIPELINE_DIR = Path(__file__).parent.parent / "pipeline"
-if str(PIPELINE_DIR.parent) not in sys.path:
-    sys.path.insert(0, str(PIPELINE_DIR.parent))
+import pytest
 
 from pipeline.storyteller import (
     extract_all_persons,
+    extract_all_persons_batch,
+    extract_all_places,
     extract_persons_from_body,
     is_valid_person,
     canonical_person,
     classify_entity,
     infer_subject,
     normalize,
+    normalize_batch,
     classify_tone,
     classify_nature,
     extract_year,
+    extract_year_int,
 )
 
 
@@ -38,12 +37,30 @@ from pipeline.storyteller import (
 def test_extract_year(text, expected_year):
     """Test year extraction from text."""
     assert extract_year(text) == expected_year
+    assert extract_year_int(text) == int(expected_year)
+
+
+def test_extract_year_int_none_without_year():
+    assert extract_year_int("Không có năm ở đây.") is None
+    assert extract_year("Không có năm ở đây.") is None
 
 
 # =========================================================
 # PERSON VS PLACE EXTRACTION
 # =========================================================
 
+def test_extract_all_persons_batch_matches_single_calls():
+    texts = [
+        "Trần Hưng Đạo đánh bại quân Nguyên.",
+        "",
+        "Công ty Hoàng Long ở tỉnh Hà Tây.",
+        "Trần Hưng Đạo đánh bại quân Nguyên.",
+    ]
+    batch = extract_all_persons_batch(texts)
+    assert batch == [extract_all_persons(t) for t in texts]
+    assert batch[0] is not batch[3]
+
+
 def test_person_not_place():
     """Test that persons are extracted, not places."""
     text = "Trần Hưng Đạo chỉ huy quân đội tại Bạch Đằng"
@@ -61,6 +78,21 @@ def test_place_not_person():
     assert "Bạch Đằng" not in persons
 
 
+def test_registry_places_found_in_one_pass():
+    """Test that every registry place in the text is extracted."""
+    places = extract_all_places("Từ Thăng Long, quân ta tiến về Chi Lăng rồi Bạch Đằng")
+
+    assert {"Thăng Long", "Chi Lăng", "Bạch Đằng"} <= places
+
+
+def test_extract_all_places_returns_interned_names():
+    a = extract_all_places("Quân ta thắng ở Chi Lăng, tiến về thành Đông Quan")
+    b = extract_all_places("Tin thắng trận Chi Lăng truyền về thành Đông Quan")
+    assert {"Chi Lăng", "Đông Quan"} <= a & b
+    for name in ("Chi Lăng", "Đông Quan"):
+        assert next(p for p in a if p == name) is next(p for p in b if p == name)
+
+
 def test_country_not_person():
     """Test that country names are not persons."""
     text = "Quân dân Đại Việt đánh bại quân Nguyên"
@@ -69,6 +101,14 @@ def test_country_not_person():
     assert "Đại Việt" not in persons
 
 
+def test_company_and_province_context_not_person():
+    """Test that names right after company/province words are skipped."""
+    text = "Công ty Nguyễn Văn An mở chi nhánh. Năm 1418, Trần Hưng Đạo; tỉnh Lê Văn Hưu"
+    persons = extract_all_persons(text)
+
+    assert persons == {"Trần Hưng Đạo"}
+
+
 # =========================================================
 # DYNASTY / COLLECTIVE EXCLUSION
 # =========================================================
@@ -95,6 +135,20 @@ def test_king_alias():
     assert canonical_person("Gia Long") == "Nguyễn Ánh"
 
 
+def test_canonical_person_strips_title_and_ignores_case():
+    """Titles are stripped and aliases match case-insensitively."""
+    assert canonical_person("vua  quang trung") == "Nguyễn Huệ"
+    assert canonical_person("Trần Hưng Đạo Đại tướng") == "Trần Hưng Đạo"
+
+
+def test_canonical_person_returns_interned_names():
+    """Equal canonical names share one string object across spellings."""
+    a = canonical_person("Vua " + "Lê Văn Hưu")
+    b = canonical_person("".join(["Lê Văn", " Hưu"]))
+    assert a == b == "Lê Văn Hưu"
+    assert a is b
+
+
 def test_royal_title_is_person():
     """Test that royal titles are valid persons."""
     text = "Lý Thái Tổ ban Chiếu dời đô"
@@ -107,6 +161,14 @@ def test_royal_title_is_person():
 # ENTITY CLASSIFICATION
 # =========================================================
 
+def test_registry_is_read_only():
+    st = importlib.import_module("pipeline.storyteller")
+    with pytest.raises(TypeError):
+        st.ENTITY_LOOKUP["Hoa Lư"] = "place"
+    with pytest.raises(AttributeError):
+        st.ENTITY_REGISTRY["place"].add("Hoa Lư")
+
+
 def test_classify_entity_place():
     """Test place classification."""
     assert classify_entity("Bạch Đằng") == "place"
@@ -119,6 +181,15 @@ def test_classify_entity_person():
     assert classify_entity("Ngô Quyền") == "person"
 
 
+def test_classify_entity_collective_overrides_other():
+    """Names listed as both 'other' and 'collective' classify as collective."""
+    assert classify_entity("Nhà Trần") == "collective"
+    assert classify_entity("Quân Thanh") == "collective"
+    assert classify_entity("Nghĩa quân Lam Sơn") == "collective"
+    assert classify_entity("Tây Sơn quân") == "collective"
+    assert classify_entity("Bạch Đằng") == "place"
+
+
 # =========================================================
 # SUBJECT INFERENCE
 # =========================================================
@@ -148,6 +219,22 @@ def test_infer_subject_document():
     assert subject == "Văn kiện lịch sử"
 
 
+def test_infer_subject_keyword_beats_nature():
+    """Test that collective keywords in the body win over nature tags."""
+    assert infer_subject("Nhân dân nổi dậy", set(), ["political"]) == "Nhân dân Việt Nam"
+    assert infer_subject("ký hiệp ước", set(), ["diplomacy"]) == "Chính quyền đương thời"
+    assert infer_subject("ký hiệp ước", {"Lê"}, []) == "Sự kiện lịch sử"
+
+
+def test_infer_subject_accepts_nature_mask():
+    st = importlib.import_module("pipeline.storyteller")
+    labels = ["historical_event", "military"]
+    mask = st.nature_mask(labels)
+    assert mask == st.Nature.MILITARY | st.Nature.HISTORICAL_EVENT
+    assert st.nature_mask(["unknown"]) == 0
+    assert infer_subject("quân ta tiến", set(), mask) == infer_subject("quân ta tiến", set(), labels)
+
+
 # =========================================================
 # NORMALIZE FUNCTION
 # =========================================================
@@ -167,6 +254,41 @@ def test_normalize_person_and_place():
     assert "Bạch Đằng" not in persons_all
 
 
+def test_normalize_scans_each_clause_for_persons_once(monkeypatch):
+    """normalize and extract_persons_from_body share one PERSON_PATTERN sweep per clause."""
+    st = importlib.import_module("pipeline.storyteller")
+
+    calls = []
+    real = st.extract_all_persons
+    monkeypatch.setattr(st, "extract_all_persons", lambda t: calls.append(t) or real(t))
+    st.cached_extract_all_persons.cache_clear()
+
+    res = normalize("Năm 1427, Lê Lợi đánh tan quân Minh ở Chi Lăng.")
+    assert res and "Lê Thái Tổ" in res[0][5]
+    assert len(calls) == len(set(calls)) == 1
+
+
+def test_normalize_skips_place_and_tone_work_for_rejected_parts(monkeypatch):
+    st = importlib.import_module("pipeline.storyteller")
+    calls = []
+    monkeypatch.setattr(st, "extract_all_places", lambda t: calls.append(t) or set())
+
+    assert normalize("Năm 1990, giá lúa gạo ở chợ tăng nhẹ so với mọi khi.") == []
+    assert normalize("Ngày 15/3/1990, lúc mấy giờ?") == []
+    assert calls == []
+
+
+def test_normalize_batch_matches_normalize_and_keeps_order():
+    texts = [
+        "Năm 1288, Trần Hưng Đạo đánh bại quân Nguyên trên sông Bạch Đằng.",
+        "Không có năm ở đây.",
+        "Năm 1288, Trần Hưng Đạo đánh bại quân Nguyên trên sông Bạch Đằng.",
+    ]
+    batch = normalize_batch(texts)
+    assert batch == [normalize(t) for t in texts]
+    assert batch[1] == []
+
+
 def test_normalize_rejects_vague():
     """Test normalize rejects vague text."""
     vague_texts = [
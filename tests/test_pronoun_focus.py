@@ -3,14 +3,9 @@ test_pronoun_focus.py — Comprehensive unit tests for pronoun replacement logic
 including parenthetical alias safety, collective entity handling, and plural pronouns.
 """
 
-import sys
 import pytest
-from pathlib import Path
 from unittest.mock import patch, MagicMock
 
-# Add ai-service to path
-sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ai-service"))
-
 
 class TestPronounReplacement:
     """Test pronoun replacement edge cases and fixes."""
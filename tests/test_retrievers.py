@@ -4,12 +4,8 @@ tests/test_retrievers.py — Unit tests for BaseRetriever implementations.
 Tests BM25Retriever and SemanticRetriever with mock indexes and documents.
 """
 import pytest
-import sys
-import os
 from unittest.mock import MagicMock
 
-# Add ai-service to path for imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ai-service'))
 
 import app.core.startup as startup
 from app.retrieval.semantic_retriever import SemanticRetriever
@@ -3,14 +3,9 @@ test_same_entity_integration.py — Integration and Unit tests for Same-Entity d
 same-entity explanations, and their interaction with pronoun replacement.
 """
 
-import sys
 import pytest
-from pathlib import Path
 from unittest.mock import patch, MagicMock
 
-# Add ai-service to path
-sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ai-service"))
-
 
 class TestSameEntityIntegration:
     """Test Suite for Same-Entity Detection and Pronoun Replacement interaction."""
@@ -1,6 +1,4 @@
 import json
-import os
-import sys
 from pathlib import Path
 import pytest
 from fastapi.testclient import TestClient
@@ -9,7 +7,6 @@ from fastapi.testclient import TestClient
 # tests/ is at root, app is in ai-service/app
 PROJECT_ROOT = Path(__file__).parent.parent
 AI_SERVICE_DIR = PROJECT_ROOT / "ai-service"
-sys.path.insert(0, str(AI_SERVICE_DIR))
 
 from app.main import app
 from app.schemas.chat import EventOut
@@ -16,6 +16,7 @@ def clean_startup():
     # Restore state
     startup.DOCUMENTS = orig_documents
     startup.DOCUMENTS_BY_YEAR = orig_documents_by_year
+    startup.rebuild_year_view()
     startup.index = orig_index
     startup.session = orig_session
 
@@ -73,10 +74,121 @@ def test_scan_by_year_range(clean_startup):
         1288: [{"year": 1288, "story": "B"}],
         1427: [{"year": 1427, "story": "C"}]
     }
+    clean_startup.rebuild_year_view()
 
     res = scan_by_year_range(1000, 1300)
     assert len(res) == 2
 
+def test_docs_in_year_range_serves_rebuilt_view(clean_startup):
+    clean_startup.DOCUMENTS_BY_YEAR = {
+        1288: [{"year": 1288, "story": "B"}],
+        1010: [{"year": 1010, "story": "A"}],
+        "invalid": [{"year": "invalid", "story": "X"}],
+    }
+    clean_startup.rebuild_year_view()
+    res = clean_startup.docs_in_year_range(1000, 1300)
+    assert [d["year"] for d in res] == [1010, 1288]
+    assert clean_startup.docs_in_year_range(1300, 1000) == []
+
+    # Appending to an existing year keeps the dict's identity and size;
+    # rebuilding the view picks the new document up
+    clean_startup.DOCUMENTS_BY_YEAR[1288].append({"year": 1288, "story": "B2"})
+    clean_startup.rebuild_year_view()
+    res = clean_startup.docs_in_year_range(1000, 1300)
+    assert [d["story"] for d in res] == ["A", "B", "B2"]
+
+    # Replacing the year index
+    clean_startup.DOCUMENTS_BY_YEAR = {1427: [{"year": 1427, "story": "C"}]}
+    clean_startup.rebuild_year_view()
+    assert clean_startup.docs_in_year_range(1000, 1300) == []
+    assert len(clean_startup.docs_in_year_range(1400, 1500)) == 1
+
+def test_docs_in_year_range_slices_year_column(clean_startup):
+    clean_startup.DOCUMENTS_BY_YEAR = {
+        1288: [{"story": "B1"}, {"story": "B2"}],
+        938: [{"story": "A"}],
+        1427: [{"story": "C"}],
+    }
+    clean_startup.rebuild_year_view()
+    res = clean_startup.docs_in_year_range(938, 1288)
+    assert [d["story"] for d in res] == ["A", "B1", "B2"]
+    assert clean_startup.YEAR_COLUMN == [938, 1288, 1288, 1427]
+    assert [d["story"] for d in clean_startup.docs_in_year_range(1288, 1288)] == ["B1", "B2"]
+
+def test_lookup_entity_ascii_fallback(clean_startup):
+    orig_persons_index = clean_startup.PERSONS_INDEX
+    try:
+        clean_startup.PERSONS_INDEX = {"trần hưng đạo": [1], "lê lợi": [2]}
+        clean_startup.rebuild_ascii_indexes()
+        assert clean_startup.lookup_entity("PERSONS_INDEX", "trần hưng đạo") == [1]
+        assert clean_startup.lookup_entity("PERSONS_INDEX", "tran hung dao") == (1,)
+        assert clean_startup.lookup_entity("PERSONS_INDEX", "ngo quyen") == ()
+
+        # A same-size key swap is picked up by the explicit rebuild
+        del clean_startup.PERSONS_INDEX["trần hưng đạo"]
+        clean_startup.PERSONS_INDEX["ngô quyền"] = [0]
+        clean_startup.rebuild_ascii_indexes()
+        assert clean_startup.lookup_entity("PERSONS_INDEX", "tran hung dao") == ()
+        assert clean_startup.lookup_entity("PERSONS_INDEX", "ngo quyen") == (0,)
+        assert clean_startup.lookup_entity("PERSONS_INDEX", "le loi") == (2,)
+    finally:
+        clean_startup.PERSONS_INDEX = orig_persons_index
+        clean_startup.rebuild_ascii_indexes()
+
+def test_lookup_entity_accented_miss_skips_ascii_fallback(clean_startup):
+    orig_dynasty_index = clean_startup.DYNASTY_INDEX
+    try:
+        clean_startup.DYNASTY_INDEX = {"nguyễn": [4]}
+        clean_startup.rebuild_ascii_indexes()
+        assert clean_startup.lookup_entity("DYNASTY_INDEX", "nguyen") == (4,)
+        assert clean_startup.lookup_entity("DYNASTY_INDEX", "nguyên") == ()
+    finally:
+        clean_startup.DYNASTY_INDEX = orig_dynasty_index
+        clean_startup.rebuild_ascii_indexes()
+
+def test_canonical_person_docs_merges_aliases(clean_startup):
+    orig = clean_startup.PERSON_ALIASES, clean_startup.PERSONS_INDEX
+    try:
+        clean_startup.PERSON_ALIASES = {"quang trung": "nguyễn huệ"}
+        clean_startup.PERSONS_INDEX = {"nguyễn huệ": [3], "quang trung": [1, 3]}
+        clean_startup.rebuild_canonical_index()
+        assert clean_startup.canonical_person_docs("nguyễn huệ") == (1, 3)
+        assert clean_startup.canonical_person_docs("lê lợi") == ()
+
+        # Adding a doc to an existing key keeps both tables' identity and size
+        clean_startup.PERSONS_INDEX["quang trung"].append(5)
+        clean_startup.rebuild_canonical_index()
+        assert clean_startup.canonical_person_docs("nguyễn huệ") == (1, 3, 5)
+
+        clean_startup.PERSONS_INDEX = {"quang trung": [7]}
+        clean_startup.rebuild_canonical_index()
+        assert clean_startup.canonical_person_docs("nguyễn huệ") == (7,)
+    finally:
+        clean_startup.PERSON_ALIASES, clean_startup.PERSONS_INDEX = orig
+        clean_startup.rebuild_canonical_index()
+
+def test_find_index_keys_matches_substring_scan(clean_startup):
+    orig_places_index = clean_startup.PLACES_INDEX
+    try:
+        clean_startup.PLACES_INDEX = {"đằng": [0], "bạch đằng": [1], "hà nội": [2], "nội": [3]}
+        clean_startup.rebuild_key_matchers()
+        text = "từ hà nội ra sông bạch đằng"
+        expected = [k for k in clean_startup.PLACES_INDEX if k in text]
+        assert clean_startup.find_index_keys("PLACES_INDEX", text) == expected
+
+        # A same-size key swap is picked up by the explicit rebuild
+        del clean_startup.PLACES_INDEX["hà nội"]
+        clean_startup.PLACES_INDEX["sông"] = [2]
+        clean_startup.rebuild_key_matchers()
+        assert clean_startup.find_index_keys("PLACES_INDEX", text) == ["đằng", "bạch đằng", "nội", "sông"]
+
+        clean_startup.PLACES_INDEX = {"thăng long": [0]}
+        clean_startup.rebuild_key_matchers()
+        assert clean_startup.find_index_keys("PLACES_INDEX", text) == []
+    finally:
+        clean_startup.PLACES_INDEX = orig_places_index
+        clean_startup.rebuild_key_matchers()
+
 def test_scan_by_entities(clean_startup):
     from app.services.search_service import scan_by_entities
 
@@ -237,3 +349,74 @@ def test_get_cached_embedding(mock_tokenizer, mock_session):
     emb2 = get_cached_embedding("test query")
 
     assert emb1 is emb2 # Should be cached
+    assert emb1.dtype == np.float16  # stored half-precision
+
+@patch('app.core.startup.session')
+@patch('app.core.startup.tokenizer')
+def test_get_cached_embeddings_batches_misses(mock_tokenizer, mock_session):
+    from app.services.search_service import get_cached_embedding, get_cached_embeddings
+
+    import numpy as np
+
+    def tokenize(queries, **kwargs):
+        ids = np.array([[len(q), 1] for q in queries])
+        return {"input_ids": ids, "attention_mask": np.ones_like(ids)}
+
+    mock_tokenizer.side_effect = tokenize
+    mock_session.get_inputs.return_value = []
+    # One hidden state per token: [input_id, 1.0]
+    mock_session.run.side_effect = lambda _, inputs: [
+        np.stack([inputs["input_ids"], np.ones_like(inputs["input_ids"])], axis=-1).astype("float32")
+    ]
+
+    get_cached_embedding.cache_clear()
+    cached = get_cached_embedding("ab")
+    runs = mock_session.run.call_count
+
+    embs = get_cached_embeddings(("abc", "ab", "abcd", "abc"))
+
+    assert mock_session.run.call_count == runs + 1  # one batch for both misses
+    assert embs.shape == (4, 2)
+    assert np.array_equal(embs[1], cached)
+    assert np.array_equal(embs[0], embs[3])
+    assert np.array_equal(embs[2], get_cached_embedding("abcd"))
+    assert mock_session.run.call_count == runs + 1  # written back to the cache
+
+def test_search_variations_falls_back_per_variation(clean_startup):
+    from app.services import search_service
+
+    import numpy as np
+
+    def embed(query):
+        if query == "bad":
+            raise ValueError("tokenizer choked")
+        return np.ones(2, dtype=np.float16)
+
+    clean_startup.index = MagicMock()
+    clean_startup.index.search.return_value = (np.array([[0.9]]), np.array([[0]]))
+    with patch.object(search_service, "get_cached_embeddings", side_effect=RuntimeError("batch")), \
+            patch.object(search_service, "get_cached_embedding", side_effect=embed):
+        rows = search_service._search_variations(("good", "bad", "also good"))
+
+    # Only the failing variation is skipped
+    assert len(rows) == 2
+    assert clean_startup.index.search.call_count == 2
+
+def test_prefetch_embeddings_batches_then_serves_from_cache(onnx_mocks):
+    from app.services.search_service import get_cached_embedding, prefetch_embeddings
+
+    session, _ = onnx_mocks
+    get_cached_embedding.cache_clear()
+    runs = session.run_count
+
+    prefetch_embeddings(["trận bạch đằng", "trận chi lăng", "trận đống đa"])
+    assert session.run_count == runs + 1  # one batch for all three
+
+    get_cached_embedding("Trận Chi Lăng")
+    assert session.run_count == runs + 1
+
+def test_prefetch_embeddings_noop_without_model(clean_startup):
+    from app.services.search_service import prefetch_embeddings
+
+    clean_startup.session = None
+    prefetch_embeddings(["a", "b"])  # must not raise
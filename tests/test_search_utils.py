@@ -4,20 +4,15 @@ test_search_utils.py - Tests for search utility functions and startup indexing.
 Tests: extract_important_keywords, check_query_relevance,
        deduplicate_and_enrich, _build_inverted_indexes, _load_knowledge_base.
 """
-import sys
 import os
 import json
 import tempfile
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 from collections import defaultdict
 
 AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
 
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
 
 # ===================================================================
 # MOCK DATA
@@ -199,7 +194,7 @@ class TestDeduplicateAndEnrich:
 
 
 # ===================================================================
-# D. Startup: _build_inverted_indexes (6 tests)
+# D. Startup: _build_inverted_indexes (8 tests)
 # ===================================================================
 
 class TestBuildInvertedIndexes:
@@ -240,6 +235,23 @@ class TestBuildInvertedIndexes:
         indices = self.startup.PERSONS_INDEX["trần hưng đạo"]
         assert 0 in indices  # DOC_TRAN is at index 0
 
+    def test_posting_lists_frozen(self):
+        """Built indexes are plain dicts of tuples (read-only after startup)."""
+        self.startup.DOCUMENTS = [DOC_TRAN, DOC_LY]
+        self.startup._build_inverted_indexes()
+        for index in (self.startup.PERSONS_INDEX, self.startup.DYNASTY_INDEX,
+                      self.startup.KEYWORD_INDEX, self.startup.PLACES_INDEX):
+            assert type(index) is dict
+            assert all(isinstance(idxs, tuple) for idxs in index.values())
+
+    def test_year_index_built_in_same_pass(self):
+        self.startup.DOCUMENTS = [DOC_TRAN, DOC_LY]
+        self.startup._build_inverted_indexes()
+        for doc in (DOC_TRAN, DOC_LY):
+            assert doc in self.startup.DOCUMENTS_BY_YEAR[doc["year"]]
+        # The range view is warmed in the same build, ordered by year
+        assert self.startup.YEAR_COLUMN == sorted(doc["year"] for doc in (DOC_TRAN, DOC_LY))
+
 
 # ===================================================================
 # E. Startup: _load_knowledge_base (6 tests)
@@ -352,6 +364,9 @@ class TestDetectDynastyWrapper:
         startup.PLACES_INDEX = defaultdict(list)
         startup.PERSON_ALIASES = {}
         startup.TOPIC_SYNONYMS = {}
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
 
     def test_detect_nha_tran(self):
         from app.services.search_service import detect_dynasty_from_query
@@ -368,6 +383,9 @@ class TestDetectDynastyWrapper:
     def test_detect_place_wrapper(self):
         import app.core.startup as startup
         startup.PLACES_INDEX = defaultdict(list, {"bạch đằng": [0]})
+        startup.rebuild_canonical_index()
+        startup.rebuild_ascii_indexes()
+        startup.rebuild_key_matchers()
         from app.services.search_service import detect_place_from_query
         assert detect_place_from_query("Trận Bạch Đằng") == "bạch đằng"
 
@@ -6,14 +6,8 @@ Tests:
 2. Tone classification (heroic/somber/neutral)
 3. Person validation
 """
+import importlib
 import pytest
-import sys
-from pathlib import Path
-
-# Add pipeline directory to path (portable)
-PROJECT_DIR = Path(__file__).parent.parent
-if str(PROJECT_DIR) not in sys.path:
-    sys.path.insert(0, str(PROJECT_DIR))
 
 
 class TestExtractYear:
@@ -120,6 +114,20 @@ class TestCanonicalPerson:
         
         assert canonical_person("Trần Hưng Đạo") == "Trần Hưng Đạo"
 
+    def test_actor_matches_through_alias(self):
+        from pipeline.storyteller import is_person_actor
+
+        # Text names the alias; the canonical name is still the actor
+        assert is_person_actor("Quang Trung đại phá quân Thanh", "Nguyễn Huệ")
+        assert not is_person_actor("Quang Trung đại phá quân Thanh", "Nguyễn Ánh")
+
+    def test_political_actor_within_window(self):
+        from pipeline.storyteller import is_political_actor
+
+        assert is_political_actor("Năm 1802, Nguyễn Ánh lên ngôi", "Nguyễn Ánh")
+        far = "Nguyễn Ánh " + "x" * 50 + " lên ngôi"
+        assert not is_political_actor(far, "Nguyễn Ánh")
+
 
 class TestClassifyNature:
     """Test event nature classification."""
@@ -141,3 +149,141 @@ class TestClassifyNature:
         
         result = classify_nature("Một sự kiện bình thường")
         assert "general" in result
+
+
+class TestKeywordPattern:
+    """Test the precompiled keyword alternations used by the classifiers."""
+    
+    def test_matches_like_substring_any(self):
+        from pipeline.storyteller import keyword_pattern
+        
+        words = ["đánh bại", "ký", "thành phố"]
+        pattern = keyword_pattern(words)
+        for text in ["quân ta đánh bại địch", "kýkết", "thành  phố", "(a+b)", ""]:
+            assert bool(pattern.search(text)) == any(w in text for w in words)
+    
+    def test_escapes_regex_metacharacters(self):
+        from pipeline.storyteller import keyword_pattern
+        
+        assert keyword_pattern(["a.b"]).search("a.b")
+        assert not keyword_pattern(["a.b"]).search("axb")
+    
+    def test_keyword_categories_reports_overlapping_hits(self):
+        # pipeline/__init__ re-exports the storyteller() function under the module's name
+        storyteller = importlib.import_module("pipeline.storyteller")
+        
+        # "bị xâm lược" (tragic) contains "xâm lược" (military)
+        text = "đất nước bị xâm lược"
+        assert storyteller.keyword_categories(text) == {"tragic", "military"}
+        
+        # classify_nature and classify_tone on the same sentence share one scan
+        storyteller.keyword_categories.cache_clear()
+        storyteller.classify_tone(text)
+        storyteller.classify_nature.__wrapped__(text)
+        assert storyteller.keyword_categories.cache_info().misses == 1
+        
+        automaton = storyteller.KEYWORD_AC
+        storyteller.KEYWORD_AC = None  # regex fallback gives the same answer
+        storyteller.keyword_categories.cache_clear()
+        try:
+            assert storyteller.keyword_categories(text) == {"tragic", "military"}
+        finally:
+            storyteller.KEYWORD_AC = automaton
+            storyteller.keyword_categories.cache_clear()
+
+    def test_registry_mentions_split_by_kind(self):
+        storyteller = importlib.import_module("pipeline.storyteller")
+        
+        text = "Quân Minh thua ở Chi Lăng rồi rút khỏi Thăng Long"
+        expected = {
+            "place": {"Chi Lăng", "Thăng Long"},
+            "collective": {"Quân Minh"},
+        }
+        for kind, names in expected.items():
+            assert storyteller.registry_mentions(text, kind) == names
+        
+        automaton = storyteller.REGISTRY_AC
+        storyteller.REGISTRY_AC = None  # regex fallback gives the same answer
+        try:
+            for kind, names in expected.items():
+                assert storyteller.registry_mentions(text, kind) == names
+        finally:
+            storyteller.REGISTRY_AC = automaton
+
+
+class TestPruneEventSentence:
+    """Test clause pruning."""
+    
+    def test_keeps_person_and_consequence_clauses_once(self):
+        from pipeline.storyteller import prune_event_sentence
+        
+        text = "Trần Hưng Đạo đánh bại quân Nguyên, mở ra thời kỳ mới, trời mưa, mở ra thời kỳ mới"
+        assert prune_event_sentence(text) == "Trần Hưng Đạo đánh bại quân Nguyên, mở ra thời kỳ mới"
+
+
+class TestAskByPerson:
+    """Test person lookups over a timeline."""
+    
+    def test_alias_finds_events_through_index(self):
+        storyteller = importlib.import_module("pipeline.storyteller")
+        
+        timeline = {
+            "1789": {"events": [
+                {"event": "Nguyễn Huệ đại phá quân Thanh", "persons": ["Nguyễn Huệ"],
+                 "persons_all": ["Nguyễn Huệ"], "nature": ["military"], "tone": ["heroic"]},
+                {"event": "Mùa màng bội thu", "persons_all": [], "tone": []},
+            ]},
+            "1802": {"events": [
+                {"event": "Gia Long lên ngôi", "persons_all": ["Gia Long"], "tone": []},
+            ]},
+        }
+        answers = storyteller.ask_by_person(timeline, "Quang Trung")
+        assert len(answers) == 1 and "1789" in answers[0]
+        
+        index = storyteller.PERSON_INDEX[1]
+        assert storyteller.ask_by_person(timeline, "Tây Sơn Vương") is None
+        assert storyteller.PERSON_INDEX[1] is index  # built once per timeline
+
+
+class TestClassifyQuestionNature:
+    """Test question nature detection."""
+    
+    @pytest.mark.parametrize("question, expected", [
+        ("Vua nào thắng trận Bạch Đằng?", "military"),
+        ("Nhà Lý lên ngôi năm nào?", "political"),
+        ("Hiệp định Genève ký năm nào?", "institutional"),
+        ("Cách mạng tháng Tám là gì?", "event"),
+        ("Hôm nay thế nào?", None),
+    ])
+    def test_first_matching_group_wins(self, question, expected):
+        from pipeline.storyteller import classify_question_nature
+        
+        assert classify_question_nature(question) == expected
+
+
+class TestMergeEventsByYear:
+    """Test merging of duplicate events within a year."""
+    
+    def test_duplicates_merge_all_list_fields(self):
+        from pipeline.storyteller import merge_events_by_year
+        
+        text = "Lê Lợi đánh tan quân Minh ở Chi Lăng"
+        events = [
+            {"year": 1427, "event": text, "persons": ["Lê Thái Tổ"], "places": ["Chi Lăng"],
+             "nature": ["military"], "tone": ["heroic"], "keywords": [], "dynasty": "Hậu Lê"},
+            {"year": 1427, "event": text, "persons_all": ["Liễu Thăng", "Lê Thái Tổ"],
+             "nature": ["historical_event", "military"], "tone": ["heroic"]},
+        ]
+        merged = merge_events_by_year(events)
+        
+        assert merged == [{
+            "year": 1427,
+            "event": text,
+            "persons": ["Lê Thái Tổ"],
+            "persons_all": ["Liễu Thăng", "Lê Thái Tổ"],
+            "places": ["Chi Lăng"],
+            "nature": ["historical_event", "military"],
+            "tone": ["heroic"],
+            "keywords": [],
+            "dynasty": "Hậu Lê",
+        }]
@@ -4,20 +4,8 @@ test_text_cleaning.py - Unit tests for text cleaning and formatting
 Tests clean_story_text() and format_complete_answer() to prevent
 duplicate text and ensure natural Vietnamese output.
 """
-import sys
-from pathlib import Path
-from unittest.mock import MagicMock
 import pytest
 
-# Ensure ai-service is in path
-AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
-
-# Mock heavy dependencies before import
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
-
 from app.services.engine import clean_story_text, format_complete_answer
 
 
@@ -11,10 +11,7 @@ Tests:
 
 import re
 import pytest
-import sys
-import os
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ai-service"))
 
 from app.services.formatters.timeline_formatter import (
     extract_year,
@@ -3,17 +3,6 @@ test_year_extraction.py - Unit tests for year extraction functions.
 
 Tests: extract_single_year, extract_year_range, extract_multiple_years.
 """
-import sys
-from pathlib import Path
-from unittest.mock import MagicMock
-
-AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
-
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
-
 from app.services.engine import extract_single_year, extract_year_range, extract_multiple_years
 
 
@@ -3,20 +3,9 @@ Test Year Range Query
 
 Kiểm tra khả năng xử lý query về khoảng thời gian (year range).
 """
-import sys
-from pathlib import Path
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from collections import defaultdict
 
-# Ensure ai-service is in path
-AI_SERVICE_DIR = Path(__file__).parent.parent / "ai-service"
-if str(AI_SERVICE_DIR) not in sys.path:
-    sys.path.insert(0, str(AI_SERVICE_DIR))
-
-# Mock heavy dependencies before import
-sys.modules.setdefault('faiss', MagicMock())
-sys.modules.setdefault('sentence_transformers', MagicMock())
-
 import pytest
 
 
@@ -95,6 +84,7 @@ def _setup_mocks():
         y = doc.get("year")
         if y is not None:
             startup.DOCUMENTS_BY_YEAR[y].append(doc)
+    startup.rebuild_year_view()
     
     startup.PERSONS_INDEX = defaultdict(list)
     startup.DYNASTY_INDEX = defaultdict(list)
@@ -116,6 +106,9 @@ def _setup_mocks():
     startup.PERSON_ALIASES = {}
     startup.DYNASTY_ALIASES = {}
     startup.TOPIC_SYNONYMS = {}
+    startup.rebuild_canonical_index()
+    startup.rebuild_ascii_indexes()
+    startup.rebuild_key_matchers()
 
 
 class TestYearRangeExtraction: